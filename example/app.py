@@ -13,12 +13,18 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship, sessionmaker
 from quickrest import (
     Base,
     BaseUserModel,
+    ChangesConfig,
     CreateConfig,
+    DeleteConfig,
+    PatchConfig,
     ReadConfig,
     ResourceConfig,
     RouterFactory,
     SearchConfig,
+    SubscribeConfig,
+    UpsertConfig,
     User,
+    Versioned,
     build_resource,
     make_private,
     make_publishable,
@@ -128,7 +134,8 @@ class Specie(
         dependencies = [check_user_is_admin]
 
 
-class Pet(Base, Resource, make_publishable(user_model=Owner)):
+# union=True searches the owner's pets and other public pets as a UNION ALL, which indexes serve better than an OR
+class Pet(Base, Resource, make_publishable(user_model=Owner, union=True)):
     __tablename__ = "pets"
     # note: all Resource classes have an id and slug column by default
     name: Mapped[str] = mapped_column()
@@ -148,14 +155,48 @@ class Pet(Base, Resource, make_publishable(user_model=Owner)):
         search_lt = ["vaccination_date"]  # less than, list[str] | bool
         search_similarity = ["name"]  # string trigram search
         search_similarity_threshold = 300  # trigram search threshold
-
-
-class Note(Base, Resource, make_private(user_model=Owner)):
+        search_fulltext = ["name"]  # full-text search, e.g. /pets?q=waffles
+        sortable = [
+            "name",
+            "vaccination_date",
+        ]  # e.g. /pets?sort=-vaccination_date,name
+        search_in = ["id", "owner_id"]  # lists of values, e.g. /pets?owner_id_in=a,b
+        # search by related resources, e.g. /pets?specie.common_name=dog
+        search_related = [
+            "specie.common_name",
+            "owner.last_name",
+            "owner.certifications.id",
+        ]
+        export = True  # stream all search results from /pets/export
+        count = True  # count search results with /pets/count
+        # group and aggregate search results with /pets/aggregate
+        aggregate = ["species_id", "owner_id", "public", "vaccination_date"]
+
+    class patch_cfg(PatchConfig):
+        bulk = True  # PATCH /pets/bulk
+
+    class delete_cfg(DeleteConfig):
+        bulk = True  # DELETE /pets?<search filters> and POST /pets/bulk-delete
+
+    class upsert_cfg(UpsertConfig):
+        # PUT /pets/{id} and PUT /pets create-or-replace pets
+        pass
+
+    class subscribe_cfg(SubscribeConfig):
+        # GET /pets/subscribe streams the writes to the pets that the user can see
+        pass
+
+
+class Note(Base, Resource, Versioned, make_private(user_model=Owner)):
     __tablename__ = "notes"
 
     text: Mapped[str] = mapped_column()
     pet_id: Mapped[int] = mapped_column(ForeignKey("pets.id"))
 
+    class changes_cfg(ChangesConfig):
+        # GET /notes/changes syncs the notes of the user, including their deletions
+        pass
+
 
 class Certification(
     Base,
@@ -182,7 +223,8 @@ class OwnerCertifications(Base):
 app = FastAPI(title="QuickRest Quickstart", separate_input_output_schemas=False)
 
 # build create, read, update, delete routers for each resource and add them to the app
-RouterFactory.mount(app, [Owner, Pet, Specie, Note, Certification])
+# batch=True also mounts POST /batch, for running many operations in one transaction
+RouterFactory.mount(app, [Owner, Pet, Specie, Note, Certification], batch=True)
 
 
 @app.exception_handler(RequestValidationError)
@@ -12,12 +12,18 @@ from quickrest.mixins.access_control import (
     make_private,
     make_publishable,
 )
+from quickrest.mixins.changes import ChangesConfig
 from quickrest.mixins.create import CreateConfig
 from quickrest.mixins.delete import DeleteConfig
 from quickrest.mixins.patch import PatchConfig
 from quickrest.mixins.read import ReadConfig
 from quickrest.mixins.resource import Base, Resource, ResourceConfig, build_resource
 from quickrest.mixins.search import SearchConfig
+from quickrest.mixins.subscribe import SubscribeConfig
+from quickrest.mixins.upsert import UpsertConfig
+from quickrest.mixins.utils import UUID7
+from quickrest.mixins.vector import Vector
+from quickrest.mixins.versioned import Versioned
 from quickrest.router_factory import RouterFactory
 
 __all__ = [
@@ -30,9 +36,15 @@ __all__ = [
     "PatchConfig",
     "DeleteConfig",
     "SearchConfig",
+    "UpsertConfig",
+    "ChangesConfig",
+    "SubscribeConfig",
     "make_publishable",
     "make_private",
     "User",
     "Resource",
     "build_resource",
+    "UUID7",
+    "Vector",
+    "Versioned",
 ]
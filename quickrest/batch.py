@@ -0,0 +1,285 @@
+"""
+QuickRest can mount a transactional batch endpoint, `POST /batch`, with `RouterFactory.mount(app, models, batch=True)`.
+
+A batch is a list of create, read, patch and delete operations across any of the mounted resources.
+The operations are run in order, in one database session and one transaction:
+either all of the operations are committed, or, if any operation fails, none of them are.
+
+## Operations
+
+Each operation names the operation (`op`), the resource (by its table name), the primary key (`id`, for read, patch and delete)
+and the request body (`body`, for create and patch), i.e. the same inputs as the equivalent single-resource route.
+Operations are subject to the same access control and route-level dependencies as the single-resource routes.
+
+An operation can be given a `ref` name, and later operations can refer to its result with `"$ref:<name>"`,
+which is replaced by the `id` of the result, or `"$ref:<name>.<field>"`, which is replaced by any field of the result.
+References can be used for the primary key or any value in the request body.
+
+## Example:
+
+```json
+[
+    {"op": "create", "resource": "owners", "ref": "owner", "body": {"first_name": "Ada", "last_name": "Lovelace"}},
+    {"op": "create", "resource": "pets", "ref": "pet", "body": {"name": "Bacon", "owner_id": "$ref:owner", "species_id": "dog"}},
+    {"op": "patch", "resource": "pets", "id": "$ref:pet", "body": {"public": true}}
+]
+```
+
+The response is a list with the result of each operation, in order.
+Subscribers receive the events of the batch's writes once the batch is committed, and none if it's rolled back, see [subscribe](subscribe.md).
+If an operation fails, the transaction is rolled back and the error of the failing operation is returned,
+with the index of the operation: `{"detail": {"operation": 1, "detail": ...}}`.
+
+!!! note
+    All of the resources in a batch must share a database, and the batch session is made with the first resource's `sessionmaker`.
+    Route-level dependencies are called with the batch request, so they may only depend on the `Request`.
+"""
+
+import json
+from functools import wraps
+from inspect import Parameter, iscoroutine, signature
+from typing import Any, Callable, Literal, Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from sqlalchemy.orm import Session
+
+from quickrest.mixins.resource import publish_writes
+
+REF_PREFIX = "$ref:"
+
+
+class BatchOperation(BaseModel):
+    """
+    A single operation in a batch.
+
+    Attributes:
+        op (str): The operation, one of `create`, `read`, `patch` or `delete`.
+        resource (str): The table name of the resource.
+        id (str | int, optional): The primary key of the resource, for `read`, `patch` and `delete` operations.
+        body (dict, optional): The request body, for `create` and `patch` operations.
+        ref (str, optional): A name for the result of the operation, that later operations can reference.
+    """
+
+    op: Literal["create", "read", "patch", "delete"]
+    resource: str
+    id: Optional[str | int] = None
+    body: Optional[dict[str, Any]] = None
+    ref: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    """
+    The result of a single operation in a batch.
+
+    Attributes:
+        op (str): The operation.
+        resource (str): The table name of the resource.
+        ref (str, optional): The name of the result, if given.
+        result (Any): The response of the operation.
+    """
+
+    op: str
+    resource: str
+    ref: Optional[str] = None
+    result: Any = None
+
+
+def _resolve(value, refs: dict):
+    """Replace `$ref:<name>[.<field>]` strings in `value` with fields of earlier results."""
+
+    if isinstance(value, dict):
+        return {k: _resolve(v, refs) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve(v, refs) for v in value]
+    if isinstance(value, str) and value.startswith(REF_PREFIX):
+        name, _, field = value[len(REF_PREFIX) :].partition(".")
+        if name not in refs:
+            raise HTTPException(status_code=400, detail=f"Unknown reference {value}")
+        result = refs[name]
+        if not isinstance(result, dict) or (field or "id") not in result:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Reference {value} has no field {field or 'id'}",
+            )
+        return result[field or "id"]
+    return value
+
+
+async def _call_dependency(fn: Callable, request: Request) -> None:
+    kwargs = {}
+    for name, param in signature(fn).parameters.items():
+        if param.annotation is Request:
+            kwargs[name] = request
+        elif param.default is Parameter.empty:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Route dependency {fn.__name__} can't be used in a batch",
+            )
+    result = fn(**kwargs)
+    if iscoroutine(result):
+        await result
+
+
+def _jsonable(result):
+    if isinstance(result, BaseModel):
+        return result.model_dump(mode="json")
+    if isinstance(result, Response):
+        # e.g. database-rendered or sparse responses
+        return json.loads(result.body)
+    return result
+
+
+def batch_controller_factory(all_models: list[Any]) -> Callable:
+    """
+    Build the controller for the `POST /batch` route.
+
+    Args:
+        all_models (list[Resource]): The mounted resource classes.
+
+    Returns:
+        Callable: The batch controller.
+    """
+
+    models = {m.__tablename__: m for m in all_models}
+    user_generator = all_models[0]._user_generator
+
+    parameters = [
+        Parameter(
+            "request",
+            Parameter.POSITIONAL_OR_KEYWORD,
+            annotation=Request,
+        ),
+        Parameter(
+            "operations",
+            Parameter.POSITIONAL_OR_KEYWORD,
+            default=...,
+            annotation=list[BatchOperation],
+        ),
+        Parameter(
+            "user",
+            Parameter.POSITIONAL_OR_KEYWORD,
+            default=Depends(user_generator),
+            annotation=user_generator.__annotations__["return"],
+        ),
+    ]
+
+    async def run(db, operation: BatchOperation, refs: dict, request, user):
+
+        model = models.get(operation.resource)
+        if model is None:
+            raise HTTPException(
+                status_code=404, detail=f"Unknown resource {operation.resource}"
+            )
+
+        cfg = getattr(model, f"{operation.op}_cfg", None)
+        if cfg is None:
+            raise HTTPException(
+                status_code=405,
+                detail=f"{operation.op} is not available for {operation.resource}",
+            )
+
+        for fn in [*model.router_cfg.dependencies, *cfg.dependencies]:
+            await _call_dependency(fn, request)
+
+        kwargs: dict[str, Any] = {"db": db, "user": user}
+
+        if operation.op in ["read", "patch", "delete"]:
+            if operation.id is None:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"{operation.op} operations require an id",
+                )
+            primary_key_type = str if model.primary_key == "slug" else model._id_type
+            kwargs[model.primary_key] = TypeAdapter(primary_key_type).validate_python(
+                _resolve(operation.id, refs)
+            )
+
+        body = _resolve(operation.body or {}, refs)
+
+        if operation.op == "create":
+            input_model = model.create.input_model
+            kwargs[input_model.__name__.lower()] = input_model.model_validate(body)
+            return await model.create.controller(**kwargs)
+        elif operation.op == "read":
+            return await model.read.controller(
+                **kwargs, return_db_object=False, fields=None
+            )
+        elif operation.op == "patch":
+            kwargs["patch"] = model.patch.input_model.model_validate(body)
+            return await model.patch.controller(**kwargs)
+        else:
+            return model.delete.controller(**kwargs)
+
+    async def inner(*args, **kwargs) -> list[BatchResult]:
+        operations = kwargs["operations"]
+        request = kwargs["request"]
+        user = kwargs["user"]
+
+        # controllers commit as they go, so the batch session is joined to an
+        # outer transaction on its connection, which only the batch commits
+        with all_models[0]._sessionmaker() as session:
+            engine = session.get_bind()
+
+        with engine.connect() as conn:
+            transaction = conn.begin()
+            db = Session(bind=conn, join_transaction_mode="rollback_only")
+
+            refs: dict[str, Any] = {}
+            results = []
+
+            try:
+                for i, operation in enumerate(operations):
+                    try:
+                        result = _jsonable(
+                            await run(db, operation, refs, request, user)
+                        )
+                    except ValidationError as e:
+                        raise HTTPException(
+                            status_code=422,
+                            detail={
+                                "operation": i,
+                                "detail": json.loads(e.json(include_url=False)),
+                            },
+                        )
+                    except Exception as e:
+                        error = all_models[0]._error_handler(e)
+                        raise HTTPException(
+                            status_code=error.status_code,
+                            detail={"operation": i, "detail": error.detail},
+                        )
+
+                    if operation.ref is not None:
+                        refs[operation.ref] = result
+
+                    results.append(
+                        BatchResult(
+                            op=operation.op,
+                            resource=operation.resource,
+                            ref=operation.ref,
+                            result=result,
+                        )
+                    )
+
+                transaction.commit()
+            except Exception:
+                transaction.rollback()
+                raise
+            finally:
+                db.close()
+
+        # the writes are published once the batch is committed
+        publish_writes(db)
+
+        return results
+
+    @wraps(inner)
+    async def f(*args, **kwargs):
+        return await inner(*args, **kwargs)
+
+    # Override signature
+    sig = signature(inner)
+    sig = sig.replace(parameters=parameters)
+    f.__signature__ = sig  # type: ignore
+
+    return f
@@ -0,0 +1,353 @@
+"""
+QuickRest knows which columns each mounted resource can be filtered on, so it can check that those filters are served by an index.
+`RouterFactory.suggest_indexes(models)` inspects the live database schema, and returns the indexes that are missing,
+each with the `CREATE INDEX` statement that would create it.
+
+## Filter paths
+
+The following filters are checked:
+
+- the search filters of each resource: the `search_eq`, `search_gt`, `search_gte`, `search_lt`, `search_lte` and `search_in` fields,
+  the exact-match string fields (i.e. those without `search_contains` or `search_similarity`), and the `required_params`;
+- the `<owner>_id` column of resources with [access control](access_control.md), which filters every query.
+  Each search filter of a `Private` resource is suggested as a composite `(<owner>_id, <field>)` index.
+  `Publishable` resources are also read where `public = true`, so each of their search filters is also suggested as a partial index `WHERE public = true`;
+- the `sortable` fields of each resource, as `(<field>, <primary key>)` indexes, which serve both sort directions
+  and the keyset cursors of sorted searches (sorts on several fields aren't suggested);
+- the foreign keys of the `routed_relationships` of each resource, i.e. the `/{resource_name}/{primary_key}/{relationship}` routes;
+- the `search_related` paths of each resource: the foreign keys of each relationship of the path, which correlate its `EXISTS` subquery,
+  and the related column;
+- the `slug` of resources with slugs.
+
+An index serves a suggestion if its leading columns are the suggested columns (in order), so a composite index also serves its prefixes.
+Partial indexes only serve partial suggestions, and unconditional indexes serve partial suggestions on search filters
+(but not the primary key index, which doesn't find the public resources).
+Boolean filters, `LIKE`, similarity and full-text filters aren't suggested: b-tree indexes don't serve them well,
+and the similarity and full-text indexes are created by QuickRest, see [search](search.md).
+
+## Example:
+
+```python
+from quickrest import RouterFactory
+
+for suggestion in RouterFactory.suggest_indexes([Owner, Pet, Note]):
+    print(f"{suggestion.ddl};  -- {suggestion.reason}")
+```
+
+The same report can be printed from the command line, for the resources of a module
+(or a list of resources, with `module:attribute`), e.g.:
+
+```shell
+python -m quickrest.indexes example.app
+```
+"""
+
+import argparse
+import importlib
+from typing import Any, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import column, inspect, true
+from sqlalchemy.orm import RelationshipDirection
+
+
+class IndexSuggestion(BaseModel):
+    """
+    A missing index.
+
+    Attributes:
+        table (str): The table to index.
+        columns (list[str]): The columns of the index, in order.
+        where (str, optional): The condition of a partial index.
+        reason (str): The filter that the index would serve.
+        ddl (str): The `CREATE INDEX` statement for the index.
+    """
+
+    table: str
+    columns: list[str]
+    where: Optional[str] = None
+    reason: str
+    ddl: str
+
+
+def _search_filters(model) -> list[tuple[str, str]]:
+    """The columns filtered by the search route of a resource, with the name of their query parameter."""
+
+    if getattr(model, "search_cfg", None) is None:
+        return []
+
+    search = model.search
+    search_cfg = model.search_cfg
+    columns = model.__table__.columns
+
+    filters = []
+    for name in search.query_fields:
+        if name in search.CONTROL_PARAMS:
+            continue
+        if name in columns:
+            c = columns[name]
+            if c.type.python_type == bool:
+                continue
+            if c.type.python_type == str and (
+                search_cfg.search_contains or search_cfg.search_similarity
+            ):
+                # LIKE and similarity filters aren't served by a b-tree index
+                continue
+            filters.append((name, name))
+        else:
+            # comparison filters, e.g. `start_date_gte`
+            column_name = "_".join(name.split("_")[:-1])
+            if column_name in columns and column_name not in [c for c, _ in filters]:
+                filters.append((column_name, name))
+
+    return filters
+
+
+def _relationship_path(r, reason: str) -> Optional[tuple[str, list[str], bool, str]]:
+    """The foreign keys that find the related resources of a relationship, unless they are primary keys."""
+
+    if r.secondary is not None:
+        # the association table's foreign keys to this resource
+        return (
+            r.secondary.name,
+            [c.name for _, c in r.synchronize_pairs],
+            False,
+            reason,
+        )
+    if r.direction == RelationshipDirection.ONETOMANY:
+        return (
+            r.mapper.local_table.name,
+            [c.name for _, c in r.synchronize_pairs],
+            False,
+            reason,
+        )
+    return None
+
+
+def filter_paths(model) -> list[tuple[str, list[str], bool, str]]:
+    """
+    The filter paths of a resource, as `(table, columns, public_only, reason)` tuples.
+    """
+
+    table = model.__tablename__
+    owner = getattr(model, "_owner_column", None)
+    publishable = owner is not None and "public" in model.__table__.columns
+
+    paths = []
+
+    if owner is not None:
+        paths.append((table, [owner], False, "access control"))
+        if publishable:
+            paths.append(
+                (table, [model.primary_key], True, "access control, public resources")
+            )
+
+    for column_name, param in _search_filters(model):
+        reason = f"search filter `{param}`"
+        if column_name == owner:
+            continue
+        if owner is not None:
+            paths.append((table, [owner, column_name], False, reason))
+            if publishable:
+                paths.append((table, [column_name], True, reason))
+        else:
+            paths.append((table, [column_name], False, reason))
+
+    search_cfg = getattr(model, "search_cfg", None)
+    for column_name in getattr(search_cfg, "sortable", []):
+        reason = f"sort `{column_name}`"
+        sort_columns = [column_name]
+        if column_name != model.primary_key:
+            sort_columns.append(model.primary_key)
+        if owner is not None:
+            paths.append((table, [owner, *sort_columns], False, reason))
+            if publishable:
+                paths.append((table, sort_columns, True, reason))
+        else:
+            paths.append((table, sort_columns, False, reason))
+
+    read_cfg = getattr(model, "read_cfg", None)
+    if read_cfg is not None:
+        for r in model.__mapper__.relationships:
+            if r.key not in read_cfg.routed_relationships:
+                continue
+            reason = f"relationship route `/{model.__tablename__}/{{id}}/{r.key}`"
+            relationship_path = _relationship_path(r, reason)
+            if relationship_path is not None:
+                paths.append(relationship_path)
+
+    if search_cfg is not None:
+        for related_path in search_cfg.search_related:
+            reason = f"search filter `{related_path}`"
+            relationships, related_column = model.search.resolve_related(
+                model, related_path
+            )
+            for r in relationships:
+                relationship_path = _relationship_path(r, reason)
+                if relationship_path is not None:
+                    paths.append(relationship_path)
+            paths.append(
+                (related_column.table.name, [related_column.name], False, reason)
+            )
+
+    if "slug" in model.__table__.columns:
+        paths.append((table, ["slug"], False, "slug"))
+
+    return paths
+
+
+def _existing_indexes(inspector, table: str) -> list[tuple[tuple[str, ...], bool]]:
+    """The columns of the existing indexes of a table, and whether they are partial `public` indexes."""
+
+    if not inspector.has_table(table):
+        return []
+
+    existing = []
+    for index in inspector.get_indexes(table):
+        where = [
+            str(value)
+            for key, value in index.get("dialect_options", {}).items()
+            if key.endswith("_where")
+        ]
+        if where and not any("public" in w for w in where):
+            # partial indexes on other conditions don't serve the filter paths
+            continue
+        existing.append((tuple(index["column_names"]), bool(where)))
+    for unique in inspector.get_unique_constraints(table):
+        existing.append((tuple(unique["column_names"]), False))
+    existing.append(
+        (tuple(inspector.get_pk_constraint(table)["constrained_columns"]), False)
+    )
+    return existing
+
+
+def _served(
+    columns: tuple[str, ...],
+    public_only: bool,
+    primary_key: tuple[str, ...],
+    existing: list[tuple[tuple[str, ...], bool]],
+) -> bool:
+    for index_columns, partial in existing:
+        if index_columns[: len(columns)] != columns:
+            continue
+        if partial == public_only:
+            return True
+        if public_only and not partial and columns != primary_key:
+            # the public rows of a filter are found by an index on the filter
+            return True
+    return False
+
+
+def _ddl(dialect, table: str, columns: list[str], where: Optional[str]) -> str:
+    preparer = dialect.identifier_preparer
+    name = "_".join(["ix", table, *columns] + (["public"] if where else []))
+    ddl = "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+        preparer.quote(name),
+        preparer.quote(table),
+        ", ".join(preparer.quote(c) for c in columns),
+    )
+    if where:
+        ddl += f" WHERE {where}"
+    return ddl
+
+
+def suggest_indexes(models: list[Any], engine=None) -> list[IndexSuggestion]:
+    """
+    Find the filter paths of the resources that aren't served by an index.
+
+    Args:
+        models (list[Resource]): The mounted resource classes.
+        engine (Engine, optional): The database to inspect. Defaults to the engine of the first resource's `sessionmaker`.
+
+    Returns:
+        list[IndexSuggestion]: The missing indexes.
+    """
+
+    if engine is None:
+        engine = models[0]._sessionmaker.kw.get("bind")
+
+    dialect = engine.dialect
+    public = str(
+        (column("public") == true()).compile(
+            dialect=dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+
+    # deduplicate the paths, keeping the first reason, and drop the paths served by a longer path
+    paths: dict[tuple[str, tuple[str, ...], bool], str] = {}
+    for model in models:
+        for table, path_columns, public_only, reason in filter_paths(model):
+            paths.setdefault((table, tuple(path_columns), public_only), reason)
+
+    def served_by_longer_path(table, columns, public_only) -> bool:
+        return any(
+            t == table
+            and p == public_only
+            and len(c) > len(columns)
+            and c[: len(columns)] == columns
+            for t, c, p in paths
+        )
+
+    suggestions = []
+    with engine.connect() as connection:
+        inspector = inspect(connection)
+        existing: dict[str, list[tuple[tuple[str, ...], bool]]] = {}
+        primary_keys = {m.__tablename__: (m.primary_key,) for m in models}
+
+        for (table, columns, public_only), reason in paths.items():
+            if served_by_longer_path(table, columns, public_only):
+                continue
+            if table not in existing:
+                existing[table] = _existing_indexes(inspector, table)
+            if _served(
+                columns, public_only, primary_keys.get(table, ()), existing[table]
+            ):
+                continue
+
+            where = public if public_only else None
+            suggestions.append(
+                IndexSuggestion(
+                    table=table,
+                    columns=list(columns),
+                    where=where,
+                    reason=reason,
+                    ddl=_ddl(dialect, table, list(columns), where),
+                )
+            )
+
+    return suggestions
+
+
+def _load_models(target: str) -> list[Any]:
+    module_name, _, attribute = target.partition(":")
+    module = importlib.import_module(module_name)
+    if attribute:
+        return list(getattr(module, attribute))
+    # every resource defined in the module
+    return [
+        obj
+        for obj in vars(module).values()
+        if isinstance(obj, type)
+        and obj.__module__ == module.__name__
+        and hasattr(obj, "__table__")
+        and hasattr(obj, "primary_key")
+    ]
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m quickrest.indexes",
+        description="Print the CREATE INDEX statements for the missing indexes of QuickRest resources.",
+    )
+    parser.add_argument(
+        "target",
+        help="The module defining the resources, or `module:attribute` for a list of resources.",
+    )
+    args = parser.parse_args(argv)
+
+    for suggestion in suggest_indexes(_load_models(args.target)):
+        print(f"{suggestion.ddl};  -- {suggestion.reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -70,7 +70,7 @@ class Pet(Base, Resource, make_publishable(user_model=Owner)):
 ```
 """
 
-from typing import Union
+from typing import Optional, Union
 from uuid import UUID
 
 from pydantic import BaseModel
@@ -122,7 +122,7 @@ class User(ResourceBaseMeta):
         return Q.filter(cls.id == user.id)  # type: ignore
 
 
-def make_publishable(user_model: ResourceBaseMeta):
+def make_publishable(user_model: ResourceBaseMeta, union: bool = False):
     """
     Builds the `Publishable` mixin, referencing the defined `User` class.
     The `Publishable` mixin provides a `public (boolean)` column that can be used to mark resources as readable by all users,
@@ -130,8 +130,16 @@ def make_publishable(user_model: ResourceBaseMeta):
     Public resources can still be protected at the route-level, and remain only editable by the resource owner.
     A classmethod `access_control` that filters incoming queries to include only resources with the same `<owner>_id` as the requesting user or resources marked as public.
 
+    The `<owner>_id = :user OR public = true` filter can't be served by a single index, so on large tables,
+    queries over many resources (i.e. the search, count, export and changes routes) scan the table.
+    With `union=True`, these queries are instead rewritten as a `UNION ALL` of the user's resources and the public resources of other users,
+    which can be served by an index on `<owner>_id` and a partial index `WHERE public = true` respectively (see [indexes](indexes.md)).
+    Search filters, counts and pagination are applied over the union.
+    Routes that read or write a single resource by its primary key keep the `OR` filter.
+
     Parameters:
         user_model (ResourceBaseMeta): The user model to reference in the mixin.
+        union (bool): Rewrite queries over many resources as a `UNION ALL`. Defaults to `False`.
 
     Returns:
         type: The Publishable mixin class.
@@ -155,6 +163,13 @@ def make_publishable(user_model: ResourceBaseMeta):
             )
         )
 
+    def access_control_union(cls, Q: Query, user) -> Query:
+        owner_id = getattr(cls, user_model.__name__.lower() + "_id")
+        # the branches are disjoint, so the union has no duplicates to remove
+        return Q.filter(owner_id == user.id).union_all(
+            Q.filter(cls.public == True, owner_id.is_distinct_from(user.id))
+        )
+
     cls = type(
         "Publishable",
         (object,),
@@ -170,6 +185,13 @@ def make_publishable(user_model: ResourceBaseMeta):
             # class methods (inc. relationships)
             user_model.__name__.lower(): resource_owner_relationship,
             "access_control": classmethod(access_control),
+            "_access_control_union": (
+                classmethod(access_control_union) if union else None
+            ),
+            # the column filtered by access control, see `quickrest.indexes`
+            "_owner_column": user_model.__name__.lower() + "_id",
+            # the column marking public resources, see `quickrest.mixins.changes`
+            "_public_column": "public",
         },
     )
 
@@ -216,7 +238,36 @@ def make_private(user_model: DeclarativeBase):
             # class methods (inc. relationships)
             user_model.__name__.lower(): resource_owner_relationship,
             "access_control": classmethod(access_control),
+            # the column filtered by access control, see `quickrest.indexes`
+            "_owner_column": user_model.__name__.lower() + "_id",
         },
     )
 
     return cls
+
+
+def access_columns(model) -> tuple[Optional[str], Optional[str]]:
+    """
+    The owner and public columns checked by the access control of a resource, e.g. to check access to deleted resources.
+    Users own themselves, and resources without access control (or with custom access control) have neither column.
+    """
+    if getattr(model, "_owner_column", None) is not None:
+        return model._owner_column, getattr(model, "_public_column", None)
+    if issubclass(model, User):
+        return "id", None
+    return None, None
+
+
+def can_access(user, owner_id, public) -> bool:
+    """Whether `user` can read a resource with the values of its `access_columns`."""
+    return bool(public) or (owner_id is not None and str(owner_id) == str(user.id))
+
+
+def collection_access_control(model, Q: Query, user) -> Query:
+    """
+    Apply the access control of a resource to a query over many resources,
+    i.e. as a `UNION ALL` for resources made with `make_publishable(..., union=True)`.
+    """
+    if getattr(model, "_access_control_union", None) is not None:
+        return model._access_control_union(Q, user)
+    return model.access_control(Q, user)
@@ -6,6 +6,8 @@ from fastapi import Depends
 from pydantic import PostgresDsn, field_validator
 from pydantic_settings import BaseSettings
 
+from quickrest.mixins.utils import UUID7
+
 
 class EnvSettings(BaseSettings):
     """
@@ -21,7 +23,7 @@ class EnvSettings(BaseSettings):
         SQLITE_DB_PATH (Optional[str]): A file path for the SQLite database (not pre-pended with `sqlite:///`).
         pg_dsn (Optional[PostgresDsn]): A postgres DSN generated from the environment variables.
         DB_CONNECTION_URL (Optional[str]): The connection string for the database, populated by the Postgres DSN or the SQLite path.
-        QUICKREST_ID_TYPE (type): The default ID type for Resources, defaults to `Int`
+        QUICKREST_ID_TYPE (type): The default ID type for Resources, one of `str`, `int`, `uuid` or `uuid7`, defaults to `Int`
         QUICKREST_USE_SLUG (bool): Whether to use slug unique identifiers on Resources, defaults to False
         QUICKREST_INDIRECT_SESSION_GENERATOR (str): The path to the session generator function, defaults to `quickrest.mixins.resource.default_sessionmaker`
         QUICKREST_INDIRECT_USER_GENERATOR (str): The path to the user generator function, defaults to `quickrest.mixins.resource.nullreturn`
@@ -99,11 +101,13 @@ class EnvSettings(BaseSettings):
                     return int
                 elif v.lower() == "uuid":
                     return UUID
+                elif v.lower() == "uuid7":
+                    return UUID7
                 else:
                     raise ValueError(
-                        "ENV(QUICKREST_ID_TYPE) must be one of 'str', 'int', or 'uuid'"
+                        "ENV(QUICKREST_ID_TYPE) must be one of 'str', 'int', 'uuid', or 'uuid7'"
                     )
-            if v in (str, int, UUID):
+            if v in (str, int, UUID, UUID7):
                 return v
             else:
                 raise ValueError("ENV(QUICKREST_ID_TYPE) must be a string")
@@ -0,0 +1,439 @@
+import base64
+import json
+from abc import ABC
+from datetime import datetime
+from functools import wraps
+from inspect import Parameter, signature
+from typing import Any, Callable, Literal, Optional
+
+from fastapi import Depends, HTTPException
+from pydantic import BaseModel, Field, TypeAdapter, create_model
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    and_,
+    event,
+    insert,
+    or_,
+    select,
+)
+from sqlalchemy.orm import Session
+
+from quickrest.mixins.access_control import (
+    User,
+    access_columns,
+    collection_access_control,
+)
+from quickrest.mixins.base import BaseMixin, RESTFactory
+from quickrest.mixins.utils import classproperty
+from quickrest.mixins.versioned import _utcnow, is_versioned
+
+tombstone_metadata = MetaData()
+
+tombstone_table = Table(
+    "quickrest_tombstones",
+    tombstone_metadata,
+    Column("seq", Integer, primary_key=True, autoincrement=True),
+    Column("resource", String, nullable=False, index=True),
+    Column("resource_id", String, nullable=False),
+    Column("deleted_at", DateTime, nullable=False),
+    # the owner of the resource, and whether it was public, see `tombstone_access_control`
+    Column("owner_id", String, nullable=True),
+    Column("public", Boolean, nullable=True),
+)
+
+
+class ChangesConfig(ABC):
+    """
+    The `ChangesConfig` class can optionally be defined on the resource class.
+    This class should inherit from `ChangesConfig` and must be called `changes_cfg`.
+    Like the upsert routes, the changes route is opt-in:
+    `changes_cfg` is `None` by default, and the route is only created if `changes_cfg` is defined.
+    The changes route can only be added to [Versioned](versioned.md) resources.
+
+    ## Example:
+
+    ```python
+    from sqlalchemy.orm import Mapped, mapped_column
+
+    from quickrest import Base, ChangesConfig, Resource, Versioned
+
+
+    class Note(Base, Resource, Versioned):
+        __tablename__ = "notes"
+
+        text: Mapped[str] = mapped_column()
+
+        class changes_cfg(ChangesConfig):
+            limit = 500
+    ```
+
+    Attributes:
+        description (str, optional): Description of the endpoint. Optional, defaults to `None`.
+        summary (str, optional): Summary of the endpoint. Optional, defaults to `get {resource_name} changes`.
+        operation_id (str, optional): Operation ID of the endpoint. Optional, defaults to `None`.
+        tags (list[str], optional): Tags for the endpoint. Optional, defaults to `None`.
+        dependencies (list[Callable]): Injectable callable dependencies for the endpoint. Optional, defaults to `[]`.
+        limit (int): The maximum number of changes returned per request. Optional, defaults to `100`.
+
+    """
+
+    # router method
+    description: Optional[str] = None
+    summary: Optional[str] = None
+    operation_id: Optional[str] = None
+    tags: Optional[list[str]] = None
+    dependencies: list[Callable] = []
+
+    # changes method
+    limit: int = 100
+
+
+class ChangesMixin(BaseMixin):
+    """
+    This mixin is automatically inherited by the `Resource` class and provides a delta-sync endpoint,
+    so that clients can keep a local copy of a collection without re-downloading it.
+    The changes route is only created if the resource defines a `changes_cfg`, see `ChangesConfig`.
+
+    ## Endpoint - Resource Changes
+
+        GET /{resource_name}/changes?since={cursor}&limit={limit}
+
+    The response lists the resources created or updated, and the resources deleted, after the `since` cursor,
+    in the order they were changed.
+    Each change has an `op` (`upsert` or `delete`), the primary key of the resource, and the time of the change.
+    Upserts also include the resource itself.
+
+    The response also includes a `cursor`, which the client sends as `since` on its next request,
+    and `has_more`, which is `true` if there are further changes to fetch immediately.
+    A client without a cursor (i.e. on its first sync) receives every resource.
+
+    Created and updated resources are found with the indexed `updated_at` column of the [Versioned](versioned.md) mixin,
+    and are subject to the resource's access control.
+    Deleted resources are recorded in a tombstone table, `quickrest_tombstones`, by the delete routes.
+    Tombstones hold the primary key and deletion time of the resource, and the owner of [private and publishable](access_control.md) resources
+    (and whether publishable resources were public), so that each user only receives the deletions of the resources they could read.
+    Resources with their own `access_control` can't use the changes route, as it can't be applied to deleted resources.
+
+    | Property | Description |
+    | :--- | :---- |
+    | Method | `GET` |
+    | Route | `/{resource_name}/changes` |
+    | Request  | Path: `<none>` </br> Query: `since`, `limit` </br> Body: `<none>` |
+    | Success Response | 200 OK: `{"changes": list, "cursor": str, "has_more": bool}` |
+
+    !!! note
+        Changes are ordered by the application clock of the workers that wrote them.
+        A write that commits after a client's sync, with an earlier `updated_at` than the client's cursor, is missed by that client,
+        so clocks should be kept in sync, and long-running transactions avoided on synced resources.
+        Resources that are no longer visible to a user (e.g. a resource made private) aren't reported as deleted to that user.
+
+    """
+
+    _changes = None
+
+    changes_cfg: Optional[type[ChangesConfig]] = None
+
+    @classproperty
+    def changes(cls):
+        if cls._changes is None:
+            cls._changes = ChangesFactory(cls)
+        return cls._changes
+
+
+def encode_cursor(updated_at: Optional[datetime], primary_key: Any, seq: int) -> str:
+    payload = {
+        "u": updated_at.isoformat() if updated_at is not None else None,
+        "k": primary_key if primary_key is None else str(primary_key),
+        "t": seq,
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[Optional[datetime], Optional[str], int]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        updated_at = (
+            datetime.fromisoformat(payload["u"]) if payload["u"] is not None else None
+        )
+        return updated_at, payload["k"], int(payload["t"])
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Invalid changes cursor {cursor}")
+
+
+def record_tombstones(db, model, primary_keys: list) -> None:
+    """
+    Record the deletion of resources, in the session's transaction.
+    Called before the resources are deleted, to record their owner, see `tombstone_access_control`.
+    """
+    if not primary_keys:
+        return
+
+    primary_key_column = getattr(model, model.primary_key)
+    columns = [getattr(model, name) for name in access_columns(model) if name]
+
+    owners = {}
+    if columns:
+        owners = {
+            primary_key: values
+            for primary_key, *values in db.execute(
+                select(primary_key_column, *columns).where(
+                    primary_key_column.in_(primary_keys)
+                )
+            )
+        }
+
+    deleted_at = _utcnow()
+    rows = []
+    for primary_key in primary_keys:
+        owner_id, public = (owners.get(primary_key, []) + [None, None])[:2]
+        rows.append(
+            dict(
+                resource=model.__tablename__,
+                resource_id=str(primary_key),
+                deleted_at=deleted_at,
+                owner_id=None if owner_id is None else str(owner_id),
+                public=public,
+            )
+        )
+    db.execute(insert(tombstone_table), rows)
+
+
+def tombstone_access_control(model, user) -> Any:
+    """
+    The filter of the tombstones of a resource that a user can read, following the resource's access control:
+    the user's own resources, and public resources.
+    """
+    visible = tombstone_table.c.owner_id == str(user.id)
+    if getattr(model, "_public_column", None) is not None:
+        visible = or_(visible, tombstone_table.c.public == True)  # noqa: E712
+    return visible
+
+
+def tracks_changes(model) -> bool:
+    return getattr(model, "changes_cfg", None) is not None
+
+
+class ChangesFactory(RESTFactory):
+
+    METHOD = "GET"
+    CFG_NAME = "changes_cfg"
+    ROUTE = "/changes"
+
+    def __init__(self, model):
+        if not is_versioned(model):
+            raise ValueError(
+                f"{model.__name__} must be Versioned to use the changes route"
+            )
+        if (
+            hasattr(model, "access_control")
+            and getattr(model, "_owner_column", None) is None
+            and not issubclass(model, User)
+        ):
+            raise ValueError(
+                f"{model.__name__} must use private, publishable or user access control to use the changes route"
+            )
+        self._tombstone_table_ready = False
+        self.response_model = self._generate_response_model(model)
+        self.controller = self.controller_factory(model)
+
+    @staticmethod
+    def _primary_key_type(model) -> type:
+        return str if model.primary_key == "slug" else model._id_type
+
+    def _generate_response_model(self, model) -> BaseModel:
+
+        change_fields: Any = {
+            "op": (Literal["upsert", "delete"], ...),
+            model.primary_key: (self._primary_key_type(model), ...),
+            "at": (datetime, ...),
+            "resource": (Optional[model.basemodel], None),
+        }
+        change_model = create_model("Change" + model.__name__, **change_fields)
+
+        fields: Any = {
+            "changes": (list[change_model], Field(title="changes")),  # type: ignore
+            "cursor": (str, Field(title="cursor")),
+            "has_more": (bool, Field(title="has_more")),
+        }
+        return create_model("Changes" + model.__name__, **fields)
+
+    def attach_route(self, model) -> None:
+
+        cfg = model.changes_cfg
+
+        model.router.add_api_route(
+            self.ROUTE,
+            self.controller,
+            description=cfg.description,
+            dependencies=[Depends(d) for d in cfg.dependencies],
+            summary=cfg.summary or "get " + model.__name__.lower() + " changes",
+            tags=cfg.tags or [model.__name__],
+            operation_id=cfg.operation_id,
+            methods=[self.METHOD],
+            response_model=self.response_model,
+        )
+
+    def ensure_tombstone_table(self, db) -> None:
+        if self._tombstone_table_ready:
+            return
+        bind = db.get_bind()
+        if bind.dialect.name == "sqlite":
+            # sqlite only allows one writer at a time, so the table is created in the session's transaction,
+            # and is only known to exist once that transaction is committed
+            connection = db.connection()
+            if event.contains(connection, "commit", self._tombstone_table_created):
+                return
+            if connection.dialect.has_table(connection, tombstone_table.name):
+                self._tombstone_table_ready = True
+                return
+            tombstone_table.create(connection)
+            event.listen(connection, "commit", self._tombstone_table_created)
+            return
+        # otherwise, the table is created in its own transaction, so it survives a rolled-back delete
+        with bind.begin() as connection:
+            tombstone_table.create(connection, checkfirst=True)
+        self._tombstone_table_ready = True
+
+    def _tombstone_table_created(self, connection) -> None:
+        self._tombstone_table_ready = True
+
+    def controller_factory(self, model):
+
+        primary_key_type = self._primary_key_type(model)
+        primary_key_column = getattr(model, model.primary_key)
+
+        parameters = [
+            Parameter(
+                "since",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=None,
+                annotation=Optional[str],
+            ),
+            Parameter(
+                "limit",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=None,
+                annotation=Optional[int],
+            ),
+            Parameter(
+                "db",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model.db_generator),
+                annotation=Session,
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        def inner(*args, **kwargs) -> self.response_model:  # type: ignore
+
+            try:
+                db = kwargs["db"]
+                user = kwargs["user"]
+                since = kwargs.get("since")
+                limit = min(
+                    kwargs.get("limit") or model.changes_cfg.limit,
+                    model.changes_cfg.limit,
+                )
+                if limit < 1:
+                    raise HTTPException(status_code=422, detail="limit must be >= 1")
+
+                updated_at, primary_key, seq = (
+                    decode_cursor(since) if since else (None, None, 0)
+                )
+
+                # keyset pagination on (updated_at, primary_key)
+                Q = db.query(model).options(*model.load_options())
+                if updated_at is not None:
+                    primary_key = TypeAdapter(primary_key_type).validate_python(
+                        primary_key
+                    )
+                    Q = Q.filter(
+                        or_(
+                            model.updated_at > updated_at,
+                            and_(
+                                model.updated_at == updated_at,
+                                primary_key_column > primary_key,
+                            ),
+                        )
+                    )
+                if hasattr(model, "access_control"):
+                    Q = collection_access_control(model, Q, user)
+                rows = (
+                    Q.order_by(model.updated_at, primary_key_column)
+                    .limit(limit + 1)
+                    .all()
+                )
+
+                self.ensure_tombstone_table(db)
+                T = select(tombstone_table).where(
+                    tombstone_table.c.resource == model.__tablename__,
+                    tombstone_table.c.seq > seq,
+                )
+                if hasattr(model, "access_control"):
+                    T = T.where(tombstone_access_control(model, user))
+                tombstones = db.execute(
+                    T.order_by(tombstone_table.c.seq).limit(limit + 1)
+                ).all()
+
+                # each list is in change order, so the first `limit` changes of
+                # their merge are the first `limit` changes after the cursor
+                merged: list[tuple[datetime, bool, Any]] = sorted(
+                    [(row.updated_at, False, row) for row in rows]
+                    + [(t.deleted_at, True, t) for t in tombstones],
+                    key=lambda change: (change[0], change[1]),
+                )
+
+                changes = []
+                for at, is_delete, item in merged[:limit]:
+                    if is_delete:
+                        seq = item.seq
+                        changes.append(
+                            {
+                                "op": "delete",
+                                model.primary_key: item.resource_id,
+                                "at": at,
+                            }
+                        )
+                    else:
+                        updated_at = item.updated_at
+                        primary_key = getattr(item, model.primary_key)
+                        changes.append(
+                            {
+                                "op": "upsert",
+                                model.primary_key: primary_key,
+                                "at": at,
+                                "resource": model.basemodel.model_validate(
+                                    item, from_attributes=True
+                                ),
+                            }
+                        )
+
+                return self.response_model(
+                    changes=changes,
+                    cursor=encode_cursor(updated_at, primary_key, seq),
+                    has_more=len(merged) > limit,
+                )
+            except Exception as e:
+                raise model._error_handler(e)
+
+        @wraps(inner)
+        def f(*args, **kwargs):
+            return inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig  # type: ignore
+
+        return f
@@ -1,13 +1,19 @@
+import asyncio
+import io
+import json
 from functools import wraps
 from inspect import Parameter, signature
 from typing import Any, Callable, Optional
 
-from fastapi import Depends
-from pydantic import BaseModel, create_model
+from fastapi import Depends, Request
+from pydantic import BaseModel, ValidationError, create_model
+from sqlalchemy import ARRAY, JSON, TypeDecorator, insert
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from quickrest.mixins.base import BaseMixin, RESTFactory
-from quickrest.mixins.utils import classproperty
+from quickrest.mixins.utils import classproperty, in_caller_transaction
+from quickrest.mixins.versioned import managed_columns
 
 
 class CreateConfig:
@@ -50,12 +56,22 @@ class CreateConfig:
             dependencies = [authenticate_user]
     ```
 
+    Setting `ingest` adds a bulk-loading route, `POST /{resource_name}/ingest`, see `CreateMixin`.
+    Setting `group_commit` coalesces concurrent creates into shared transactions, see `CreateMixin`.
+
     Attributes:
         description (str, optional): Description of the endpoint. Optional, defaults to `None`.
         summary (str, optional): Summary of the endpoint. Optional, defaults to `get {resource_name}`.
         operation_id (str, optional): Operation ID of the endpoint. Optional, defaults to `None`.
         tags (list[str], optional): Tags for the endpoint. Optional, defaults to `None`.
         dependencies (list[Callable]): Injectable callable dependencies for the endpoint. Optional, defaults to `[]`.
+        ingest (bool): Add the NDJSON bulk-loading route. Optional, defaults to `False`.
+        ingest_chunk_size (int): Number of rows written and committed at a time by the ingest route. Optional, defaults to `1000`.
+        ingest_max_errors (int): Maximum number of per-line errors reported by the ingest route. Optional, defaults to `100`.
+        ingest_max_line_bytes (int): Maximum length of a line read by the ingest route, longer lines are skipped and reported. Optional, defaults to `1048576`.
+        group_commit (bool): Coalesce concurrent creates into shared transactions. Optional, defaults to `False`.
+        group_commit_window_ms (float): How long the first queued create waits for others to join its transaction. Optional, defaults to `5`.
+        group_commit_max_rows (int): The maximum number of creates in a shared transaction. Optional, defaults to `100`.
     """
 
     description: Optional[str] = None
@@ -64,6 +80,17 @@ class CreateConfig:
     tags: Optional[list[str]] = None
     dependencies: list[Callable] = []
 
+    # bulk loading
+    ingest: bool = False
+    ingest_chunk_size: int = 1000
+    ingest_max_errors: int = 100
+    ingest_max_line_bytes: int = 1 << 20
+
+    # group commit
+    group_commit: bool = False
+    group_commit_window_ms: float = 5
+    group_commit_max_rows: int = 100
+
 
 class CreateMixin(BaseMixin):
     """
@@ -122,6 +149,40 @@ class CreateMixin(BaseMixin):
     | Request  | Path: `<none>` </br> Query: `<none>` </br> Body: Resource CreateModel |
     | Success Response | 201 OK: Resource [BaseModel](resource.md#quickrest.mixins.resource.ResourceMixin._build_basemodel) |
 
+    ## Endpoint - Ingest Resources
+
+        POST /{resource_name}/ingest
+
+    If `CreateConfig.ingest` is set, resources can be bulk-loaded from a newline-delimited JSON (NDJSON) request body,
+    with one CreateModel per line.
+    The body is read as a stream and valid rows are written (and committed) in chunks of `ingest_chunk_size`,
+    using `COPY` on postgresql and a multi-row insert on other databases,
+    so memory use stays bounded regardless of the size of the upload.
+    The body is only read as quickly as chunks can be written, applying backpressure to the client.
+
+    Lines that fail validation, can't be written, or are longer than `ingest_max_line_bytes`, are skipped and reported by line number in the response.
+    Relationship fields are not supported by the ingest route.
+
+    | Property | Description |
+    | :--- | :---- |
+    | Method | `POST` |
+    | Route | `/{resource_name}/ingest` |
+    | Request  | Path: `<none>` </br> Query: `<none>` </br> Body: NDJSON of Resource CreateModels |
+    | Success Response | 200 OK: `IngestReport` |
+
+    ## Group Commit
+
+    If `CreateConfig.group_commit` is set, creates are queued for up to `group_commit_window_ms`
+    (or until `group_commit_max_rows` creates are queued), and then written in a single transaction,
+    so that many small concurrent creates share one commit (and one fsync) instead of paying for one each.
+    Each request still receives its own resource in the response.
+    If the shared transaction fails, e.g. on a unique constraint, its creates are retried in their own transactions,
+    so each request receives its own error.
+
+    Group commit trades a few milliseconds of latency for write throughput, and suits high-rate clients posting small rows.
+    Creates that set relationship fields bypass the queue, as do creates in a caller's transaction (e.g. in a `POST /batch`),
+    which are committed (or rolled back) with that transaction.
+
     """
 
     _create = None
@@ -136,6 +197,122 @@ class CreateMixin(BaseMixin):
         return cls._create
 
 
+class IngestReport(BaseModel):
+    """
+    The response of the ingest route.
+
+    Attributes:
+        inserted (int): The number of rows written.
+        failed (int): The number of lines that were skipped.
+        errors (list[dict]): The line number and error detail of skipped lines, up to `ingest_max_errors`.
+    """
+
+    inserted: int = 0
+    failed: int = 0
+    errors: list[dict] = []
+
+
+class GroupCommitter:
+    """
+    Queues creates for a resource and writes them in shared transactions.
+
+    Creates are flushed when the first queued create has waited `window_ms`, or when `max_rows` creates are queued.
+    Flushes are written in the threadpool, with their own session, so they don't block the event loop.
+    """
+
+    def __init__(self, model, window_ms: float, max_rows: int):
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_rows = max_rows
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def submit(self, values: dict):
+        """Queue the column `values` of a new resource, and wait for its (serialized) resource."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((values, future))
+
+        if len(self._pending) >= self.max_rows:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._start_flush)
+
+        return await future
+
+    def _start_flush(self) -> None:
+        task = asyncio.get_running_loop().create_task(self.flush())
+        # hold a reference to the task until it's done
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        try:
+            outcomes = await run_in_threadpool(self._write, [v for v, _ in batch])
+        except Exception as e:
+            outcomes = [(None, e) for _ in batch]
+
+        for (_, future), (result, error) in zip(batch, outcomes):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _write(self, batch: list[dict]) -> list[tuple[Any, Optional[Exception]]]:
+        """Write the queued creates, returning the serialized resource or the error of each."""
+        model = self.model
+
+        def serialize(obj) -> tuple[Any, Optional[Exception]]:
+            try:
+                return model.basemodel.model_validate(obj, from_attributes=True), None
+            except Exception as e:
+                return None, e
+
+        db = model._sessionmaker()
+        # the rows are serialized after commit, without reloading them one-by-one
+        db.expire_on_commit = False
+        try:
+            try:
+                objs = [model(**values) for values in batch]
+                db.add_all(objs)
+                db.flush()
+                model._on_write(
+                    "create", [getattr(obj, model.primary_key) for obj in objs], db
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                # isolate the failing rows, so each request receives its own result
+                outcomes: list[tuple[Any, Optional[Exception]]] = []
+                for values in batch:
+                    try:
+                        obj = model(**values)
+                        db.add(obj)
+                        db.flush()
+                        model._on_write("create", [getattr(obj, model.primary_key)], db)
+                        db.commit()
+                        outcomes.append(serialize(obj))
+                    except Exception as e:
+                        db.rollback()
+                        outcomes.append((None, e))
+                return outcomes
+
+            return [serialize(obj) for obj in objs]
+        finally:
+            db.close()
+
+
 class CreateFactory(RESTFactory):
 
     METHOD = "POST"
@@ -148,6 +325,17 @@ class CreateFactory(RESTFactory):
         self.input_model = self._generate_input_model(model)
         self.controller = self.controller_factory(model)
 
+        cfg = getattr(model, "create_cfg", None)
+        self.group_committer = (
+            GroupCommitter(
+                model,
+                window_ms=cfg.group_commit_window_ms,
+                max_rows=cfg.group_commit_max_rows,
+            )
+            if cfg is not None and cfg.group_commit
+            else None
+        )
+
     def _generate_input_model(self, model) -> BaseModel:
         cols = [c for c in model.__table__.columns]
 
@@ -160,6 +348,7 @@ class CreateFactory(RESTFactory):
             for c in cols
             # filter ID field if it's not a (user-provided) string
             if ((c.name != "id") or (c.type.python_type == str))
+            and c.name not in managed_columns(model)
         }
 
         # map relationship fields
@@ -203,13 +392,23 @@ class CreateFactory(RESTFactory):
             body = kwargs[self.input_model.__name__.lower()]
             user = kwargs["user"]
 
-            obj = model(
-                **{
-                    c.name: getattr(body, c.name)
-                    for c in model.__table__.columns
-                    if ((c.name != "id") or (c.type.python_type == str))
-                }
-            )
+            values = {
+                c.name: getattr(body, c.name)
+                for c in model.__table__.columns
+                if ((c.name != "id") or (c.type.python_type == str))
+                and c.name not in managed_columns(model)
+            }
+
+            if (
+                self.group_committer is not None
+                and not in_caller_transaction(db)
+                and not any(
+                    getattr(body, r.key) for r in model.__mapper__.relationships
+                )
+            ):
+                return await self.group_committer.submit(values)
+
+            obj = model(**values)
 
             for r in model.__mapper__.relationships:
 
@@ -242,6 +441,8 @@ class CreateFactory(RESTFactory):
                     setattr(obj, r.key, related_objs)
 
             db.add(obj)
+            db.flush()
+            model._on_write("create", [getattr(obj, model.primary_key)], db)
             db.commit()
             db.refresh(obj)
 
@@ -257,3 +458,330 @@ class CreateFactory(RESTFactory):
         f.__signature__ = sig  # type: ignore
 
         return f
+
+    def attach_route(self, model) -> None:
+
+        if model.create_cfg.ingest:
+            model.router.add_api_route(
+                "/ingest",
+                self.ingest_controller_factory(model),
+                description=f"Bulk-load {model.__tablename__} from an NDJSON request body",
+                dependencies=[Depends(d) for d in model.create_cfg.dependencies],
+                summary="ingest " + model.__name__.lower(),
+                tags=model.create_cfg.tags or [model.__name__],
+                operation_id=f"ingest_{model.__tablename__}",
+                methods=[self.METHOD],
+                response_model=IngestReport,
+            )
+
+        super().attach_route(model)
+
+    def ingest_controller_factory(self, model) -> Callable:
+
+        parameters = [
+            Parameter(
+                "request",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                annotation=Request,
+            ),
+            Parameter(
+                "db",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model.db_generator),
+                annotation=Session,
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        columns = [
+            c
+            for c in model.__table__.columns
+            if ((c.name != "id") or (c.type.python_type == str))
+            and c.name not in managed_columns(model)
+        ]
+        relationship_keys = [r.key for r in model.__mapper__.relationships]
+
+        cfg = model.create_cfg
+
+        async def inner(*args, **kwargs) -> IngestReport:
+            db = kwargs["db"]
+            request = kwargs["request"]
+
+            # the primary keys of the rows are only needed to publish them and to index them
+            returning = model._observes_writes()
+
+            report = IngestReport()
+
+            def fail(line_no, detail):
+                report.failed += 1
+                if len(report.errors) < cfg.ingest_max_errors:
+                    report.errors.append({"line": line_no, "detail": detail})
+
+            def flush(chunk):
+                # run in a worker thread, so writes don't block the event loop
+                if not chunk:
+                    return
+                try:
+                    primary_keys = write_rows(
+                        db, model, [row for _, row in chunk], returning
+                    )
+                    model._on_write("create", primary_keys, db)
+                    db.commit()
+                    report.inserted += len(chunk)
+                except Exception:
+                    db.rollback()
+                    # isolate the failing rows in savepoints, and commit the others together
+                    primary_keys = []
+                    for line_no, row in chunk:
+                        try:
+                            with db.begin_nested():
+                                primary_keys += write_rows(db, model, [row], returning)
+                            report.inserted += 1
+                        except Exception as e:
+                            fail(line_no, str(getattr(e, "orig", e)))
+                    model._on_write("create", primary_keys, db)
+                    db.commit()
+
+            def parse(line_no, line):
+                try:
+                    body = self.input_model.model_validate_json(line)
+                except ValidationError as e:
+                    fail(line_no, json.loads(e.json(include_url=False)))
+                    return None
+
+                if any(getattr(body, key) for key in relationship_keys):
+                    fail(line_no, "Relationship fields are not supported by ingest")
+                    return None
+
+                return {c.name: getattr(body, c.name) for c in columns}
+
+            try:
+                chunk: list[tuple[int, dict]] = []
+                buffer = b""
+                line_no = 0
+                # set while discarding the rest of a line longer than `ingest_max_line_bytes`
+                skipping = False
+
+                async for data in request.stream():
+                    buffer += data
+                    *lines, buffer = buffer.split(b"\n")
+
+                    for line in lines:
+                        line_no += 1
+                        if skipping:
+                            skipping = False
+                            continue
+                        if not line.strip():
+                            continue
+                        if len(line) > cfg.ingest_max_line_bytes:
+                            fail(line_no, "Line exceeds ingest_max_line_bytes")
+                            continue
+                        row = parse(line_no, line)
+                        if row is not None:
+                            chunk.append((line_no, row))
+                        if len(chunk) >= cfg.ingest_chunk_size:
+                            await run_in_threadpool(flush, chunk)
+                            chunk = []
+
+                    # the buffered line is incomplete, and already too long
+                    if len(buffer) > cfg.ingest_max_line_bytes:
+                        if not skipping:
+                            fail(line_no + 1, "Line exceeds ingest_max_line_bytes")
+                        skipping = True
+                        buffer = b""
+
+                if buffer.strip() and not skipping:
+                    line_no += 1
+                    row = parse(line_no, buffer)
+                    if row is not None:
+                        chunk.append((line_no, row))
+
+                await run_in_threadpool(flush, chunk)
+
+                # write errors are found after validation errors of later lines
+                report.errors.sort(key=lambda e: e["line"])
+
+                return report
+            except Exception as e:
+                raise model._error_handler(e)
+
+        @wraps(inner)
+        async def f(*args, **kwargs):
+            return await inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig  # type: ignore
+
+        return f
+
+
+def _has_python_default(c) -> bool:
+    # python-side column defaults, e.g. `default=uuid4`, aren't applied by COPY
+    return c.default is not None and (c.default.is_callable or c.default.is_scalar)
+
+
+class _CopyContext:
+    """
+    The execution context passed to callable column defaults of rows written with COPY,
+    e.g. HiLo ids, which reserve their blocks on `connection`.
+    """
+
+    def __init__(self, connection, row: dict):
+        self.connection = connection
+        self.current_parameters = row
+
+    def get_current_parameters(self, isolate_multiinsert_groups: bool = True) -> dict:
+        return self.current_parameters
+
+
+def _column_default(c, context: _CopyContext) -> Any:
+    if c.default.is_callable:
+        return c.default.arg(context)
+    return c.default.arg
+
+
+def copy_values(db, model, rows: list[dict]) -> tuple[list, list[list]]:
+    """
+    The columns and values of rows written with COPY: the columns of the rows, and the columns with python-side defaults,
+    which are only called for rows without a value (an explicit `None` is written as `NULL`).
+    Other columns are left to the database, e.g. autoincrement primary keys.
+    """
+    columns = [
+        c
+        for c in model.__table__.columns
+        if c.name in rows[0] or _has_python_default(c)
+    ]
+    connection = db.connection()
+    values = []
+    for row in rows:
+        context = _CopyContext(connection, row)
+        values.append(
+            [
+                row[c.name] if c.name in row else _column_default(c, context)
+                for c in columns
+            ]
+        )
+    return columns, values
+
+
+def _array_literal(value) -> str:
+    # a postgresql array literal, e.g. `{1.0,2.0}`
+    def element(v) -> str:
+        if v is None:
+            return "NULL"
+        if isinstance(v, (list, tuple)):
+            return _array_literal(v)
+        if isinstance(v, (int, float)):
+            return str(v)
+        return '"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    return "{" + ",".join(element(v) for v in value) + "}"
+
+
+def _copy_encoder(c, dialect) -> Optional[Callable]:
+    # the encoding of a column's values that drivers don't adapt for COPY
+    impl = c.type.dialect_impl(dialect)
+    if isinstance(impl, TypeDecorator):
+        impl = impl.impl_instance
+    if isinstance(impl, JSON):
+        return json.dumps
+    if isinstance(impl, ARRAY) and dialect.driver == "psycopg2":
+        return _array_literal
+    return None
+
+
+def copy_rows(columns: list, values: list[list], dialect) -> list[list]:
+    """
+    Encode the values of rows written with COPY, i.e. JSON columns as JSON text,
+    and (with psycopg2, which writes text) array columns as array literals.
+    """
+    encoders = [_copy_encoder(c, dialect) for c in columns]
+    if not any(encoders):
+        return values
+    return [
+        [
+            v if encode is None or v is None else encode(v)
+            for encode, v in zip(encoders, row)
+        ]
+        for row in values
+    ]
+
+
+def _copy_text(value) -> str:
+    # a field of COPY's text format
+    if value is None:
+        return "\\N"
+    if isinstance(value, bytes):
+        return "\\\\x" + value.hex()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def write_rows(db, model, rows: list[dict], returning: bool = False) -> list:
+    """
+    Write a chunk of rows to the resource table.
+    Uses `COPY ... FROM STDIN` on postgresql (with the psycopg or psycopg2 drivers),
+    and a multi-row insert (i.e. `executemany`) otherwise.
+    Returns the primary keys of the rows if `returning` is set, otherwise an empty list.
+    """
+
+    table = model.__table__
+    primary_key = table.columns[model.primary_key]
+    dialect = db.get_bind().dialect
+
+    if (
+        dialect.name != "postgresql"
+        or dialect.driver not in ["psycopg", "psycopg2"]
+        # COPY can't return the primary keys assigned by the database
+        or (
+            returning
+            and primary_key.name not in rows[0]
+            and not _has_python_default(primary_key)
+        )
+    ):
+        if returning:
+            return list(
+                db.execute(insert(table).returning(primary_key), rows).scalars()
+            )
+        db.execute(insert(table), rows)
+        return []
+
+    columns, values = copy_values(db, model, rows)
+
+    sql = "COPY {} ({}) FROM STDIN".format(
+        table.name, ", ".join(f'"{c.name}"' for c in columns)
+    )
+
+    cursor = db.connection().connection.cursor()
+    try:
+        rows_out = copy_rows(columns, values, dialect)
+        if dialect.driver == "psycopg":
+            with cursor.copy(sql) as copy:
+                for row in rows_out:
+                    copy.write_row(row)
+        else:
+            buffer = io.StringIO(
+                "".join(
+                    "\t".join(_copy_text(v) for v in row) + "\n" for row in rows_out
+                )
+            )
+            cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+    if not returning:
+        return []
+    index = columns.index(primary_key)
+    return [row[index] for row in values]
@@ -1,13 +1,15 @@
 from abc import ABC
 from functools import wraps
 from inspect import Parameter, signature
-from typing import Callable, Optional
+from typing import Any, Callable, Literal, Optional
 
-from fastapi import Depends
+from fastapi import Depends, HTTPException
+from pydantic import create_model
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
 
 from quickrest.mixins.base import BaseMixin, RESTFactory
+from quickrest.mixins.changes import record_tombstones, tracks_changes
 from quickrest.mixins.utils import classproperty
 
 
@@ -50,6 +52,8 @@ class DeleteConfig(ABC):
         operation_id (str, optional): Operation ID of the endpoint. Optional, defaults to `None`.
         tags (list[str], optional): Tags for the endpoint. Optional, defaults to `None`.
         dependencies (list[Callable]): Injectable callable dependencies for the endpoint. Optional, defaults to `[]`.
+        bulk (bool): Add the bulk delete routes, see `DeleteMixin`. Optional, defaults to `False`.
+        bulk_limit (int): The maximum number of resources a bulk delete can remove. Optional, defaults to `1000`.
 
     """
 
@@ -59,6 +63,10 @@ class DeleteConfig(ABC):
     tags: Optional[list[str]] = None
     dependencies: list[Callable] = []
 
+    # bulk delete
+    bulk: bool = False
+    bulk_limit: int = 1000
+
 
 class DeleteMixin(BaseMixin):
     """
@@ -79,6 +87,29 @@ class DeleteMixin(BaseMixin):
     | Request  | Path: `{primary_key}` </br> Query: `<none>` </br> Body: `<none>` |
     | Success Response | 200 OK: `int` |
 
+    ## Endpoints - Bulk Delete Resources
+
+        DELETE /{resource_name}?{search_filters}
+        POST /{resource_name}/bulk-delete
+
+    If `DeleteConfig.bulk` is set, resources can be deleted in bulk,
+    either by [search filters](search.md#quickrest.mixins.search.SearchMixin) in the query string,
+    or by a list of primary keys in the request body, e.g. `{"ids": ["a", "b"]}`.
+    Each bulk delete runs as a single `DELETE` statement, subject to the resource's access control.
+    At least one search filter is required on the `DELETE` route, so that the whole table isn't deleted by accident.
+
+    The primary keys of the resources to delete are selected first (at most `bulk_limit + 1` of them),
+    and exactly those resources are deleted.
+    If a bulk delete would remove more than `bulk_limit` resources, a `400` is returned and nothing is deleted.
+    The response is the number of resources deleted.
+
+    | Property | Description |
+    | :--- | :---- |
+    | Method | `DELETE` / `POST` |
+    | Route | `/{resource_name}` / `/{resource_name}/bulk-delete` |
+    | Request  | Path: `<none>` </br> Query: search filters / `<none>` </br> Body: `<none>` / `{"ids": list}` |
+    | Success Response | 200 OK: `int` |
+
     """
 
     _delete = None
@@ -104,6 +135,10 @@ class DeleteFactory(RESTFactory):
         self.controller = self.controller_factory(model)
         self.ROUTE = f"/{{{model.primary_key}}}"
 
+        primary_key_type = str if model.primary_key == "slug" else model._id_type
+        fields: Any = {"ids": (list[primary_key_type], ...)}  # type: ignore
+        self.bulk_input_model = create_model("BulkDelete" + model.__name__, **fields)
+
     def controller_factory(self, model):
 
         primary_key_type = str if model.primary_key == "slug" else model._id_type
@@ -141,9 +176,20 @@ class DeleteFactory(RESTFactory):
                 if hasattr(model, "access_control"):
                     Q = model.access_control(Q, user)
 
+                if tracks_changes(model):
+                    model.changes.ensure_tombstone_table(db)
+
+                # before the delete, so that subscribers are checked against the resource
+                model._on_write("delete", [primary_key], db)
+
+                if tracks_changes(model):
+                    record_tombstones(db, model, [primary_key])
+
                 n_deleted = Q.delete()
 
                 if n_deleted == 0:
+                    # e.g. the tombstone
+                    db.rollback()
                     raise NoResultFound
 
                 db.commit()
@@ -161,3 +207,134 @@ class DeleteFactory(RESTFactory):
         f.__signature__ = sig
 
         return f
+
+    def attach_route(self, model) -> None:
+
+        cfg = model.delete_cfg
+
+        if cfg.bulk:
+            if getattr(model, "search_cfg", None) is not None:
+                model.router.add_api_route(
+                    "",
+                    self.bulk_controller_factory(model, by="filter"),
+                    description=cfg.description,
+                    dependencies=[Depends(d) for d in cfg.dependencies],
+                    summary="bulk delete " + model.__name__.lower() + " by search",
+                    tags=cfg.tags or [model.__name__],
+                    operation_id=f"bulk_delete_{model.__tablename__}_by_search",
+                    methods=[self.METHOD],
+                    response_model=int,
+                )
+            model.router.add_api_route(
+                "/bulk-delete",
+                self.bulk_controller_factory(model, by="ids"),
+                description=cfg.description,
+                dependencies=[Depends(d) for d in cfg.dependencies],
+                summary="bulk delete " + model.__name__.lower() + " by id",
+                tags=cfg.tags or [model.__name__],
+                operation_id=f"bulk_delete_{model.__tablename__}_by_id",
+                methods=["POST"],
+                response_model=int,
+            )
+
+        super().attach_route(model)
+
+    def bulk_controller_factory(self, model, by: Literal["filter", "ids"]):
+
+        primary_key_column = getattr(model, model.primary_key)
+
+        if by == "filter":
+            selector = Parameter(
+                "query",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model.search.filter_bridge()),
+                annotation=model.search.input_model,
+            )
+        else:
+            selector = Parameter(
+                "body",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=...,
+                annotation=self.bulk_input_model,
+            )
+
+        parameters = [
+            selector,
+            Parameter(
+                "db",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model.db_generator),
+                annotation=Session,
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        def inner(*args, **kwargs) -> int:
+
+            try:
+                db = kwargs["db"]
+                user = kwargs["user"]
+
+                Q = db.query(model)
+                if by == "filter":
+                    if not model.search.has_filters(kwargs["query"]):
+                        raise HTTPException(
+                            status_code=400,
+                            detail="At least one search filter is required for a bulk delete",
+                        )
+                    Q = model.search.filter_query(model, Q, kwargs["query"], user)
+                else:
+                    Q = Q.filter(
+                        getattr(model, model.primary_key).in_(kwargs["body"].ids)
+                    )
+                if hasattr(model, "access_control"):
+                    Q = model.access_control(Q, user)
+                # e.g. the relevance order of a ranked search
+                Q = Q.order_by(None)
+
+                # the resources are found once, and deleted by their primary keys
+                primary_keys = [
+                    pk
+                    for (pk,) in Q.with_entities(primary_key_column).limit(
+                        model.delete_cfg.bulk_limit + 1
+                    )
+                ]
+                if len(primary_keys) > model.delete_cfg.bulk_limit:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Bulk delete would remove more than the limit of {model.delete_cfg.bulk_limit} resources",
+                    )
+
+                if tracks_changes(model):
+                    model.changes.ensure_tombstone_table(db)
+
+                Q = db.query(model).filter(primary_key_column.in_(primary_keys))
+
+                # before the delete, so that subscribers are checked against the resources
+                model._on_write("delete", primary_keys, db)
+
+                if tracks_changes(model):
+                    record_tombstones(db, model, primary_keys)
+
+                n_deleted = Q.delete(synchronize_session=False)
+
+                db.commit()
+                return n_deleted
+            except Exception as e:
+                raise model._error_handler(e)
+
+        @wraps(inner)
+        def f(*args, **kwargs):
+            return inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig  # type: ignore
+
+        return f
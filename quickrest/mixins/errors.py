@@ -6,7 +6,9 @@ from sqlalchemy.orm.exc import NoResultFound
 
 
 def default_error_handler(e: Exception):
-    if isinstance(e, NoResultFound):
+    if isinstance(e, HTTPException):
+        return e
+    elif isinstance(e, NoResultFound):
         return HTTPException(status_code=404, detail="Resource not found")
     else:
         logging.error(traceback.format_exc())
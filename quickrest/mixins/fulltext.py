@@ -0,0 +1,240 @@
+"""
+Full-text search indexes for the `q` parameter of the search routes, see `SearchConfig.search_fulltext`.
+
+On sqlite, the indexed fields are copied into an [FTS5](https://www.sqlite.org/fts5.html) external-content table,
+`{table}_fts`, which is kept in sync with the resource table by insert, update and delete triggers.
+FTS5 identifies rows by an integer key that must not change, unlike the implicit `rowid` of a table, which `VACUUM` can renumber.
+Tables with an integer primary key (i.e. an alias of the `rowid`, which `VACUUM` keeps) are keyed by their primary key.
+Other tables are keyed by a `{table}_fts_keys` table, which assigns an `INTEGER PRIMARY KEY` to each primary key of the resource table.
+Queries are split into terms that must all match, and results are ranked by bm25.
+
+On postgresql, the indexed fields are concatenated into a generated `tsvector` column, `quickrest_tsv`,
+with a GIN index. Queries are parsed with `websearch_to_tsquery` (i.e. supporting quoted phrases, `or` and `-`),
+and results are ranked by `ts_rank`.
+
+The index is created by `Base.metadata.create_all` with the resource table,
+or, if the resource table already exists, when the resource is mounted.
+Existing rows are indexed when the index is created.
+"""
+
+from typing import Any, Optional
+
+from sqlalchemy import (
+    Integer,
+    Table,
+    event,
+    func,
+    inspect,
+    literal_column,
+    select,
+    text,
+)
+from sqlalchemy.engine import Connection
+
+TSVECTOR_COLUMN = "quickrest_tsv"
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def fts_table_name(table_name: str) -> str:
+    return f"{table_name}_fts"
+
+
+def fts_keys_table_name(table_name: str) -> str:
+    return f"{table_name}_fts_keys"
+
+
+def _integer_primary_key(table: Table) -> Optional[str]:
+    # the integer primary key of a table, i.e. an alias of its `rowid` on sqlite
+    (column,) = table.primary_key.columns
+    return column.name if isinstance(column.type, Integer) else None
+
+
+def _sqlite_ddl(table: Table, columns: list[str], language: str) -> list[str]:
+
+    table_name = table.name
+    fts = _quote(fts_table_name(table_name))
+    quoted = _quote(table_name)
+    cols = ", ".join(_quote(c) for c in columns)
+    new = ", ".join("new." + _quote(c) for c in columns)
+    old = ", ".join("old." + _quote(c) for c in columns)
+    tokenize = "porter unicode61" if language == "english" else "unicode61"
+
+    integer_primary_key = _integer_primary_key(table)
+    if integer_primary_key is not None:
+        key = _quote(integer_primary_key)
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+            f"content={quoted}, content_rowid={key}, tokenize='{tokenize}')",
+            f'CREATE TRIGGER IF NOT EXISTS "{table_name}_fts_ai" AFTER INSERT ON {quoted} BEGIN '
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{key}, {new}); END",
+            f'CREATE TRIGGER IF NOT EXISTS "{table_name}_fts_ad" AFTER DELETE ON {quoted} BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{key}, {old}); END",
+            f'CREATE TRIGGER IF NOT EXISTS "{table_name}_fts_au" AFTER UPDATE ON {quoted} BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{key}, {old}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{key}, {new}); END",
+        ]
+
+    # the FTS5 content is read through a view of the keys joined to the resource table
+    (primary_key,) = [_quote(c.name) for c in table.primary_key.columns]
+    keys = _quote(fts_keys_table_name(table_name))
+    content = _quote(f"{table_name}_fts_content")
+    t_cols = ", ".join("t." + _quote(c) for c in columns)
+    old_key = f"(SELECT id FROM {keys} WHERE key = old.{primary_key})"
+    new_key = f"(SELECT id FROM {keys} WHERE key = new.{primary_key})"
+    return [
+        f"CREATE TABLE IF NOT EXISTS {keys} (id INTEGER PRIMARY KEY, key UNIQUE NOT NULL)",
+        f"CREATE VIEW IF NOT EXISTS {content} AS SELECT k.id AS id, {t_cols} "
+        f"FROM {keys} k JOIN {quoted} t ON t.{primary_key} = k.key",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content={content}, content_rowid='id', tokenize='{tokenize}')",
+        f'CREATE TRIGGER IF NOT EXISTS "{table_name}_fts_ai" AFTER INSERT ON {quoted} BEGIN '
+        f"INSERT INTO {keys}(key) VALUES (new.{primary_key}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES ({new_key}, {new}); END",
+        f'CREATE TRIGGER IF NOT EXISTS "{table_name}_fts_ad" AFTER DELETE ON {quoted} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', {old_key}, {old}); "
+        f"DELETE FROM {keys} WHERE key = old.{primary_key}; END",
+        f'CREATE TRIGGER IF NOT EXISTS "{table_name}_fts_au" AFTER UPDATE ON {quoted} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', {old_key}, {old}); "
+        f"UPDATE {keys} SET key = new.{primary_key} WHERE key = old.{primary_key}; "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES ({new_key}, {new}); END",
+    ]
+
+
+def _postgresql_ddl(table_name: str, columns: list[str], language: str) -> list[str]:
+
+    table = _quote(table_name)
+    document = " || ' ' || ".join(f"coalesce({_quote(c)}, '')" for c in columns)
+
+    return [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {TSVECTOR_COLUMN} tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{language}'::regconfig, {document})) STORED",
+        f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{TSVECTOR_COLUMN}" '
+        f"ON {table} USING GIN ({TSVECTOR_COLUMN})",
+    ]
+
+
+def create_fulltext_index(
+    connection: Connection, table: Table, columns: list[str], language: str
+) -> None:
+    """
+    Create the full-text index of a resource table, if it doesn't already exist.
+
+    Args:
+        connection (Connection): A connection to the database.
+        table (Table): The resource table.
+        columns (list[str]): The string columns to index.
+        language (str): The postgresql text search configuration, e.g. `"english"` or `"simple"`.
+    """
+
+    dialect_name = connection.dialect.name
+    table_name = table.name
+
+    if dialect_name == "sqlite":
+        exists = inspect(connection).has_table(fts_table_name(table_name))
+        for statement in _sqlite_ddl(table, columns, language):
+            connection.execute(text(statement))
+        if not exists:
+            # index the existing rows
+            if _integer_primary_key(table) is None:
+                (primary_key,) = [_quote(c.name) for c in table.primary_key.columns]
+                connection.execute(
+                    text(
+                        f"INSERT OR IGNORE INTO {_quote(fts_keys_table_name(table_name))}(key) "
+                        f"SELECT {primary_key} FROM {_quote(table_name)}"
+                    )
+                )
+            fts = _quote(fts_table_name(table_name))
+            connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    elif dialect_name == "postgresql":
+        for statement in _postgresql_ddl(table_name, columns, language):
+            connection.execute(text(statement))
+    else:
+        raise ValueError(f"Full-text search is not supported for {dialect_name}")
+
+
+def drop_fulltext_index(connection: Connection, table_name: str) -> None:
+    # the postgresql column and index, and the sqlite triggers, are dropped with the table
+    if connection.dialect.name == "sqlite":
+        connection.execute(
+            text(f"DROP TABLE IF EXISTS {_quote(fts_table_name(table_name))}")
+        )
+        connection.execute(
+            text(f"DROP VIEW IF EXISTS {_quote(f'{table_name}_fts_content')}")
+        )
+        connection.execute(
+            text(f"DROP TABLE IF EXISTS {_quote(fts_keys_table_name(table_name))}")
+        )
+
+
+def register_fulltext_index(model, columns: list[str], language: str) -> None:
+    """
+    Create the full-text index of a resource with its table, and now, if the table already exists.
+    """
+
+    table = model.__table__
+
+    if not event.contains(table, "after_create", _after_create):
+        event.listen(table, "after_create", _after_create)
+        event.listen(table, "before_drop", _before_drop)
+    table.info["quickrest_fulltext"] = (columns, language)
+
+    engine = model._sessionmaker.kw.get("bind")
+    if engine is not None:
+        with engine.begin() as connection:
+            if inspect(connection).has_table(table.name):
+                create_fulltext_index(connection, table, columns, language)
+
+
+def _after_create(table, connection, **kwargs) -> None:
+    columns, language = table.info["quickrest_fulltext"]
+    create_fulltext_index(connection, table, columns, language)
+
+
+def _before_drop(table, connection, **kwargs) -> None:
+    drop_fulltext_index(connection, table.name)
+
+
+def fulltext_query(model, Q, q: str, language: str) -> Any:
+    """
+    Filter the query `Q` to resources matching the full-text query `q`, ranked by relevance.
+    """
+
+    dialect_name = Q.session.get_bind().dialect.name
+    table_name = model.__table__.name
+
+    if dialect_name == "sqlite":
+        # quote each term, so that FTS5 syntax in the query can't raise errors
+        terms = ['"' + term.replace('"', '""') + '"' for term in q.split()]
+        if not terms:
+            return Q
+        fts = _quote(fts_table_name(table_name))
+        if _integer_primary_key(model.__table__) is not None:
+            key: Any = literal_column(f"{fts}.rowid")
+            source: Any = text(fts)
+        else:
+            keys = _quote(fts_keys_table_name(table_name))
+            key = literal_column(f"{keys}.key")
+            source = text(f"{fts} JOIN {keys} ON {keys}.id = {fts}.rowid")
+        matches = (
+            select(key.label("key"), literal_column(f"{fts}.rank").label("rank"))
+            .select_from(source)
+            .where(literal_column(fts).op("MATCH")(" ".join(terms)))
+            .subquery()
+        )
+        # joined on the primary key of the table, rather than its `rowid`
+        (primary_key,) = model.__table__.primary_key.columns
+        return Q.join(matches, primary_key == matches.c.key).order_by(matches.c.rank)
+
+    if dialect_name == "postgresql":
+        tsv: Any = literal_column(f"{_quote(table_name)}.{TSVECTOR_COLUMN}")
+        tsquery = func.websearch_to_tsquery(
+            literal_column(f"'{language}'::regconfig"), q
+        )
+        return Q.filter(tsv.op("@@")(tsquery)).order_by(
+            func.ts_rank(tsv, tsquery).desc()
+        )
+
+    raise ValueError(f"Full-text search is not supported for {dialect_name}")
@@ -0,0 +1,171 @@
+"""
+HiLo (block) allocation of integer primary keys.
+
+Resources built with `build_resource(id_type=int, id_block_size=n)` don't use database-generated autoincrement ids.
+Instead, each worker reserves blocks of `n` ids at a time from a sequence table, `quickrest_hilo`, and assigns them in memory.
+As ids are known before rows are inserted, inserts never wait on the database to return generated keys,
+and batched inserts (e.g. group commits and ingests) can be sent as a single `executemany`.
+
+The sequence table holds the next free id for each resource table, and is created when the first block is reserved.
+It's seeded from the largest existing id, so HiLo allocation can be switched on for tables with existing rows.
+Ids are unique, but not gap-free: unused ids in a worker's block are skipped when the worker exits.
+
+!!! note
+    Blocks are reserved in their own transaction, so a reservation is never rolled back with the insert that triggered it.
+    On sqlite, which only allows one writer at a time, blocks are reserved in the transaction of the triggering insert instead.
+    If that transaction is rolled back, the rest of the block is dropped, as another worker may reserve the same ids.
+"""
+
+import threading
+from typing import Callable, Optional
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    MetaData,
+    String,
+    Table,
+    case,
+    column,
+    event,
+    func,
+    insert,
+    select,
+    table,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+
+hilo_metadata = MetaData()
+
+hilo_table = Table(
+    "quickrest_hilo",
+    hilo_metadata,
+    Column("name", String, primary_key=True),
+    Column("next_id", BigInteger, nullable=False),
+)
+
+
+class HiLoAllocator:
+    """
+    Reserves blocks of ids from the sequence table, and assigns them in memory.
+
+    Args:
+        block_size (int): The number of ids reserved at a time.
+        sessionmaker (Callable): The resource's sessionmaker, used to reserve blocks outside of a statement context.
+    """
+
+    def __init__(self, block_size: int, sessionmaker: Callable):
+        if block_size < 1:
+            raise ValueError(f"id_block_size must be positive, got {block_size}")
+        self.block_size = block_size
+        self.sessionmaker = sessionmaker
+        # re-entrant, as a savepoint rolled back while a block is reserved drops blocks
+        self._lock = threading.RLock()
+        self._blocks: dict[str, tuple[int, int]] = {}
+        self._high_water: dict[str, int] = {}
+        # the blocks reserved in the open transaction of each (sqlite) connection
+        self._uncommitted: WeakKeyDictionary = WeakKeyDictionary()
+
+    def default(self, table_name: str) -> Callable:
+        """Build a column default that assigns ids for `table_name`."""
+
+        # `context` must be a required argument, or SQLAlchemy calls the default without the execution context
+        def next_id(context) -> int:
+            return self.next_id(table_name, context)
+
+        return next_id
+
+    def next_id(self, table_name: str, context=None) -> int:
+        with self._lock:
+            start, end = self._blocks.get(table_name, (0, 0))
+            if start >= end:
+                start, end = self._reserve(table_name, context)
+            self._blocks[table_name] = (start + 1, end)
+            return start
+
+    def _reserve(self, table_name: str, context) -> tuple[int, int]:
+        if context is not None:
+            connection = context.connection
+            if connection.dialect.name == "sqlite":
+                start = self._reserve_on(connection, table_name)
+                block = self._block(table_name, start)
+                self._track(connection, table_name, block)
+                return block
+            engine = connection.engine
+        else:
+            with self.sessionmaker() as session:
+                engine = session.get_bind()
+
+        with engine.begin() as connection:
+            start = self._reserve_on(connection, table_name)
+        return self._block(table_name, start)
+
+    def _block(self, table_name: str, start: int) -> tuple[int, int]:
+        end = start + self.block_size
+        self._high_water[table_name] = end
+        return start, end
+
+    def _track(self, connection, table_name: str, block: tuple[int, int]) -> None:
+        # the block is dropped if the transaction it was reserved in is rolled back
+        if connection not in self._uncommitted:
+            self._uncommitted[connection] = []
+            event.listen(connection, "commit", self._on_commit)
+            event.listen(connection, "rollback", self._on_rollback)
+            # a savepoint may or may not hold the reservation, so its blocks are dropped too
+            event.listen(connection, "rollback_savepoint", self._on_rollback)
+        self._uncommitted[connection].append((table_name, block))
+
+    def _on_commit(self, connection) -> None:
+        self._uncommitted[connection].clear()
+
+    def _on_rollback(self, connection, *args) -> None:
+        with self._lock:
+            for table_name, (_, end) in self._uncommitted[connection]:
+                if self._blocks.get(table_name, (0, 0))[1] == end:
+                    del self._blocks[table_name]
+            self._uncommitted[connection].clear()
+
+    def _reserve_on(self, connection, table_name: str) -> int:
+        hilo_table.create(connection, checkfirst=True)
+
+        # never re-issue ids, e.g. those of a block that was rolled back on sqlite (and may have been handed out),
+        # so the sequence is moved past the ids this worker has reserved
+        floor = self._high_water.get(table_name, 0)
+
+        for _ in range(2):
+            next_id = self._advance(connection, table_name, floor)
+            if next_id is not None:
+                return next_id - self.block_size
+
+            # seed the sequence from the existing ids
+            ids = table(table_name, column("id"))
+            seed = connection.execute(
+                select(func.coalesce(func.max(ids.c.id), 0) + 1)
+            ).scalar_one()
+            seed = max(seed, floor)
+            try:
+                with connection.begin_nested():
+                    connection.execute(
+                        insert(hilo_table).values(
+                            name=table_name, next_id=seed + self.block_size
+                        )
+                    )
+                return seed
+            except IntegrityError:
+                # another worker seeded the sequence first
+                continue
+
+        raise RuntimeError(f"Could not reserve ids for {table_name}")
+
+    def _advance(self, connection, table_name: str, floor: int) -> Optional[int]:
+        next_id = hilo_table.c.next_id
+        return connection.execute(
+            update(hilo_table)
+            .where(hilo_table.c.name == table_name)
+            .values(
+                next_id=case((next_id > floor, next_id), else_=floor) + self.block_size
+            )
+            .returning(hilo_table.c.next_id)
+        ).scalar_one_or_none()
@@ -3,13 +3,20 @@ from functools import wraps
 from inspect import Parameter, signature
 from typing import Any, Callable, Optional
 
-from fastapi import Depends
+from fastapi import Depends, Header, HTTPException, Response
 from pydantic import BaseModel, create_model
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.orm.exc import NoResultFound, StaleDataError
 
 from quickrest.mixins.base import BaseMixin, RESTFactory
 from quickrest.mixins.utils import classproperty
+from quickrest.mixins.versioned import (
+    check_if_match,
+    etag,
+    is_versioned,
+    managed_columns,
+    version_bump,
+)
 
 
 class PatchConfig(ABC):
@@ -60,6 +67,8 @@ class PatchConfig(ABC):
         dependencies (list[Callable]): Injectable callable dependencies for the endpoint. Optional, defaults to `[]`.
         patchable_params ( Optional[list[str]): A list of parameters that can be patched. Optional, defaults to `None`.
         nonpatchable_params ( Optional[list[str]): A list of parameters that cannot be patched. Optional, defaults to `None`.
+        bulk (bool): Add the bulk patch route, see `PatchMixin`. Optional, defaults to `False`.
+        bulk_limit (int): The maximum number of resources a bulk patch can update. Optional, defaults to `1000`.
 
     """
 
@@ -74,6 +83,10 @@ class PatchConfig(ABC):
     patchable_params: Optional[list[str]] = None
     nonpatchable_params: Optional[list[str]] = None
 
+    # bulk patch
+    bulk: bool = False
+    bulk_limit: int = 1000
+
 
 class PatchMixin(BaseMixin):
     """
@@ -133,6 +146,28 @@ class PatchMixin(BaseMixin):
     | Request  | Path: `{primary_key}` </br> Query: `<none>` </br> Body: Resource PatchModel |
     | Success Response | 200 OK: Resource [BaseModel](resource.md#quickrest.mixins.resource.ResourceMixin._build_basemodel) |
 
+    ## Endpoint - Bulk Patch Resources
+
+        PATCH /{resource_name}/bulk?{search_filters}
+
+    If `PatchConfig.bulk` is set, resources can be patched in bulk.
+    The resources to patch are selected by [search filters](search.md#quickrest.mixins.search.SearchMixin) in the query string,
+    and/or a list of primary keys in the request body, and at least one of these is required.
+    The request body is `{"ids": [...], "patch": PatchModel}`, where only the fields set on the PatchModel are updated.
+    Relationship fields can't be bulk patched.
+
+    Each bulk patch selects the primary keys of the resources to update (at most `bulk_limit + 1` of them),
+    subject to the resource's access control, and updates exactly those resources with a single `UPDATE` statement.
+    If a bulk patch would update more than `bulk_limit` resources, a `400` is returned and nothing is updated.
+    The response is the number of resources updated.
+
+    | Property | Description |
+    | :--- | :---- |
+    | Method | `PATCH` |
+    | Route | `/{resource_name}/bulk` |
+    | Request  | Path: `<none>` </br> Query: search filters </br> Body: `{"ids": list, "patch": PatchModel}` |
+    | Success Response | 200 OK: `int` |
+
     """
 
     _patch = None
@@ -157,6 +192,13 @@ class PatchFactory(RESTFactory):
         self.controller = self.controller_factory(model)
         self.ROUTE = f"/{{{model.primary_key}}}"
 
+        primary_key_type = str if model.primary_key == "slug" else model._id_type
+        fields: Any = {
+            "ids": (Optional[list[primary_key_type]], None),  # type: ignore
+            "patch": (self.input_model, ...),
+        }
+        self.bulk_input_model = create_model("BulkPatch" + model.__name__, **fields)
+
     def _generate_input_model(self, model) -> BaseModel:
 
         cols = [c for c in model.__table__.columns]
@@ -165,7 +207,7 @@ class PatchFactory(RESTFactory):
             c.name: (Optional[c.type.python_type], None)
             for c in cols
             # filter ID field if it's not a (user-provided) string
-            if c.name != "id"
+            if c.name != "id" and c.name not in managed_columns(model)
         }
 
         # map relationship fields
@@ -222,6 +264,24 @@ class PatchFactory(RESTFactory):
             ),
         ]
 
+        if is_versioned(model):
+            parameters.insert(
+                0,
+                Parameter(
+                    "response",
+                    Parameter.POSITIONAL_OR_KEYWORD,
+                    annotation=Response,
+                ),
+            )
+            parameters.append(
+                Parameter(
+                    "if_match",
+                    Parameter.POSITIONAL_OR_KEYWORD,
+                    default=Header(None),
+                    annotation=Optional[str],
+                ),
+            )
+
         async def inner(*args, **kwargs) -> model:
 
             try:
@@ -240,10 +300,16 @@ class PatchFactory(RESTFactory):
                 if not obj:
                     raise NoResultFound
 
+                if is_versioned(model):
+                    # optimistic concurrency
+                    check_if_match(
+                        kwargs.get("if_match"), etag(obj.version, obj.updated_at)
+                    )
+
                 # patch column attributes
                 for c in model.__table__.columns:
                     if c.name != "id":
-                        if getattr(patch, c.name):
+                        if getattr(patch, c.name, None):
                             setattr(obj, c.name, getattr(patch, c.name))
 
                 # patch relationship attributes
@@ -279,10 +345,22 @@ class PatchFactory(RESTFactory):
 
                         setattr(obj, r.key, related_objs)
 
+                db.flush()
+                model._on_write("patch", [primary_key], db)
                 db.commit()
                 db.refresh(obj)
 
+                if is_versioned(model) and kwargs.get("response") is not None:
+                    kwargs["response"].headers["ETag"] = etag(
+                        obj.version, obj.updated_at
+                    )
+
                 return model.basemodel.model_validate(obj, from_attributes=True)
+            except StaleDataError:
+                # the resource was updated concurrently
+                raise model._error_handler(
+                    HTTPException(status_code=412, detail="Resource has been modified")
+                )
             except Exception as e:
                 raise model._error_handler(e)
 
@@ -296,3 +374,132 @@ class PatchFactory(RESTFactory):
         f.__signature__ = sig
 
         return f
+
+    def attach_route(self, model) -> None:
+
+        cfg = model.patch_cfg
+
+        # attached first, so that `/bulk` isn't matched as a primary key
+        if cfg.bulk:
+            model.router.add_api_route(
+                "/bulk",
+                self.bulk_controller_factory(model),
+                description=cfg.description,
+                dependencies=[Depends(d) for d in cfg.dependencies],
+                summary="bulk patch " + model.__name__.lower(),
+                tags=cfg.tags or [model.__name__],
+                operation_id=f"bulk_patch_{model.__tablename__}",
+                methods=[self.METHOD],
+                response_model=int,
+            )
+
+        super().attach_route(model)
+
+    def bulk_controller_factory(self, model):
+
+        parameters = [
+            Parameter(
+                "body",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=...,
+                annotation=self.bulk_input_model,
+            ),
+            Parameter(
+                "db",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model.db_generator),
+                annotation=Session,
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        searchable = getattr(model, "search_cfg", None) is not None
+        if searchable:
+            parameters.insert(
+                0,
+                Parameter(
+                    "query",
+                    Parameter.POSITIONAL_OR_KEYWORD,
+                    default=Depends(model.search.filter_bridge()),
+                    annotation=model.search.input_model,
+                ),
+            )
+
+        relationship_keys = [r.key for r in model.__mapper__.relationships]
+
+        async def inner(*args, **kwargs) -> int:
+
+            try:
+                db = kwargs["db"]
+                user = kwargs["user"]
+                body = kwargs["body"]
+                query = kwargs.get("query")
+
+                values = body.patch.model_dump(exclude_unset=True)
+
+                if any(key in relationship_keys for key in values):
+                    raise HTTPException(
+                        status_code=422,
+                        detail="Relationship fields can't be bulk patched",
+                    )
+                if not values:
+                    raise HTTPException(status_code=422, detail="No fields to patch")
+
+                filtered = query is not None and model.search.has_filters(query)
+                if body.ids is None and not filtered:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="A list of ids or at least one search filter is required for a bulk patch",
+                    )
+
+                Q = db.query(model)
+                if filtered:
+                    Q = model.search.filter_query(model, Q, query, user)
+                if body.ids is not None:
+                    Q = Q.filter(getattr(model, model.primary_key).in_(body.ids))
+                if hasattr(model, "access_control"):
+                    Q = model.access_control(Q, user)
+                # e.g. the relevance order of a ranked search
+                Q = Q.order_by(None)
+
+                # the resources are found once, and updated by their primary keys
+                primary_key_column = getattr(model, model.primary_key)
+                primary_keys = [
+                    pk
+                    for (pk,) in Q.with_entities(primary_key_column).limit(
+                        model.patch_cfg.bulk_limit + 1
+                    )
+                ]
+                if len(primary_keys) > model.patch_cfg.bulk_limit:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Bulk patch would update more than the limit of {model.patch_cfg.bulk_limit} resources",
+                    )
+
+                Q = db.query(model).filter(primary_key_column.in_(primary_keys))
+
+                n_updated = Q.update(
+                    {**values, **version_bump(model)}, synchronize_session=False
+                )
+
+                model._on_write("patch", primary_keys, db)
+                db.commit()
+                return n_updated
+            except Exception as e:
+                raise model._error_handler(e)
+
+        @wraps(inner)
+        async def f(*args, **kwargs):
+            return await inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig  # type: ignore
+
+        return f
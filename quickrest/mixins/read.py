@@ -1,14 +1,50 @@
 from abc import ABC
 from functools import wraps
 from inspect import Parameter, signature
-from typing import Callable, Optional
+from typing import Any, Callable, Optional
 
-from fastapi import Depends
+from fastapi import Depends, Header, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import LargeBinary, cast, func, literal, literal_column, select
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
 
 from quickrest.mixins.base import BaseMixin, RESTFactory
+from quickrest.mixins.render import check_renderable, json_row_query
 from quickrest.mixins.utils import classproperty
+from quickrest.mixins.versioned import etag, etag_matches, is_versioned
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Parse a single-range HTTP `Range` header into inclusive (start, end) byte positions.
+    Returns `None` if the whole value should be served.
+    """
+
+    if not header or not header.startswith("bytes=") or "," in header:
+        # missing, malformed, or multi-range requests are served in full
+        return None
+
+    start_str, _, end_str = header[len("bytes=") :].strip().partition("-")
+
+    try:
+        if not start_str:
+            # suffix range, e.g. bytes=-500
+            start, end = max(size - int(end_str), 0), size - 1
+        else:
+            start = int(start_str)
+            end = min(int(end_str), size - 1) if end_str else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+
+    return start, end
 
 
 class ReadConfig(ABC):
@@ -58,6 +94,7 @@ class ReadConfig(ABC):
         tags (list[str], optional): Tags for the endpoint. Optional, defaults to `None`.
         dependencies (list[Callable]): Injectable callable dependencies for the endpoint. Optional, defaults to `[]`.
         routed_relationships (list[str]: List of relationship names to create paginated endpoints for. Strings must match the relationship attributes. Optional, defaults to `[]`.
+        render_in_db (bool): Render the resource as JSON in the database, see `SearchConfig`. Optional, defaults to `False`.
 
     """
 
@@ -69,6 +106,8 @@ class ReadConfig(ABC):
 
     routed_relationships: list[str] = []
 
+    render_in_db: bool = False
+
 
 class ReadMixin(BaseMixin):
     """
@@ -85,9 +124,29 @@ class ReadMixin(BaseMixin):
     | :--- | :---- |
     | Method | `GET` |
     | Route | `/{resource_name}/{primary_key}` |
-    | Request  | Path: `{primary_key}` </br> Query: `<none>` </br> Body: `<none>` |
+    | Request  | Path: `{primary_key}` </br> Query: `fields [str]` </br> Body: `<none>` |
     | Success Response | 200 OK: Resource [BaseModel](resource.md#BaseModel) |
 
+    The optional `fields` query parameter takes a comma-separated sparse fieldset, e.g. `?fields=id,name`.
+    Only those fields are loaded from the database and returned in the response.
+
+
+    ## Endpoints - Check Existence
+
+        HEAD /{resource_name}/{primary_key}
+
+    Checks whether a resource exists (and is accessible to the user), without loading or serializing it:
+    a single `SELECT 1 ... LIMIT 1` is run under the resource's access control.
+    The response is an empty `200 OK`, or a `404` if the resource doesn't exist.
+    [Versioned](versioned.md) resources also return their `ETag` header.
+
+    | Property | Description |
+    | :--- | :---- |
+    | Method | `HEAD` |
+    | Route | `/{resource_name}/{primary_key}` |
+    | Request  | Path: `{primary_key}` </br> Query: `<none>` </br> Body: `<none>` |
+    | Success Response | 200 OK: `<none>` |
+
 
     ## Endpoints - Read Related Resources
 
@@ -99,10 +158,30 @@ class ReadMixin(BaseMixin):
     | :--- | :---- |
     | Method | `GET` |
     | Route | `/{resource_name}/{primary_key}/{related_resource_name}` |
-    | Request  | Path: `{primary_key}` </br> Query: `limit [int]; page [int]` </br> Body: `<none>` |
+    | Request  | Path: `{primary_key}` </br> Query: `limit [int]; page [int]; fields [str]` </br> Body: `<none>` |
     | Success Response | 200 OK: Resource [PaginatedBaseModel](resource.md#PaginatedBaseModel) |
 
 
+    ## Endpoints - Read Deferred Columns
+
+        GET /{resource_name}/{primary_key}/{column_name}
+
+    Columns listed in `ResourceConfig.deferred_columns` are streamed from their own route.
+    The value is fetched from the database in chunks, so large values never need to be held in memory,
+    and single-range HTTP `Range` requests (e.g. `Range: bytes=0-1023`) are supported.
+    On postgresql, every chunk is read in one `REPEATABLE READ` transaction.
+    On sqlite, each chunk is read in its own short transaction, so slow downloads don't block writers,
+    and a write to the value while it's streamed ends the response early, rather than mixing versions of the value.
+    Text columns are served as utf-8 encoded `text/plain`, and binary columns as `application/octet-stream`.
+
+    | Property | Description |
+    | :--- | :---- |
+    | Method | `GET` |
+    | Route | `/{resource_name}/{primary_key}/{column_name}` |
+    | Request  | Path: `{primary_key}` </br> Header: `Range` </br> Body: `<none>` |
+    | Success Response | 200 OK or 206 Partial Content: the column value |
+
+
     ## Example:
 
     A simple example of how to define a one-to-many relationship between a `Parent` and `Child` resource, and create a paginated endpoint for the `children` relationship.
@@ -148,11 +227,75 @@ class ReadFactory(RESTFactory):
     METHOD = "GET"
     CFG_NAME = "read_cfg"
 
+    # the bytes read per query when a deferred column is streamed with `substr` on sqlite
+    SQLITE_READ_SIZE = 1 << 20
+
     def __init__(self, model):
 
         self.controller = self.controller_factory(model)
         self.ROUTE = f"/{{{model.primary_key}}}"
 
+    def exists_controller_factory(self, model) -> Callable:
+
+        primary_key_type = str if model.primary_key == "slug" else model._id_type
+
+        parameters = [
+            Parameter(
+                model.primary_key,
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=...,
+                annotation=primary_key_type,
+            ),
+            Parameter(
+                "db",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model.db_generator),
+                annotation=Session,
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        async def inner(*args, **kwargs) -> Response:
+
+            try:
+                db = kwargs["db"]
+                primary_key = kwargs[model.primary_key]
+                user = kwargs["user"]
+
+                Q = db.query(model)
+                Q = Q.filter(getattr(model, model.primary_key) == primary_key)
+                if hasattr(model, "access_control"):
+                    Q = model.access_control(Q, user)
+
+                if is_versioned(model):
+                    row = Q.with_entities(model.version, model.updated_at).first()
+                else:
+                    row = Q.with_entities(literal(1)).limit(1).first()
+
+                if row is None:
+                    raise NoResultFound
+
+                headers = {"ETag": etag(*row)} if is_versioned(model) else {}
+                return Response(status_code=200, headers=headers)
+            except Exception as e:
+                raise model._error_handler(e)
+
+        @wraps(inner)
+        async def f(*args, **kwargs):
+            return await inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig  # type: ignore
+
+        return f
+
     def controller_factory(self, model):
 
         primary_key_type = str if model.primary_key == "slug" else model._id_type
@@ -182,8 +325,33 @@ class ReadFactory(RESTFactory):
                 default=False,
                 annotation=bool,
             ),
+            Parameter(
+                "fields",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=None,
+                annotation=Optional[str],
+            ),
         ]
 
+        if is_versioned(model):
+            # the response is injected by fastapi, and must precede defaulted parameters
+            parameters.insert(
+                0,
+                Parameter(
+                    "response",
+                    Parameter.POSITIONAL_OR_KEYWORD,
+                    annotation=Response,
+                ),
+            )
+            parameters.append(
+                Parameter(
+                    "if_none_match",
+                    Parameter.POSITIONAL_OR_KEYWORD,
+                    default=Header(None),
+                    annotation=Optional[str],
+                ),
+            )
+
         async def inner(*args, **kwargs) -> model.basemodel:  # type: ignore
 
             try:
@@ -191,12 +359,41 @@ class ReadFactory(RESTFactory):
                 primary_key = kwargs[model.primary_key]
                 return_db_object = kwargs["return_db_object"]
                 user = kwargs["user"]
+                fields = model.parse_fields(kwargs.get("fields"))
 
                 Q = db.query(model)
                 Q = Q.filter(getattr(model, model.primary_key) == primary_key)
                 if hasattr(model, "access_control"):
                     Q = model.access_control(Q, user)
-                obj = Q.first()
+
+                headers = {}
+                if (
+                    is_versioned(model)
+                    and not return_db_object
+                    and (kwargs.get("if_none_match") or model.read_cfg.render_in_db)
+                ):
+                    # check the version without loading or serializing the resource
+                    row = Q.with_entities(model.version, model.updated_at).first()
+
+                    if row is None:
+                        raise NoResultFound
+
+                    headers["ETag"] = etag(*row)
+
+                    if etag_matches(kwargs.get("if_none_match"), headers["ETag"]):
+                        return Response(status_code=304, headers=headers)
+
+                if model.read_cfg.render_in_db and not return_db_object:
+                    content = json_row_query(db, Q, model, fields=fields)
+
+                    if content is None:
+                        raise NoResultFound
+
+                    return Response(
+                        content=content, media_type="application/json", headers=headers
+                    )
+
+                obj = Q.options(*model.load_options(fields)).first()
 
                 if not obj:
                     raise NoResultFound
@@ -204,6 +401,17 @@ class ReadFactory(RESTFactory):
                 if return_db_object:
                     return obj
 
+                if is_versioned(model):
+                    headers["ETag"] = etag(obj.version, obj.updated_at)
+
+                if fields is not None:
+                    return JSONResponse(
+                        model.serialize_fields(obj, fields), headers=headers
+                    )
+
+                if kwargs.get("response") is not None:
+                    kwargs["response"].headers.update(headers)
+
                 return model.basemodel.model_validate(obj, from_attributes=True)
             except Exception as e:
                 raise model._error_handler(e)
@@ -236,6 +444,12 @@ class ReadFactory(RESTFactory):
             Parameter(
                 "page", Parameter.POSITIONAL_OR_KEYWORD, default=0, annotation=int
             ),
+            Parameter(
+                "fields",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=None,
+                annotation=Optional[str],
+            ),
             Parameter(
                 "db",
                 Parameter.POSITIONAL_OR_KEYWORD,
@@ -252,26 +466,33 @@ class ReadFactory(RESTFactory):
 
         async def inner(*args, **kwargs) -> relationship.mapper.class_.basemodel:  # type: ignore
 
+            related = relationship.mapper.class_
+
             db = kwargs["db"]
             primary_key = kwargs[model.primary_key]
             user = kwargs["user"]
             page = kwargs["page"]
             limit = kwargs["limit"]
+            fields = related.parse_fields(kwargs.get("fields"))
 
             offset = page * limit
 
-            Q = db.query(relationship.mapper.class_).join(model)
+            Q = db.query(related).join(model)
             Q = Q.filter(getattr(model, model.primary_key) == primary_key)
             if hasattr(model, "access_control"):
                 Q = model.access_control(Q, user)
+            Q = Q.options(*related.load_options(fields))
             Q = Q.limit(limit).offset(offset)
 
             objs = Q.all()
 
-            return [
-                relationship.mapper.class_.basemodel.model_validate(
-                    obj, from_attributes=True
+            if fields is not None:
+                return JSONResponse(
+                    [related.serialize_fields(obj, fields) for obj in objs]
                 )
+
+            return [
+                related.basemodel.model_validate(obj, from_attributes=True)
                 for obj in objs
             ]
 
@@ -286,10 +507,226 @@ class ReadFactory(RESTFactory):
 
         return f
 
+    @staticmethod
+    def _substr_reader(
+        db, model, expr, primary_key, Q, read_size: int, short_transactions: bool
+    ) -> tuple[Callable, int]:
+        # read the value with `substr`, `read_size` bytes at a time;
+        # each read checks the length (and version) of the value, so a concurrent write ends the stream
+        # rather than mixing versions of the value, e.g. if each read is its own (short) transaction
+        stamp = [func.length(expr)]
+        if is_versioned(model):
+            stamp.append(model.version)
+
+        row = Q.with_entities(*stamp).first()
+        if short_transactions:
+            db.rollback()
+        if row is None or row[0] is None:
+            raise NoResultFound
+
+        # the position and bytes of the last read
+        last: list[Any] = [0, b""]
+
+        def read(position: int, n: int) -> bytes:
+            start, data = last
+            if not (start <= position and position + n <= start + len(data)):
+                start = position
+                result = db.execute(
+                    select(
+                        func.substr(expr, position + 1, max(n, read_size)), *stamp
+                    ).where(getattr(model, model.primary_key) == primary_key)
+                ).first()
+                if short_transactions:
+                    db.rollback()
+                if result is None or tuple(result[1:]) != tuple(row):
+                    raise RuntimeError("The value was written while it was streamed")
+                data = bytes(result[0] or b"")
+                last[:] = [start, data]
+            return data[position - start : position - start + n]
+
+        return read, row[0]
+
+    @staticmethod
+    def _sqlite_blob_reader(db, model, column, Q) -> tuple[Callable, int]:
+        # read the value with sqlite's incremental blob I/O, rather than `substr`, which loads the whole value for each chunk;
+        # each chunk is read in its own short transaction, which checks the size (and version) of the value,
+        # so a concurrent write ends the stream rather than mixing versions of the value
+        table_name = model.__table__.name
+        primary_key = getattr(model, model.primary_key)
+        columns: list[Any] = [literal_column(f'"{table_name}".rowid')]
+        if is_versioned(model):
+            columns.append(model.version)
+
+        key = Q.with_entities(primary_key).first()
+        db.rollback()
+        if key is None:
+            raise NoResultFound
+
+        def read_blob(position: int, n: int) -> Optional[tuple[tuple, bytes]]:
+            # pysqlite doesn't begin a transaction for reads
+            db.connection().exec_driver_sql("BEGIN")
+            try:
+                row = db.execute(
+                    select(*columns)
+                    .select_from(model.__table__)
+                    .where(primary_key == key[0])
+                ).first()
+                if row is None:
+                    return None
+                connection = db.connection().connection.driver_connection
+                try:
+                    blob = connection.blobopen(
+                        table_name, column.name, row[0], readonly=True
+                    )
+                except db.get_bind().dialect.dbapi.OperationalError:
+                    # e.g. a null value
+                    return None
+                with blob:
+                    blob.seek(position)
+                    return (len(blob), *row[1:]), blob.read(n)
+            finally:
+                db.rollback()
+
+        first = read_blob(0, 0)
+        if first is None:
+            raise NoResultFound
+        stamp, _ = first
+
+        def read(position: int, n: int) -> bytes:
+            result = read_blob(position, n)
+            if result is None or result[0] != stamp:
+                raise RuntimeError("The value was written while it was streamed")
+            return result[1]
+
+        return read, stamp[0]
+
+    def deferred_column_controller(self, model, column):
+
+        primary_key_type = str if model.primary_key == "slug" else model._id_type
+
+        parameters = [
+            Parameter(
+                model.primary_key,
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=...,
+                annotation=primary_key_type,
+            ),
+            Parameter(
+                "range",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Header(None),
+                annotation=Optional[str],
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        binary = isinstance(column.type, LargeBinary)
+        media_type = (
+            "application/octet-stream" if binary else "text/plain; charset=utf-8"
+        )
+        chunk_size = model.resource_cfg.deferred_chunk_size
+
+        def as_bytes(dialect_name):
+            # stream text columns by their utf-8 encoding, so that ranges are in bytes
+            if binary:
+                return column
+            if dialect_name == "postgresql":
+                return func.convert_to(column, "UTF8")
+            return cast(column, LargeBinary)
+
+        async def inner(*args, **kwargs) -> StreamingResponse:
+
+            # a dedicated session, as the request session may be closed before the response is streamed:
+            # on postgresql, the size and every chunk are read in one REPEATABLE READ transaction;
+            # on sqlite, where an open read transaction blocks writers (without WAL), each chunk is read in its own
+            db = model._sessionmaker()
+            try:
+                primary_key = kwargs[model.primary_key]
+                user = kwargs["user"]
+
+                dialect_name = db.get_bind().dialect.name
+                if dialect_name == "postgresql":
+                    db.connection(
+                        execution_options={"isolation_level": "REPEATABLE READ"}
+                    )
+
+                Q = db.query(model)
+                Q = Q.filter(getattr(model, model.primary_key) == primary_key)
+                if hasattr(model, "access_control"):
+                    Q = model.access_control(Q, user)
+
+                driver_connection = db.connection().connection.driver_connection
+                if hasattr(driver_connection, "blobopen"):
+                    read, size = self._sqlite_blob_reader(db, model, column, Q)
+                else:
+                    read, size = self._substr_reader(
+                        db,
+                        model,
+                        as_bytes(dialect_name),
+                        primary_key,
+                        Q,
+                        # `substr` loads the whole value on sqlite, so it's read in larger chunks
+                        max(
+                            chunk_size,
+                            self.SQLITE_READ_SIZE if dialect_name == "sqlite" else 0,
+                        ),
+                        short_transactions=dialect_name == "sqlite",
+                    )
+
+                byte_range = parse_range(kwargs.get("range"), size)
+                start, end = byte_range or (0, size - 1)
+
+            except Exception as e:
+                db.close()
+                raise model._error_handler(e)
+
+            def stream():
+                try:
+                    position = start
+                    while position <= end:
+                        n = min(chunk_size, end - position + 1)
+                        chunk = read(position, n)
+                        if not chunk:
+                            break
+                        yield bytes(chunk)
+                        position += n
+                finally:
+                    db.close()
+
+            headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1)}
+            if byte_range is not None:
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+            return StreamingResponse(
+                stream(),
+                status_code=206 if byte_range is not None else 200,
+                media_type=media_type,
+                headers=headers,
+            )
+
+        @wraps(inner)
+        async def f(*args, **kwargs):
+            return await inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig
+
+        return f
+
     def attach_route(self, model) -> None:
 
         # Overwrite this from the base class
 
+        if getattr(model, self.CFG_NAME).render_in_db:
+            check_renderable(model)
+
         # same as base class, add base router
         model.router.add_api_route(
             self.ROUTE,
@@ -307,6 +744,20 @@ class ReadFactory(RESTFactory):
             response_model=getattr(self, "response_model", model.basemodel),
         )
 
+        model.router.add_api_route(
+            self.ROUTE,
+            self.exists_controller_factory(model),
+            description=getattr(model, self.CFG_NAME).description,
+            dependencies=[
+                Depends(d) for d in getattr(model, self.CFG_NAME).dependencies
+            ],
+            summary=f"check {model.__name__.lower()} exists",
+            tags=getattr(model, self.CFG_NAME).tags or [model.__name__],
+            operation_id=f"exists_{model.__tablename__}",
+            methods=["HEAD"],
+            response_class=Response,
+        )
+
         # add paginated relationship routes for each relationship
         for r in model.__mapper__.relationships:
             if r.key in getattr(model, self.CFG_NAME).routed_relationships:
@@ -324,3 +775,20 @@ class ReadFactory(RESTFactory):
                     status_code=getattr(self, "SUCCESS_CODE", None) or 200,
                     response_model=list[r.mapper.class_.basemodel],  # type: ignore
                 )
+
+        # add streaming routes for each deferred column
+        for c in model.__table__.columns:
+            if c.name in model.resource_cfg.deferred_columns:
+                model.router.add_api_route(
+                    f"{self.ROUTE}/{c.name}",
+                    self.deferred_column_controller(model, c),
+                    description=f"Streaming endpoint for {c.name}",
+                    dependencies=[
+                        Depends(d) for d in getattr(model, self.CFG_NAME).dependencies
+                    ],
+                    summary=f"Streaming endpoint for {c.name}",
+                    tags=getattr(model, self.CFG_NAME).tags or [model.__name__],
+                    operation_id=f"get_{model.__tablename__}_{c.name}",
+                    methods=[self.METHOD],
+                    response_class=StreamingResponse,
+                )
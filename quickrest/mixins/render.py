@@ -0,0 +1,273 @@
+"""
+Database-side JSON rendering for resources.
+
+For simple resources (i.e. resources whose BaseModel is made only of columns and serialized relationships),
+the database can build the JSON response directly, using `json_build_object`/`json_agg` on postgresql
+and `json_object`/`json_group_array` on sqlite.
+The rendered bytes are returned to the client as-is, skipping ORM object loading and pydantic serialization entirely.
+
+Rendering is enabled per-route with the `render_in_db` attribute on `ReadConfig` and `SearchConfig`.
+Only one level of serialized relationships is rendered: related resources must themselves be simple.
+
+!!! note
+    Values are formatted by the database's JSON functions,
+    so some types (e.g. datetimes on sqlite) may be formatted slightly differently than the pydantic-rendered response.
+"""
+
+from typing import Any, Optional
+
+from sqlalchemy import (
+    Boolean,
+    Text,
+    Uuid,
+    case,
+    cast,
+    func,
+    literal,
+    literal_column,
+    select,
+)
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.types import DateTime
+
+SUPPORTED_DIALECTS = ["sqlite", "postgresql"]
+
+
+def _key(name: str) -> ColumnElement:
+    # keys are rendered inline so that postgres doesn't need to infer bind parameter types
+    return literal_column("'" + name.replace("'", "''") + "'")
+
+
+def _column_value(col, dialect_name: str) -> ColumnElement:
+    """Adapt a column so that its JSON rendering matches the pydantic rendering."""
+
+    if dialect_name == "sqlite":
+        if isinstance(col.type, Boolean):
+            # sqlite stores booleans as integers
+            return func.json(
+                case(
+                    (col.is_(None), literal("null")),
+                    (col == True, literal("true")),
+                    else_=literal("false"),
+                )
+            )
+        if isinstance(col.type, Uuid):
+            # sqlite stores uuids as 32-character hex strings
+            return func.lower(
+                func.substr(col, 1, 8)
+                + "-"
+                + func.substr(col, 9, 4)
+                + "-"
+                + func.substr(col, 13, 4)
+                + "-"
+                + func.substr(col, 17, 4)
+                + "-"
+                + func.substr(col, 21)
+            )
+        if isinstance(col.type, DateTime):
+            return func.replace(col, " ", "T")
+
+    return col
+
+
+def _json_object(pairs: list[tuple[str, Any]], dialect_name: str) -> ColumnElement:
+    args: list[Any] = []
+    for name, value in pairs:
+        args += [_key(name), value]
+
+    if dialect_name == "sqlite":
+        return func.json_object(*args)
+    return func.json_build_object(*args)
+
+
+def _json_array(expr, dialect_name: str) -> ColumnElement:
+    if dialect_name == "sqlite":
+        return func.json_group_array(func.json(expr))
+    return func.coalesce(func.json_agg(expr), literal_column("'[]'::json"))
+
+
+def _nested(expr, dialect_name: str) -> ColumnElement:
+    # sqlite drops the JSON subtype of subquery results, so they must be re-parsed
+    if dialect_name == "sqlite":
+        return func.json(expr)
+    return expr
+
+
+def _as_text(expr, dialect_name: str) -> ColumnElement:
+    # return the rendered JSON as text so that drivers don't decode it
+    if dialect_name == "sqlite":
+        return expr
+    return cast(expr, Text)
+
+
+def check_renderable(model, depth: int = 1) -> None:
+    """
+    Check that a resource's BaseModel can be rendered by the database.
+
+    Args:
+        model (Resource): The resource class.
+        depth (int): The number of levels of serialized relationships that can be rendered.
+
+    Raises:
+        ValueError: If the BaseModel has fields that can't be rendered in the database.
+    """
+
+    relationships = {r.key: r for r in model.__mapper__.relationships}
+
+    for name in model.basemodel.model_fields:
+        if name in model.__table__.columns:
+            continue
+        if name in relationships and depth > 0:
+            check_renderable(relationships[name].mapper.class_, depth=depth - 1)
+            continue
+        raise ValueError(
+            f"{model.__name__}.{name} can't be rendered in the database - render_in_db only supports columns and one level of serialized relationships."
+        )
+
+
+def json_object_expr(
+    model, dialect_name: str, depth: int = 1, fields: Optional[list[str]] = None
+) -> ColumnElement:
+    """
+    Build a SQL expression rendering a resource row as a JSON object, matching the resource's BaseModel.
+
+    Args:
+        model (Resource): The resource class.
+        dialect_name (str): The name of the database dialect, `sqlite` or `postgresql`.
+        depth (int): The number of levels of serialized relationships to render.
+        fields (Optional[list[str]]): A sparse fieldset to render, defaults to all the BaseModel fields.
+
+    Returns:
+        ColumnElement: A JSON-valued SQL expression.
+    """
+
+    if dialect_name not in SUPPORTED_DIALECTS:
+        raise ValueError(f"render_in_db is not supported for {dialect_name}")
+
+    names = [
+        name
+        for name in model.basemodel.model_fields
+        if fields is None or name in fields
+    ]
+
+    pairs: list[tuple[str, Any]] = [
+        (name, _column_value(model.__table__.columns[name], dialect_name))
+        for name in names
+        if name in model.__table__.columns
+    ]
+
+    relationships = {r.key: r for r in model.__mapper__.relationships}
+
+    for name in names:
+        if name not in relationships or depth < 1:
+            continue
+
+        r = relationships[name]
+        related_obj = json_object_expr(r.mapper.class_, dialect_name, depth=depth - 1)
+
+        criteria = r.primaryjoin
+        if r.secondaryjoin is not None:
+            criteria = criteria & r.secondaryjoin
+
+        if len(r.remote_side) > 1:
+            # many-to-many relationships are serialized as a list, see `_build_basemodel`
+            subquery = select(_json_array(related_obj, dialect_name))
+        else:
+            subquery = select(related_obj).limit(1)
+
+        subquery = subquery.where(criteria).correlate(model.__table__)
+
+        pairs.append((name, _nested(subquery.scalar_subquery(), dialect_name)))
+
+    return _json_object(pairs, dialect_name)
+
+
+def json_page_query(
+    db,
+    Q,
+    model,
+    offset: int,
+    limit: int,
+    fields: Optional[list[str]] = None,
+    keys: Optional[list] = None,
+):
+    """
+    Render a page of a query in a single statement.
+
+    The total number of results is computed in the same statement with a `count(*) OVER ()` window.
+
+    Args:
+        db (Session): The database session.
+        Q (Query): The filtered query on the resource.
+        model (Resource): The resource class.
+        offset (int): The offset of the page.
+        limit (int): The number of results per page.
+        fields (Optional[list[str]]): A sparse fieldset to render.
+        keys (Optional[list]): Columns to read with each row (e.g. the sort keys of a cursor).
+            If set, the rows are rendered one by one, and one row more than `limit` is read.
+
+    Returns:
+        tuple[str, Optional[int], list[tuple]]: The JSON array of the page, the total number of results
+            (`None` if the page is empty), and the `keys` of the rows of the page and of the row after it.
+    """
+
+    dialect_name = db.get_bind().dialect.name
+
+    if keys:
+        rows = (
+            Q.with_entities(
+                _as_text(
+                    json_object_expr(model, dialect_name, fields=fields), dialect_name
+                ),
+                func.count().over(),
+                *keys,
+            )
+            .offset(offset)
+            .limit(limit + 1)
+            .all()
+        )
+        items = "[" + ",".join(row[0] for row in rows[:limit]) + "]"
+        total = rows[0][1] if rows else None
+        return items, total, [tuple(row[2:]) for row in rows]
+
+    page = (
+        Q.with_entities(
+            json_object_expr(model, dialect_name, fields=fields).label("obj"),
+            func.count().over().label("total"),
+        )
+        .offset(offset)
+        .limit(limit)
+        .subquery()
+    )
+
+    items, total = db.execute(
+        select(
+            _as_text(_json_array(page.c.obj, dialect_name), dialect_name),
+            func.max(page.c.total),
+        )
+    ).one()
+
+    return items, total, []
+
+
+def json_row_query(db, Q, model, fields: Optional[list[str]] = None):
+    """
+    Render the first row of a query as a JSON object.
+
+    Args:
+        db (Session): The database session.
+        Q (Query): The filtered query on the resource.
+        model (Resource): The resource class.
+        fields (Optional[list[str]]): A sparse fieldset to render.
+
+    Returns:
+        Optional[str]: The JSON object, or `None` if there are no results.
+    """
+
+    dialect_name = db.get_bind().dialect.name
+
+    return (
+        Q.with_entities(_as_text(json_object_expr(model, dialect_name), dialect_name))
+        .limit(1)
+        .scalar()
+    )
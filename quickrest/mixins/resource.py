@@ -1,22 +1,41 @@
 from abc import ABC
 from enum import Enum
-from typing import Callable, ForwardRef, Generator, Optional, Type
+from typing import Any, Callable, ForwardRef, Generator, Optional, Type
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends
-from pydantic import create_model
-from sqlalchemy import create_engine
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, create_model
+from sqlalchemy import Connection, create_engine, event
 from sqlalchemy.ext.associationproxy import ColumnAssociationProxyInstance
-from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column, sessionmaker
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    Session,
+    declared_attr,
+    defer,
+    load_only,
+    mapped_column,
+    sessionmaker,
+)
 from sqlalchemy.types import Uuid
 
 from quickrest.mixins.base import env_settings
+from quickrest.mixins.changes import ChangesMixin
 from quickrest.mixins.create import CreateMixin
 from quickrest.mixins.delete import DeleteMixin
 from quickrest.mixins.errors import default_error_handler
+from quickrest.mixins.hilo import HiLoAllocator
 from quickrest.mixins.patch import PatchMixin
 from quickrest.mixins.read import ReadMixin
 from quickrest.mixins.search import SearchMixin
+from quickrest.mixins.subscribe import (
+    SubscribeMixin,
+    delete_audience,
+    publish,
+    subscribed,
+)
+from quickrest.mixins.upsert import UpsertMixin
+from quickrest.mixins.utils import UUID7, uuid7
 
 
 def nullraise(caller):
@@ -97,10 +116,19 @@ class ResourceConfig(ABC):
         and use the `routed_relationships` attribute in the `ReadConfig` to expose paginated related objects.
 
     `pop_params` can be used to exclude certain attributes from the resource's models (i.e. the base model, and CRUD-associated models).
+    Popped columns are also deferred when resources are queried, so they are never loaded from the database only to be dropped.
+
+    `deferred_columns` can be used for large `Text` or `LargeBinary` columns.
+    Deferred columns are excluded from the resource's BaseModel (and so from read, search, and relationship responses) and are never loaded by those routes.
+    Instead, each deferred column is served from its own route, `GET /{resource_name}/{primary_key}/{column_name}`,
+    which streams the value from the database in chunks of `deferred_chunk_size` bytes and supports HTTP `Range` requests.
+    Deferred columns can still be set by the create and patch routes.
 
     Attributes:
         serialize (list[str]): A list of objects to be included on the resource's BaseModel.
         pop_params (list[str]): A list of objects that should be excluded from the resource models.
+        deferred_columns (list[str]): A list of large columns that should be served from their own streaming route.
+        deferred_chunk_size (int): The number of bytes fetched from the database per chunk when streaming a deferred column.
 
     ## Example
 
@@ -129,6 +157,8 @@ class ResourceConfig(ABC):
 
     serialize: list[str] = []
     pop_params: list[str] = []
+    deferred_columns: list[str] = []
+    deferred_chunk_size: int = 65536
 
 
 class Base(DeclarativeBase):
@@ -147,10 +177,35 @@ class ResourceBaseUUID:
     )
 
 
+class ResourceBaseUUID7:
+    id: Mapped[UUID] = mapped_column(
+        Uuid,
+        primary_key=True,
+        default=uuid7,
+    )
+
+
 class ResourceBaseInt:
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 
 
+def build_resource_base_hilo(allocator: HiLoAllocator) -> type:
+    """Build an integer primary key base whose ids are assigned in blocks by `allocator`."""
+
+    class ResourceBaseIntHiLo:
+        __tablename__: str
+
+        @declared_attr
+        def id(cls) -> Mapped[int]:
+            return mapped_column(
+                primary_key=True,
+                autoincrement=False,
+                default=allocator.default(cls.__tablename__),
+            )
+
+    return ResourceBaseIntHiLo
+
+
 class ResourceBaseSlug:
     slug: Mapped[str] = mapped_column(unique=True)
     primary_key = "slug"
@@ -164,7 +219,7 @@ class ResourceMixin:
     """
     The ResourceMixin class is the primary mixin for attaching a router with CRUD operations to a SQLAlchemy model.
     It inherits from a ResourceBase class and ResourceBaseSlug class that provide the choice of primary key and slug fields, respectively, based on `env_settings`.
-    It also inherits from the CreateMixin, ReadMixin, PatchMixin, DeleteMixin, and SearchMixin, which provide the CRUD+Search operations and routes for the resource.
+    It also inherits from the CreateMixin, ReadMixin, PatchMixin, DeleteMixin, SearchMixin, UpsertMixin, ChangesMixin, and SubscribeMixin, which provide the CRUD+Search operations and routes for the resource.
 
     Attributes:
         router (fastapi.APIRouter): The FastAPI APIRouter for the resource.
@@ -178,7 +233,10 @@ class ResourceMixin:
 
     router: APIRouter
     __tablename__: str
+    __table__: Any
     _sessionmaker: Callable
+    basemodel: Type[BaseModel]
+    _partial_basemodels: dict
 
     class router_cfg(RouterConfig):
         pass
@@ -196,7 +254,7 @@ class ResourceMixin:
         Relationships are also added to the pydantic model as fields if they are included in the `resource_cfg.serialize` list.
         Relationship fields have the type of the basemodel of the related resource, which is instatiated as a `ForwardRef` and then evaluated when the router is built.
         If the relationship is many-to-many, the field is a list of the related resource's basemodel.
-        Any parameters in the `pop_params` list are excluded from the BaseModel.
+        Any parameters in the `pop_params` or `deferred_columns` lists are excluded from the BaseModel.
 
         When multiple resource objects are returned by a route (for example, a search route or a related object route),
         the response is paginated using a `PaginatedBaseModel`.
@@ -264,6 +322,7 @@ class ResourceMixin:
             )
             for c in cols
             if c.name not in cls.resource_cfg.pop_params
+            and c.name not in cls.resource_cfg.deferred_columns
         }
 
         serialized_attrs = []
@@ -300,15 +359,115 @@ class ResourceMixin:
 
         return create_model(cls.__name__, **fields)
 
+    @classmethod
+    def parse_fields(cls, fields: Optional[str]) -> Optional[list[str]]:
+        """
+        Parse a sparse fieldset, i.e. the comma-separated `fields` query parameter of the read and search routes.
+        Fields are validated against the resource's BaseModel and the primary key is always included.
+
+        Args:
+            fields (Optional[str]): A comma-separated list of field names, e.g. `"id,name"`.
+
+        Returns:
+            Optional[list[str]]: The list of field names, or `None` if no fieldset was requested.
+
+        Raises:
+            HTTPException: 422 if any of the fields are not on the resource's BaseModel.
+        """
+
+        if not fields:
+            return None
+
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+
+        unknown = [f for f in requested if f not in cls.basemodel.model_fields]
+        if unknown:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unknown fields for {cls.__name__}: {', '.join(unknown)}",
+            )
+
+        return [f for f in cls.basemodel.model_fields if f in requested or f == "id"]
+
+    @classmethod
+    def load_options(cls, fields: Optional[list[str]] = None) -> list:
+        """
+        Build the loader options for querying the resource.
+        If a sparse fieldset is requested, only those columns are loaded (via `load_only`),
+        otherwise only the `pop_params` and `deferred_columns` columns are deferred.
+
+        Args:
+            fields (Optional[list[str]]): The parsed sparse fieldset.
+
+        Returns:
+            list: A list of SQLAlchemy loader options.
+        """
+
+        if fields is not None:
+            return [
+                load_only(
+                    *[
+                        getattr(cls, c.key)
+                        for c in cls.__table__.columns
+                        if c.name in fields
+                    ]
+                )
+            ]
+
+        return [
+            defer(getattr(cls, c.key))
+            for c in cls.__table__.columns
+            if c.name in cls.resource_cfg.pop_params
+            or c.name in cls.resource_cfg.deferred_columns
+        ]
+
+    @classmethod
+    def serialize_fields(cls, obj, fields: list[str]) -> dict:
+        """
+        Serialize a resource object with a sparse fieldset.
+
+        Args:
+            obj (Resource): The resource object.
+            fields (list[str]): The parsed sparse fieldset.
+
+        Returns:
+            dict: The json-compatible serialized object.
+        """
+
+        key = tuple(fields)
+
+        if key not in cls._partial_basemodels:
+            partial_fields: Any = {
+                f: (
+                    cls.basemodel.model_fields[f].annotation,
+                    cls.basemodel.model_fields[f],
+                )
+                for f in fields
+            }
+            cls._partial_basemodels[key] = create_model(
+                cls.basemodel.__name__ + "Partial", **partial_fields
+            )
+
+        return (
+            cls._partial_basemodels[key]
+            .model_validate(obj, from_attributes=True)
+            .model_dump(mode="json")
+        )
+
     @classmethod
     def build_models(cls):
 
         cls.basemodel = cls._build_basemodel()
+        cls._partial_basemodels = {}
 
-        for _attr in ["create", "read", "delete", "patch", "search"]:
+        for _attr in ["create", "read", "delete", "patch", "search", "upsert"]:
             if hasattr(cls, _attr):
                 getattr(cls, _attr)
 
+        # the changes route is only available to versioned resources
+        if getattr(cls, "changes_cfg", None) is not None and hasattr(cls, "changes"):
+            cls.changes
+
     @classmethod
     def build_router(cls) -> None:
 
@@ -318,6 +477,16 @@ class ResourceMixin:
             dependencies=[Depends(fn) for fn in cls.router_cfg.dependencies],
         )
 
+        # collection routes (e.g. `/export`) are attached first,
+        # so that they take precedence over the `/{primary_key}` routes
+        if hasattr(cls, "search") and getattr(cls, "search_cfg", None) is not None:
+            cls.search.attach_route(cls)
+        if getattr(cls, "changes_cfg", None) is not None and hasattr(cls, "changes"):
+            cls.changes.attach_route(cls)
+        if getattr(cls, "subscribe_cfg", None) is not None and hasattr(
+            cls, "subscribe"
+        ):
+            cls.subscribe.attach_route(cls)
         if hasattr(cls, "read") and getattr(cls, "read_cfg", None) is not None:
             cls.read.attach_route(cls)
         if hasattr(cls, "create") and getattr(cls, "create_cfg", None) is not None:
@@ -326,8 +495,51 @@ class ResourceMixin:
             cls.delete.attach_route(cls)
         if hasattr(cls, "patch") and getattr(cls, "patch_cfg", None) is not None:
             cls.patch.attach_route(cls)
-        if hasattr(cls, "search") and getattr(cls, "search_cfg", None) is not None:
-            cls.search.attach_route(cls)
+        if hasattr(cls, "upsert") and getattr(cls, "upsert_cfg", None) is not None:
+            cls.upsert.attach_route(cls)
+
+    @classmethod
+    def _search_indexes(cls) -> list:
+        """The in-process search indexes of the resource, i.e. its trigram and vector indexes."""
+        if getattr(cls, "search_cfg", None) is None or not hasattr(cls, "search"):
+            return []
+        return [
+            index
+            for index in [cls.search.trigram_index, cls.search.vector_index]
+            if index is not None
+        ]
+
+    @classmethod
+    def _observes_writes(cls) -> bool:
+        """Whether the write controllers must collect the primary keys of their writes for `_on_write`."""
+        return subscribed(cls) or bool(cls._search_indexes())
+
+    @classmethod
+    def _on_write(
+        cls, op: str, primary_keys: list, db: Optional[Session] = None
+    ) -> None:
+        """
+        Called by the write controllers with the primary keys of each write, before it's committed
+        (and, for deletes, before the resources are deleted), to publish the write to subscribers
+        and to update the in-process search indexes once the write is committed, see `publish_writes`.
+
+        Args:
+            op (str): The operation, one of `create`, `patch`, `upsert` or `delete`.
+            primary_keys (list): The primary keys of the written resources.
+            db (Session, optional): The session of the write. Defaults to `None`, i.e. the write is already committed.
+        """
+        if not primary_keys:
+            return
+
+        audience = None
+        if op == "delete" and db is not None:
+            audience = delete_audience(cls, db, primary_keys)
+
+        write = (cls, op, list(primary_keys), audience)
+        if db is None:
+            _apply_write(write)
+        else:
+            db.info.setdefault(WRITES_KEY, []).append(write)
 
     @classmethod
     def db_generator(cls) -> Generator[Session, None, None]:
@@ -339,12 +551,57 @@ class ResourceMixin:
                 db.close()
 
 
+WRITES_KEY = "quickrest_writes"
+
+
+def _apply_write(write) -> None:
+    model, op, primary_keys, audience = write
+
+    publish(model, op, primary_keys, audience)
+
+    for index in model._search_indexes():
+        index.update(op, primary_keys)
+
+
+def publish_writes(db: Session) -> None:
+    """
+    Publish the writes of a session, and update the in-process search indexes, once its transaction is committed.
+    This is called after each commit of a session, except for sessions bound to a connection, e.g. in `POST /batch`,
+    whose caller commits the connection's transaction and then calls `publish_writes`.
+    """
+    for write in db.info.pop(WRITES_KEY, []):
+        _apply_write(write)
+
+
+def _joins_caller_transaction(session: Session) -> bool:
+    return isinstance(session.bind, Connection)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session) -> None:
+    if not _joins_caller_transaction(session):
+        publish_writes(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(WRITES_KEY, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_after_transaction_end(session: Session, transaction) -> None:
+    # e.g. sessions closed without committing
+    if transaction.parent is None and not _joins_caller_transaction(session):
+        session.info.pop(WRITES_KEY, None)
+
+
 def build_resource(
     sessionmaker: Callable = nullraise,
     user_generator: Callable = nullreturn,
     id_type: type = str,
     slug: bool = False,
     error_handler: Callable = default_error_handler,
+    id_block_size: Optional[int] = None,
 ) -> type:
     """
     Ths method builds a resource class with the given parameters.
@@ -353,9 +610,15 @@ def build_resource(
 
     ## Primary Key
 
-    The id_type parameter can be `str`, `uuid.UUID`, or `int`, which will determine the type of the resource's ID.
+    The id_type parameter can be `str`, `uuid.UUID`, `UUID7`, or `int`, which will determine the type of the resource's ID.
     If str, resources will need to be provided with a unique string ID.
-    If UUID or Int, resources will be automatically provided with a UUID or Int ID, respectively.
+    If UUID or Int, resources will be automatically provided with a (random, version 4) UUID or Int ID, respectively.
+    If UUID7, resources will be provided with a time-ordered (version 7) UUID,
+    so that new ids are appended to the end of the primary key index instead of being scattered across it.
+
+    If id_type is int, an `id_block_size` can be given to allocate ids in blocks, instead of by database autoincrement.
+    Each worker reserves blocks of `id_block_size` ids from a sequence table and assigns them in memory,
+    so that inserts don't wait on the database for generated keys, see [HiLo allocation](#quickrest.mixins.hilo).
     If slug is True, the resource will have a slug field.
 
     ## Error Handling
@@ -366,9 +629,10 @@ def build_resource(
     Args:
         sessionmaker (Callable): A callable that returns a SQLAlchemy session.
         user_generator (Callable): A callable that returns a user model.
-        id_type (type): The type of the resource's ID. Must be str, uuid.UUID, or int.
+        id_type (type): The type of the resource's ID. Must be str, uuid.UUID, UUID7, or int.
         slug (bool): If True, the resource will have a slug field.
         error_handler (Callable): A callable that handles errors.
+        id_block_size (Optional[int]): If given, int ids are allocated in blocks of this size.
 
     Returns:
         type: A Resource class.
@@ -385,10 +649,23 @@ def build_resource(
         ResourceBase = ResourceBaseStr
     elif id_type is UUID:
         ResourceBase = ResourceBaseUUID
+    elif id_type is UUID7:
+        ResourceBase = ResourceBaseUUID7
+        # ids are still UUIDs in the resource models and routes
+        id_type = UUID
+    elif id_type is int and id_block_size is not None:
+        ResourceBase = build_resource_base_hilo(
+            HiLoAllocator(id_block_size, sessionmaker)
+        )
     elif id_type is int:
         ResourceBase = ResourceBaseInt
     else:
-        raise ValueError(f"id_type must be str, uuid.UUID, or int, got {id_type}")
+        raise ValueError(
+            f"id_type must be str, uuid.UUID, UUID7, or int, got {id_type}"
+        )
+
+    if id_block_size is not None and id_type is not int:
+        raise ValueError("id_block_size can only be used with id_type=int")
 
     class Resource(
         ResourceBase,  # type: ignore
@@ -399,6 +676,9 @@ def build_resource(
         PatchMixin,
         DeleteMixin,
         SearchMixin,
+        UpsertMixin,
+        ChangesMixin,
+        SubscribeMixin,
     ):
 
         _id_type = id_type
@@ -1,17 +1,49 @@
+import base64
+import csv
+import io
+import json
 from abc import ABC
 from datetime import date, datetime
 from functools import wraps
 from inspect import Parameter, signature
+from itertools import islice
 from operator import gt, lt
-from typing import Any, Callable, Optional, Union
-
-from fastapi import Depends
-from pydantic import BaseModel, Field, create_model
-from sqlalchemy import func, or_
+from typing import Any, Callable, Literal, Optional, Union, get_args, get_origin
+
+from fastapi import Depends, Header, HTTPException, Query, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    TypeAdapter,
+    ValidationError,
+    create_model,
+)
+from sqlalchemy import (
+    Date,
+    and_,
+    any_,
+    case,
+    cast,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session, sessionmaker
 
+from quickrest.mixins.access_control import collection_access_control
 from quickrest.mixins.base import BaseMixin, RESTFactory
+from quickrest.mixins.fulltext import fulltext_query, register_fulltext_index
+from quickrest.mixins.render import check_renderable, json_page_query
+from quickrest.mixins.trigram import TrigramIndex, register_pg_trgm_index
 from quickrest.mixins.utils import classproperty
+from quickrest.mixins.vector import VectorIndex
+from quickrest.mixins.versioned import etag_matches, is_versioned, page_etag
 
 
 class SearchConfig(ABC):
@@ -50,8 +82,87 @@ class SearchConfig(ABC):
     The `search_similarity_threshold` should be set to the *minimum* similarity allowed, and is given a default value of 0.7 if not set.
     The [pg_trgm](https://www.postgresql.org/docs/9.1/pgtrgm.html) extension must be enabled in postgresql to use this feature.
 
+    On sqlite, setting `search_similarity_index` scores similarity with QuickRest's in-process trigram index instead of `editdist3`,
+    so the Spellfix extension isn't needed, and the search value isn't compared with every row of the table.
+    The `threshold` is then the *minimum* trigram similarity, between 0 and 1, with a default of 0.3 if `search_similarity_threshold` isn't set;
+    see [trigram index](#quickrest.mixins.trigram).
+
+    Similarity search results are unordered by default. Setting `search_similarity_ranked` returns the most similar results first,
+    and adds a `score` (the trigram similarity, from 0 to 1) to each result.
+    On postgresql, the results are then filtered with `pg_trgm`'s `%` operator (with the `threshold` set for the transaction)
+    and ordered by the `<->` distance operator, both of which are served by a GiST trigram index that QuickRest creates on the `search_similarity` fields.
+    Ranked search is also available with `search_similarity_index`, but not with sqlite's `editdist3`.
+    If several similarity fields are searched together, the score is their mean similarity.
+
+    For "more like this" search, `search_vector` can be set to a `Vector` column of the resource (e.g. a sentence embedding).
+    This adds a `similar_to` parameter to the search query, which takes the primary key of a resource,
+    and returns the other resources in order of the cosine similarity of their vectors, with a `score`.
+    `similar_to` can be combined with the other search filters, which are applied to the (up to 1000) most similar resources.
+    The similarity is computed with QuickRest's in-process [vector index](#quickrest.mixins.vector),
+    which can be memory-mapped from a sidecar file with `search_vector_path`,
+    and can use an IVF coarse index for larger collections with `search_vector_lists` and `search_vector_probes`.
+
+    `search_contains` is a `LIKE '%...%'` filter, which scans the whole table.
+    For text search over larger tables, the `search_fulltext` attribute can be set to a list of string fields (or `True` for all string fields)
+    to add a `q` parameter to the search query, which searches all of those fields together with a full-text index.
+    Results matching `q` are ranked by relevance.
+    On sqlite, an FTS5 table kept in sync by triggers is used, and on postgresql, a generated `tsvector` column with a GIN index;
+    QuickRest creates the index, see [full-text search](#quickrest.mixins.fulltext).
+    `search_fulltext_language` sets the postgresql text search configuration (on sqlite, `"english"` enables the porter stemmer).
+
+    The `search_in` attribute adds a `<field>_in` list parameter for each of its fields (or all fields, if `True`),
+    e.g. `GET /pets?owner_id_in=alice&owner_id_in=bob` or `GET /pets?owner_id_in=alice,bob`, which matches any of the values with a single `IN` predicate.
+    Long lists (more than `SearchFactory.IN_LIST_THRESHOLD` values) are bound as a single parameter and joined as a table,
+    with `json_each` on sqlite and `= ANY(array)` on postgresql, so that the statement doesn't grow with the list.
+    Values can't contain commas.
+
+    Resources can also be searched by the fields of their related resources, with the `search_related` attribute:
+    a list of dotted relationship paths, e.g. `["owner.last_name", "certifications.id"]`, each of which adds a query parameter of the same name
+    (e.g. `GET /pets?owner.last_name=Smith`) that matches related resources by exact match.
+    Paths can follow several relationships, e.g. `owner.certifications.name`.
+    Each path is compiled to a correlated `EXISTS` subquery (i.e. SQLAlchemy's `has` and `any`), so the search is a single SQL statement,
+    and the access control of each related resource is applied inside its subquery, so resources can't be found by related resources the user can't read.
+
     Finally, the `results_limit` attribute can be set to specify the maximum number of results to return in a single search query, defaulting to 10.
-    The route will also add a `page` parameter to the query, which can be used to paginate the results.
+    The route will also add a `page` parameter to the query, which can be used to paginate the results,
+    and a `fields` parameter, which can be used to request a comma-separated sparse fieldset of the resource.
+
+    The `sortable` attribute lists the fields that the results can be ordered by, and adds a `sort` parameter,
+    e.g. `GET /pets?sort=name,-vaccination_date` (a leading `-` sorts in descending order).
+    The primary key is always the last sort key, so that pages are deterministic, and null values sort last.
+    An explicit `sort` replaces the relevance order of similarity, full-text and vector searches.
+    Sorted searches also return a `next_cursor`, which can be sent as the `cursor` parameter to fetch the page after it
+    by its sort keys (keyset pagination) rather than by an offset, so that deep pages are as fast as the first,
+    and pages don't skip or repeat results when resources are written between requests.
+    With a `cursor`, the `page` parameter is ignored, and `total_pages` counts the pages after the cursor.
+    Each sortable field is served by an index on `(field, primary key)`, see [indexes](indexes.md).
+
+    Setting the `export` attribute adds a `GET /{resource_name}/export` route that streams *all* the results of a search
+    as newline-delimited JSON (`format=ndjson`) or CSV (`format=csv`), rather than paginating them.
+    The export accepts the same filters as the search route and applies the same access control,
+    and results are fetched from the database with a server-side cursor in batches of `export_batch_size`,
+    so memory use stays flat regardless of the size of the export.
+
+    Setting the `count` attribute adds a `GET /{resource_name}/count` route that returns only the number of results of a search,
+    counted the same way as the search route's `total_pages`, without fetching or serializing any resources.
+
+    Setting the `aggregate` attribute to a list of fields (or `True` for all fields) adds a `GET /{resource_name}/aggregate` route,
+    which computes metrics of the search results in the database with a single `GROUP BY` query, e.g.:
+
+    ```
+    GET /pets/aggregate?group_by=species_id,vaccination_date&bucket=year&metrics=count,min:vaccination_date
+    ```
+
+    `group_by` is a comma-separated list of the fields to group by, and `metrics` a comma-separated list of `count`
+    (the number of results), `count:<field>` (the number of non-null values), and `sum:<field>`, `avg:<field>`, `min:<field>`
+    or `max:<field>` on numeric fields (`min` and `max` also apply to date and datetime fields), defaulting to `count`.
+    The `bucket` parameter (`day`, `week`, `month` or `year`) truncates the date and datetime fields of `group_by` to the start of their bucket.
+    The route returns a list of groups, ordered by the `group_by` fields, each with its `group_by` fields and metrics,
+    e.g. `{"species_id": "dog", "vaccination_date": "2020-01-01", "count": 2, "min_vaccination_date": "2020-03-02"}`.
+    The aggregate accepts the same filters as the search route and applies the same access control.
+
+    For simple resources, the `render_in_db` attribute can be set to have the database render the page of results as JSON.
+    The page and the total number of results are then computed in a single statement and returned to the client as-is.
 
     See the example below for a demonstration of how to use the `SearchConfig` class.
 
@@ -64,6 +175,7 @@ class SearchConfig(ABC):
         required_params (list[str]): List of fields that are required in the search query. Optional, defaults to `[]`.
         pop_params (list[str]): List of fields that are excluded from the search query. Optional, defaults to `[]`.
         results_limit (int): Maximum number of results to return in a single search query. Optional, defaults to `10`.
+        sortable (list[str]): List of fields that the results can be sorted by with the `sort` parameter. Optional, defaults to `[]`.
         search_eq (Union[list[str], bool]): List of fields to filter on exact match, or boolean to apply to all numeric fields. Optional, defaults to `None`.
         search_gt (Union[list[str], bool]): List of fields to filter on greater than, or boolean to apply to all numeric fields. Optional, defaults to `None`.
         search_gte (Union[list[str], bool]): List of fields to filter on greater than or equal to, or boolean to apply to all numeric fields. Optional, defaults to `None`.
@@ -72,12 +184,28 @@ class SearchConfig(ABC):
         search_contains (Union[list[str], bool]): List of fields to filter on contains, or boolean to apply to all string fields. Optional, defaults to `None`.
         search_similarity (Union[list[str], bool]): List of fields to filter on similarity, or boolean to apply to all string fields. Optional, defaults to `None`.
         search_similarity_threshold (Union[int, float]): Similarity threshold for the search. Optional, defaults to `300` for sqlite or `0.7` for postgres.
+        search_similarity_index (bool): Score `search_similarity` with the in-process trigram index, rather than the database. Optional, defaults to `False`.
+        search_similarity_ranked (bool): Order similarity search results by similarity, and include their score. Optional, defaults to `False`.
+        search_in (Union[list[str], bool]): List of fields to filter on a list of values, or boolean to apply to all fields. Optional, defaults to `None`.
+        search_related (list[str]): Dotted relationship paths to search by exact match, e.g. `owner.last_name`. Optional, defaults to `[]`.
+        search_vector (str): A `Vector` column to search with the `similar_to` parameter. Optional, defaults to `None`.
+        search_vector_path (str): A sidecar `.npy` file to memory-map the vectors from, and to load them from on start. Optional, defaults to `None`, i.e. in memory.
+        search_vector_lists (int): The number of lists of the IVF coarse index. Optional, defaults to `None`, i.e. exhaustive search.
+        search_vector_probes (int): The number of IVF lists searched by each query. Optional, defaults to `8`.
+        search_fulltext (Union[list[str], bool]): List of string fields to search together with the full-text `q` parameter, or boolean to apply to all string fields. Optional, defaults to `None`.
+        search_fulltext_language (str): The text search configuration of the full-text index. Optional, defaults to `"english"`.
+        render_in_db (bool): Render the page of results as JSON in the database. Optional, defaults to `False`.
+        export (bool): Add a streaming export route for search results. Optional, defaults to `False`.
+        export_batch_size (int): Number of rows fetched from the database at a time by the export route. Optional, defaults to `1000`.
+        count (bool): Add a count route for search results. Optional, defaults to `False`.
+        aggregate (Union[list[str], bool]): List of fields to group by and aggregate in an aggregate route, or boolean to apply to all fields. Optional, defaults to `None`.
     """
 
     required_params: list[str] = []
     pop_params: list[str] = []
 
     results_limit: int = 10
+    sortable: list[str] = []
 
     # for float, int, datetime:
     search_eq: Optional[Union[list[str], bool]] = None
@@ -90,6 +218,35 @@ class SearchConfig(ABC):
     search_contains: Optional[Union[list[str], bool]] = None
     search_similarity: Optional[Union[list[str], bool]] = None
     search_similarity_threshold: Optional[Union[int, float]] = None
+    search_similarity_index: bool = False
+    search_similarity_ranked: bool = False
+    search_fulltext: Optional[Union[list[str], bool]] = None
+    search_fulltext_language: str = "english"
+
+    # for lists of values:
+    search_in: Optional[Union[list[str], bool]] = None
+
+    # for relationships:
+    search_related: list[str] = []
+
+    # for vectors:
+    search_vector: Optional[str] = None
+    search_vector_path: Optional[str] = None
+    search_vector_lists: Optional[int] = None
+    search_vector_probes: int = 8
+
+    # rendering
+    render_in_db: bool = False
+
+    # export
+    export: bool = False
+    export_batch_size: int = 1000
+
+    # count
+    count: bool = False
+
+    # aggregate
+    aggregate: Optional[Union[list[str], bool]] = None
 
     # router method
     description: Optional[str] = None
@@ -180,6 +337,9 @@ class SearchMixin(BaseMixin):
             # pagination fields
             limit: int = 10
             page: int = 0
+
+            # sparse fieldset, e.g. "id,name"
+            fields: Optional[str] = None
         ```
 
     ## Endpoint - Search Resource
@@ -211,20 +371,347 @@ class SearchMixin(BaseMixin):
 
 
 class BaseModelWithBridge(BaseModel):
+    # relationship filters are aliased by their dotted path, e.g. `owner.last_name`
+    model_config = ConfigDict(populate_by_name=True)
+
     _bridge: Callable
 
 
+def encode_sort_cursor(sort: str, values: list) -> str:
+    payload = {"s": sort, "v": values}
+    return base64.urlsafe_b64encode(json.dumps(payload, default=str).encode()).decode()
+
+
+def decode_sort_cursor(cursor: str) -> tuple[str, list]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(payload["s"]), list(payload["v"])
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Invalid search cursor {cursor}")
+
+
+def keyset_after(keys: list[tuple[Any, bool, bool]], values: list) -> Any:
+    """
+    The rows after `values` in the order of `keys`, a list of `(column, descending, nullable)` tuples, with null values last.
+    """
+    after = []
+    equal: list[Any] = []
+    for (column, descending, nullable), value in zip(keys, values):
+        if value is None:
+            # only nulls sort with a null value
+            equal.append(column.is_(None))
+            continue
+        condition = column < value if descending else column > value
+        if nullable:
+            condition = or_(condition, column.is_(None))
+        after.append(and_(*equal, condition))
+        equal.append(column == value)
+    return or_(*after)
+
+
 class SearchFactory(RESTFactory):
 
     METHOD = "GET"
     CFG_NAME = "search_cfg"
     ROUTE = ""
 
+    # query parameters that control the response rather than filter the results
+    CONTROL_PARAMS = [
+        "limit",
+        "page",
+        "threshold",
+        "fields",
+        "q",
+        "similar_to",
+        "sort",
+        "cursor",
+    ]
+
+    # `_in` lists longer than this are bound as a single parameter
+    IN_LIST_THRESHOLD = 100
+
+    AGGREGATE_METRICS = ["count", "sum", "avg", "min", "max"]
+
     def __init__(self, model):
+        self.similarity_fields = self._string_fields(
+            model, model.search_cfg.search_similarity
+        )
+        self.trigram_index = (
+            TrigramIndex(model, self.similarity_fields)
+            if model.search_cfg.search_similarity_index and self.similarity_fields
+            else None
+        )
+        self.vector_index = (
+            VectorIndex(
+                model,
+                model.search_cfg.search_vector,
+                path=model.search_cfg.search_vector_path,
+                lists=model.search_cfg.search_vector_lists,
+                probes=model.search_cfg.search_vector_probes,
+            )
+            if model.search_cfg.search_vector
+            else None
+        )
+        self.pg_trgm_ranked = False
+        self.fulltext_fields = self._fulltext_fields(model)
+        if self.fulltext_fields:
+            register_fulltext_index(
+                model, self.fulltext_fields, model.search_cfg.search_fulltext_language
+            )
         self.input_model = self._generate_input_model(model)
+        self.item_model = self._generate_item_model(model)
         self.response_model = self._generate_response_model(model)
         self.controller = self.controller_factory(model)
 
+    @staticmethod
+    def _string_fields(model, fields: Optional[Union[list[str], bool]]) -> list[str]:
+        # the string columns selected by a `list[str] | bool` search config attribute
+        if not fields:
+            return []
+        return [
+            c.name
+            for c in model.__table__.columns
+            if c.type.python_type == str
+            and c.name not in model.resource_cfg.pop_params
+            and (fields is True or c.name in fields)
+        ]
+
+    def _fulltext_fields(self, model) -> list[str]:
+        return self._string_fields(model, model.search_cfg.search_fulltext)
+
+    def similarity_filter(self, model, Q, name: str, val: str, threshold):
+        """The similarity filter of a string field, scored by the database or the trigram index."""
+        if self.trigram_index is not None:
+            if name not in self.trigram_index.columns:
+                # fields outside of `search_similarity` are matched exactly
+                return getattr(model, name) == val
+            # every match is kept, however many, bound as a single parameter if the list is long
+            primary_keys = self.trigram_index.lookup(name, val, threshold)
+            return self.in_filter(model, Q, model.primary_key, list(primary_keys))
+        if self.pg_trgm_ranked:
+            # the `%` operator can be served by the trigram index, unlike `similarity(...) > threshold`
+            return getattr(model, name).op("%")(val)
+        return self.similarity_op(
+            self.similarity_fn(getattr(model, name), val), threshold
+        )
+
+    @staticmethod
+    def resolve_related(model, path: str) -> tuple[list[Any], Any]:
+        """
+        Resolve a dotted relationship path, e.g. `owner.last_name`, to its relationships and the related column.
+        """
+        *names, column_name = path.split(".")
+        if not names:
+            raise ValueError(f"search_related path {path} must follow a relationship")
+
+        cls = model
+        relationships = []
+        for name in names:
+            r = cls.__mapper__.relationships.get(name)
+            if r is None:
+                raise ValueError(
+                    f"{cls.__name__} has no relationship {name} (search_related path {path})"
+                )
+            relationships.append(r)
+            cls = r.mapper.class_
+
+        if column_name not in cls.__table__.columns:
+            raise ValueError(
+                f"{cls.__name__} has no column {column_name} (search_related path {path})"
+            )
+        return relationships, getattr(cls, column_name)
+
+    @staticmethod
+    def related_field_name(path: str) -> str:
+        return path.replace(".", "__")
+
+    def related_filter(self, model, Q, path: str, val, user) -> Any:
+        """
+        The correlated `EXISTS` filter of a relationship path, with the access control of each related resource.
+        """
+        relationships, column = self.resolve_related(model, path)
+
+        criterion = column == val
+        for r in reversed(relationships):
+            related = r.mapper.class_
+            if hasattr(related, "access_control"):
+                criterion = and_(
+                    criterion,
+                    related.access_control(Q.session.query(related), user).whereclause,
+                )
+            attribute = getattr(r.parent.class_, r.key)
+            criterion = (
+                attribute.any(criterion) if r.uselist else attribute.has(criterion)
+            )
+        return criterion
+
+    def parse_sort(self, model, sort: Optional[str]) -> list[tuple[str, bool]]:
+        """
+        Parse a `sort` parameter, e.g. `name,-vaccination_date`, into `(field, descending)` keys, ending with the primary key.
+        """
+        keys = []
+        for term in (sort or "").split(","):
+            term = term.strip()
+            if not term:
+                continue
+            name = term.lstrip("-")
+            if name not in model.search_cfg.sortable:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Can't sort {model.__tablename__} by {name}, sortable fields: {', '.join(model.search_cfg.sortable)}",
+                )
+            keys.append((name, term.startswith("-")))
+        if model.primary_key not in [name for name, _ in keys]:
+            keys.append((model.primary_key, False))
+        return keys
+
+    def sort_query(self, model, Q, query) -> tuple[Any, Optional[str]]:
+        """
+        Order `Q` by the `sort` parameter of `query`, after its `cursor`.
+        Returns the query, and the sort of its cursors (`None` if the results are ordered by relevance).
+        """
+        sort = query.sort
+        values = None
+        if query.cursor is not None:
+            cursor_sort, values = decode_sort_cursor(query.cursor)
+            if sort is not None and sort != cursor_sort:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"The search cursor is for sort={cursor_sort}",
+                )
+            sort = cursor_sort
+
+        if sort is None and self.ranked(model, query):
+            return Q, None
+
+        sort_keys = self.parse_sort(model, sort)
+        columns = model.__table__.columns
+        keys = [
+            (getattr(model, name), descending, columns[name].nullable)
+            for name, descending in sort_keys
+        ]
+
+        if values is not None:
+            try:
+                if len(values) != len(keys):
+                    raise ValueError("the cursor doesn't match its sort")
+                values = [
+                    TypeAdapter(
+                        Optional[columns[name].type.python_type]  # type: ignore
+                    ).validate_python(v)
+                    for (name, _), v in zip(sort_keys, values)
+                ]
+            except ValueError:
+                raise HTTPException(
+                    status_code=400, detail=f"Invalid search cursor {query.cursor}"
+                )
+            Q = Q.filter(keyset_after(keys, values))
+
+        order = []
+        for column, descending, nullable in keys:
+            key = column.desc() if descending else column.asc()
+            order.append(key.nulls_last() if nullable else key)
+        return Q.order_by(None).order_by(*order), sort or ""
+
+    def sort_columns(self, model, sort: str) -> list:
+        """
+        The columns of the cursors of `sort`, labelled so that they can be added to any query on `model`.
+        """
+        return [
+            getattr(model, name).label(f"cursor_{i}")
+            for i, (name, _) in enumerate(self.parse_sort(model, sort))
+        ]
+
+    def next_cursor(self, sort: Optional[str], keys: list, limit: int) -> Optional[str]:
+        """
+        The cursor after a page, from the sort `keys` of its rows, fetched with one row more than the page's `limit`,
+        or `None` if it is the last page (or the page isn't sorted).
+        """
+        if sort is None or len(keys) <= limit:
+            return None
+        return encode_sort_cursor(sort, list(keys[limit - 1]))
+
+    def in_filter(self, model, Q, name: str, values: list) -> Any:
+        """
+        The `IN` filter of a `<field>_in` list, bound as a single parameter for long lists.
+        """
+        column = getattr(model, name)
+        values = list(dict.fromkeys(values))
+        if len(values) <= self.IN_LIST_THRESHOLD:
+            return column.in_(values)
+
+        dialect = Q.session.get_bind().dialect
+        if dialect.name == "postgresql":
+            return column == any_(literal(values, ARRAY(column.type)))
+        if dialect.name == "sqlite":
+            # the values as stored, e.g. dates as ISO strings
+            process = column.type.bind_processor(dialect)
+            array = json.dumps([process(v) if process else v for v in values])
+            return column.in_(
+                select(literal_column("value")).select_from(func.json_each(array))
+            )
+        return column.in_(values)
+
+    def ranked(self, model, query) -> bool:
+        """
+        Whether the results of a search are ordered by relevance: by full-text rank if `q` is set, or by `rank`.
+        """
+        return bool(getattr(query, "q", None)) or self.rank(model, query) is not None
+
+    def rank(self, model, query) -> Optional[tuple[Any, Any]]:
+        """
+        The score and order of a ranked search, or `None` if the search isn't ranked:
+        by vector similarity if `similar_to` is set, otherwise by `search_similarity_ranked`.
+        """
+        if getattr(query, "similar_to", None) is not None:
+            similarity = self.vector_index.similar(query.similar_to)  # type: ignore
+            score: Any = (
+                case(similarity, value=getattr(model, model.primary_key), else_=0.0)
+                if similarity
+                else literal(0.0)
+            )
+            return score, score.desc()
+        if model.search_cfg.search_similarity_ranked:
+            return self.similarity_rank(model, query)
+        return None
+
+    def similarity_rank(self, model, query) -> Optional[tuple[Any, Any]]:
+        """
+        The score and order of a ranked similarity search, or `None` if no similarity fields are searched.
+        """
+        terms = [
+            (name, val)
+            for name, val in query.model_dump().items()
+            if type(val) is str and name in self.similarity_fields
+        ]
+        if not terms:
+            return None
+
+        scores: list[Any] = []
+        if self.trigram_index is not None:
+            primary_key_column = getattr(model, model.primary_key)
+            for name, val in terms:
+                similarity = self.trigram_index.lookup(name, val, query.threshold)
+                # only the most similar resources are scored, the others (still matching) rank after them
+                similarity = dict(
+                    islice(similarity.items(), self.trigram_index.max_candidates)
+                )
+                scores.append(
+                    case(similarity, value=primary_key_column, else_=0.0)
+                    if similarity
+                    else literal(0.0)
+                )
+        else:
+            scores = [func.similarity(getattr(model, name), val) for name, val in terms]
+
+        score = sum(scores[1:], scores[0]) / len(scores)
+
+        if self.pg_trgm_ranked and len(terms) == 1:
+            # order by distance, so that the trigram index can return the nearest rows first
+            name, val = terms[0]
+            return score, getattr(model, name).op("<->")(val)
+        return score, score.desc()
+
     def _generate_input_model(self, model) -> type[BaseModelWithBridge]:
 
         def maybe_add_param(search_cfg, name):
@@ -278,7 +765,10 @@ class SearchFactory(RESTFactory):
         query_fields: Any = {}
 
         for c in cols:
-            if c.name not in ["id"]:
+            if (
+                c.name not in ["id"] + model.resource_cfg.deferred_columns
+                and c.name != model.search_cfg.search_vector
+            ):
 
                 if c.type.python_type in [float, int, date, datetime]:
                     # handle filtering on numeric data
@@ -320,6 +810,23 @@ class SearchFactory(RESTFactory):
                     print("unknown", c.name, c.type.python_type)
                     print(repr(c.type.python_type))
 
+        # add list filters
+        for c in cols:
+            if (
+                c.name in model.resource_cfg.deferred_columns
+                or c.name == model.search_cfg.search_vector
+                or c.type.python_type not in [float, int, date, datetime, str]
+            ):
+                continue
+            if model.search_cfg.search_in is True or (
+                isinstance(model.search_cfg.search_in, list)
+                and c.name in model.search_cfg.search_in
+            ):
+                query_fields[c.name + "_in"] = (
+                    Optional[list[c.type.python_type]],  # type: ignore
+                    Field(title=c.name + "_in", default=None),
+                )
+
         # add pagination
         query_fields["limit"] = (
             int,
@@ -327,6 +834,20 @@ class SearchFactory(RESTFactory):
         )
         query_fields["page"] = (int, Field(title="page", default=0))
 
+        # add sparse fieldset
+        query_fields["fields"] = (Optional[str], Field(title="fields", default=None))
+
+        # maybe add sorting
+        if model.search_cfg.sortable:
+            for name in model.search_cfg.sortable:
+                if name not in model.__table__.columns:
+                    raise ValueError(f"{model.__name__} has no sortable column {name}")
+            query_fields["sort"] = (Optional[str], Field(title="sort", default=None))
+            query_fields["cursor"] = (
+                Optional[str],
+                Field(title="cursor", default=None),
+            )
+
         # maybe add similarity threshold
         if model.search_cfg.search_similarity is not None:
 
@@ -335,7 +856,24 @@ class SearchFactory(RESTFactory):
                     "Sessionmaker not set on model - search_similarity requires a database backend."
                 )
 
-            if model._sessionmaker.kw.get("bind").dialect.name == "sqlite":  # type: ignore
+            if self.trigram_index is not None:
+                # similarity is scored by the in-process trigram index
+                query_fields["threshold"] = (
+                    float,
+                    Field(
+                        title="threshold",
+                        default=model.search_cfg.search_similarity_threshold or 0.3,
+                        gt=0.0,
+                        le=1.0,
+                    ),
+                )
+
+            elif model._sessionmaker.kw.get("bind").dialect.name == "sqlite":  # type: ignore
+
+                if model.search_cfg.search_similarity_ranked:
+                    raise ValueError(
+                        "search_similarity_ranked requires postgresql or search_similarity_index"
+                    )
 
                 self.similarity_fn = func.editdist3
                 self.similarity_op = lt
@@ -347,6 +885,9 @@ class SearchFactory(RESTFactory):
             elif model._sessionmaker.kw.get("bind").dialect.name == "postgresql":  # type: ignore
                 self.similarity_fn = func.similarity
                 self.similarity_op = gt
+                if model.search_cfg.search_similarity_ranked:
+                    self.pg_trgm_ranked = True
+                    register_pg_trgm_index(model, self.similarity_fields)
                 query_fields["threshold"] = (
                     float,
                     Field(title="threshold", default=0.7, lt=1.0),
@@ -359,24 +900,81 @@ class SearchFactory(RESTFactory):
                     )
                 )
 
+        # maybe add relationship filters
+        for path in model.search_cfg.search_related:
+            _, column = self.resolve_related(model, path)
+            query_fields[self.related_field_name(path)] = (
+                Optional[column.type.python_type],
+                Field(title=path, alias=path, default=None),
+            )
+
+        # maybe add vector query
+        if self.vector_index is not None:
+            primary_key_type = str if model.primary_key == "slug" else model._id_type
+            query_fields["similar_to"] = (
+                Optional[primary_key_type],
+                Field(title="similar_to", default=None),
+            )
+
+        # maybe add full-text query
+        if self.fulltext_fields:
+            query_fields["q"] = (Optional[str], Field(title="q", default=None))
+
         query_model = create_model(
             "Search" + model.__name__,
             __base__=BaseModelWithBridge,
             **query_fields,
         )
 
+        self.query_fields = query_fields
+        query_model._bridge = self._generate_bridge(query_model, query_fields)
+
+        return query_model
+
+    def _generate_bridge(
+        self, query_model, query_fields, exclude: Optional[list[str]] = None
+    ) -> Callable:
+        """
+        Build a dependency that collects the search query parameters into an instance of `query_model`.
+        Parameters in `exclude` are not exposed, and take their default value on the model.
+        """
+
+        # list parameters are collected as strings, so that they can also be comma-separated
+        list_names = [
+            name
+            for name, (type_annotation, _) in query_fields.items()
+            if any(get_origin(a) is list for a in get_args(type_annotation))
+        ]
+
         bridge_parameters = [
             Parameter(
                 name,
                 Parameter.POSITIONAL_OR_KEYWORD,
-                default=field.default,
-                annotation=type_annotation,
+                default=(
+                    Query(field.default, alias=field.alias)
+                    if field.alias or name in list_names
+                    else field.default
+                ),
+                annotation=(
+                    Optional[list[str]] if name in list_names else type_annotation
+                ),
             )
             for name, (type_annotation, field) in query_fields.items()
+            if name not in (exclude or [])
         ]
 
-        def bridge_inner(*args, **kwargs) -> model:
-            return query_model(**kwargs)
+        def bridge_inner(*args, **kwargs) -> query_model:
+            for name in list_names:
+                if kwargs.get(name) is not None:
+                    kwargs[name] = [
+                        v for item in kwargs[name] for v in item.split(",") if v
+                    ]
+            try:
+                return query_model(**kwargs)
+            except ValidationError as e:
+                raise RequestValidationError(
+                    [{**error, "loc": ("query", *error["loc"])} for error in e.errors()]
+                )
 
         @wraps(bridge_inner)
         def bridge(*args, **kwargs):
@@ -387,9 +985,18 @@ class SearchFactory(RESTFactory):
         sig = sig.replace(parameters=bridge_parameters)
         bridge.__signature__ = sig  # type: ignore
 
-        query_model._bridge = bridge
+        return bridge
 
-        return query_model
+    def _generate_item_model(self, model) -> type[BaseModel]:
+        if not (
+            model.search_cfg.search_similarity_ranked or model.search_cfg.search_vector
+        ):
+            return model.basemodel
+
+        fields: Any = {"score": (Optional[float], Field(title="score", default=None))}
+        return create_model(
+            "Scored" + model.__name__, __base__=model.basemodel, **fields
+        )
 
     def _generate_response_model(self, model) -> BaseModel:
 
@@ -399,13 +1006,187 @@ class SearchFactory(RESTFactory):
             "page": (int, Field(title="page")),
             "total_pages": (int, Field(title="total_pages")),
             model.__tablename__: (
-                list[model.basemodel],
+                list[self.item_model],  # type: ignore
                 Field(title=model.__tablename__),
             ),
         }
+        if model.search_cfg.sortable:
+            fields["next_cursor"] = (
+                Optional[str],
+                Field(title="next_cursor", default=None),
+            )
 
         return create_model("Paginate" + model.__name__, **fields)
 
+    def count_query(self, db, Q) -> int:
+        return db.query(func.count()).select_from(Q.subquery()).scalar()
+
+    def has_filters(self, query) -> bool:
+        """
+        Check whether any search filters are set on `query` (an instance of the search input model).
+        """
+        return any(
+            getattr(query, name, None) is not None for name in ["q", "similar_to"]
+        ) or any(
+            val is not None
+            for name, val in query.model_dump().items()
+            if name not in self.CONTROL_PARAMS
+        )
+
+    def filter_bridge(self) -> Callable:
+        """
+        Build a dependency for the search filters alone, i.e. without the paging and fieldset parameters.
+        """
+        return self._generate_bridge(
+            self.input_model,
+            self.query_fields,
+            exclude=["limit", "page", "fields", "sort", "cursor"],
+        )
+
+    def filter_query(self, model, Q, query, user):
+        """
+        Apply the search filters in `query` (an instance of the search input model) to the query `Q`,
+        with `user`'s access control on related resources.
+        """
+
+        related_names = set()
+        for path in model.search_cfg.search_related:
+            related_names.add(self.related_field_name(path))
+            val = getattr(query, self.related_field_name(path))
+            if val is not None:
+                Q = Q.filter(self.related_filter(model, Q, path, val, user))
+
+        if self.pg_trgm_ranked and self.similarity_rank(model, query) is not None:
+            # the threshold of the `%` operator, for this transaction
+            Q.session.execute(
+                select(
+                    func.set_config(
+                        "pg_trgm.similarity_threshold", str(query.threshold), True
+                    )
+                )
+            )
+
+        for name, val in query.model_dump().items():
+            if (
+                val is not None
+                and name not in self.CONTROL_PARAMS
+                and name not in related_names
+            ):
+
+                # check type of param
+
+                if type(val) is list:
+                    Q = Q.filter(self.in_filter(model, Q, name[: -len("_in")], val))
+
+                if type(val) is bool:
+                    Q = Q.filter(getattr(model, name) == val)
+
+                if type(val) in [int, float, date, datetime]:
+
+                    compare_type = name.split("_")[-1]
+                    param_name = "_".join(name.split("_")[:-1])
+
+                    if compare_type == "eq":
+                        Q = Q.filter(getattr(model, param_name) == val)
+                    elif compare_type == "gte":
+                        Q = Q.filter(getattr(model, param_name) >= val)
+                    elif compare_type == "gt":
+                        Q = Q.filter(getattr(model, param_name) > val)
+                    elif compare_type == "lte":
+                        Q = Q.filter(getattr(model, param_name) <= val)
+                    elif compare_type == "lt":
+                        Q = Q.filter(getattr(model, param_name) < val)
+
+                if type(val) is str:
+
+                    if (
+                        model.search_cfg.search_contains
+                        and model.search_cfg.search_similarity
+                    ):
+                        # if contains AND similarity
+                        Q = Q.filter(
+                            or_(
+                                getattr(model, name).contains(val),
+                                self.similarity_filter(
+                                    model, Q, name, val, query.threshold
+                                ),
+                            )
+                        )
+
+                    elif model.search_cfg.search_contains:
+                        # if just contains
+                        Q = Q.filter(getattr(model, name).contains(val))
+
+                    elif model.search_cfg.search_similarity:
+                        # if just similarity
+                        Q = Q.filter(
+                            self.similarity_filter(model, Q, name, val, query.threshold)
+                        )
+
+                    else:
+                        # else jsut extact match
+                        Q = Q.filter(getattr(model, name) == val)
+
+        if getattr(query, "q", None):
+            Q = fulltext_query(
+                model, Q, query.q, model.search_cfg.search_fulltext_language
+            )
+
+        if getattr(query, "similar_to", None) is not None:
+            similar = self.vector_index.similar(query.similar_to)  # type: ignore
+            Q = Q.filter(getattr(model, model.primary_key).in_(list(similar)))
+
+        rank = self.rank(model, query)
+        if rank is not None:
+            Q = Q.order_by(rank[1], getattr(model, model.primary_key))
+
+        return Q
+
+    def attach_route(self, model) -> None:
+        if model.search_cfg.render_in_db:
+            check_renderable(model)
+
+        if model.search_cfg.export:
+            model.router.add_api_route(
+                "/export",
+                self.export_controller_factory(model),
+                description=f"Export search results for {model.__tablename__} as NDJSON or CSV",
+                dependencies=[Depends(d) for d in model.search_cfg.dependencies],
+                summary="export " + model.__name__.lower(),
+                tags=model.search_cfg.tags or [model.__name__],
+                operation_id=f"export_{model.__tablename__}",
+                methods=[self.METHOD],
+                response_class=StreamingResponse,
+            )
+
+        if model.search_cfg.count:
+            model.router.add_api_route(
+                "/count",
+                self.count_controller_factory(model),
+                description=f"Count search results for {model.__tablename__}",
+                dependencies=[Depends(d) for d in model.search_cfg.dependencies],
+                summary="count " + model.__name__.lower(),
+                tags=model.search_cfg.tags or [model.__name__],
+                operation_id=f"count_{model.__tablename__}",
+                methods=[self.METHOD],
+                response_model=int,
+            )
+
+        if model.search_cfg.aggregate:
+            model.router.add_api_route(
+                "/aggregate",
+                self.aggregate_controller_factory(model),
+                description=f"Aggregate search results for {model.__tablename__}",
+                dependencies=[Depends(d) for d in model.search_cfg.dependencies],
+                summary="aggregate " + model.__name__.lower(),
+                tags=model.search_cfg.tags or [model.__name__],
+                operation_id=f"aggregate_{model.__tablename__}",
+                methods=[self.METHOD],
+                response_model=list[dict[str, Any]],
+            )
+
+        super().attach_route(model)
+
     def controller_factory(self, model):
 
         parameters = [
@@ -429,7 +1210,25 @@ class SearchFactory(RESTFactory):
             ),
         ]
 
-        async def inner(*args, **kwargs) -> list[model]:
+        if is_versioned(model):
+            parameters.insert(
+                0,
+                Parameter(
+                    "response",
+                    Parameter.POSITIONAL_OR_KEYWORD,
+                    annotation=Response,
+                ),
+            )
+            parameters.append(
+                Parameter(
+                    "if_none_match",
+                    Parameter.POSITIONAL_OR_KEYWORD,
+                    default=Header(None),
+                    annotation=Optional[str],
+                ),
+            )
+
+        async def inner(*args, **kwargs) -> list[model] | Response:
             db = kwargs["db"]
             query = kwargs["query"]
             user = kwargs["user"]
@@ -440,82 +1239,143 @@ class SearchFactory(RESTFactory):
 
                 # add access control
                 if hasattr(model, "access_control"):
-                    Q = model.access_control(Q, user)
-
-                for name, val in query.model_dump().items():
-                    if val is not None:
-
-                        # check type of param
-
-                        if type(val) is bool:
-                            Q = Q.filter(getattr(model, name) == val)
-
-                        if type(val) in [int, float, date, datetime]:
-
-                            compare_type = name.split("_")[-1]
-                            param_name = "_".join(name.split("_")[:-1])
-
-                            if compare_type == "eq":
-                                Q = Q.filter(getattr(model, param_name) == val)
-                            elif compare_type == "gte":
-                                Q = Q.filter(getattr(model, param_name) >= val)
-                            elif compare_type == "gt":
-                                Q = Q.filter(getattr(model, param_name) > val)
-                            elif compare_type == "lte":
-                                Q = Q.filter(getattr(model, param_name) <= val)
-                            elif compare_type == "lt":
-                                Q = Q.filter(getattr(model, param_name) < val)
-
-                        if type(val) is str:
-
-                            if (
-                                model.search_cfg.search_contains
-                                and model.search_cfg.search_similarity
-                            ):
-                                # if contains AND similarity
-                                Q = Q.filter(
-                                    or_(
-                                        getattr(model, name).contains(val),
-                                        self.similarity_op(
-                                            self.similarity_fn(
-                                                getattr(model, name), val
-                                            ),
-                                            query.threshold,
-                                        ),
-                                    )
-                                )
-
-                            elif model.search_cfg.search_contains:
-                                # if just contains
-                                Q = Q.filter(getattr(model, name).contains(val))
-
-                            elif model.search_cfg.search_similarity:
-                                # if just similarity
-                                Q = Q.filter(
-                                    self.similarity_op(
-                                        self.similarity_fn(getattr(model, name), val),
-                                        query.threshold,
-                                    )
-                                )
-
-                            else:
-                                # else jsut extact match
-                                Q = Q.filter(getattr(model, name) == val)
+                    Q = collection_access_control(model, Q, user)
+
+                Q = self.filter_query(model, Q, query, user)
+
+                offset = query.page * query.limit
+                sort = None
+                if model.search_cfg.sortable:
+                    Q, sort = self.sort_query(model, Q, query)
+                    if query.cursor is not None:
+                        offset = 0
+
+                fields = model.parse_fields(query.fields)
+
+                headers = {}
+                page_fields: dict[str, Any] = {}
+                # sorted pages fetch the sort keys of one more row, from which the next cursor is found,
+                # with the first query that reads the page
+                cursor_keys = self.sort_columns(model, sort) if sort is not None else []
+                total_results = None
+                if is_versioned(model):
+                    # check the versions of the page without loading or serializing it
+                    total_results = self.count_query(db, Q)
+                    rows = (
+                        Q.with_entities(
+                            getattr(model, model.primary_key),
+                            model.version,
+                            model.updated_at,
+                            *cursor_keys,
+                        )
+                        .offset(offset)
+                        .limit(query.limit + (1 if cursor_keys else 0))
+                        .all()
+                    )
+                    if cursor_keys:
+                        page_fields["next_cursor"] = self.next_cursor(
+                            sort, [row[3:] for row in rows], query.limit
+                        )
+                        cursor_keys = []
+                    versions = [row[:3] for row in rows[: query.limit]]
+                    headers["ETag"] = page_etag(total_results, versions)
+
+                    if etag_matches(kwargs.get("if_none_match"), headers["ETag"]):
+                        return Response(status_code=304, headers=headers)
+
+                if model.search_cfg.render_in_db:
+                    items, total_results, keys = json_page_query(
+                        db,
+                        Q,
+                        model,
+                        offset,
+                        query.limit,
+                        fields=fields,
+                        keys=cursor_keys,
+                    )
+                    if cursor_keys:
+                        page_fields["next_cursor"] = self.next_cursor(
+                            sort, keys, query.limit
+                        )
+
+                    if total_results is None:
+                        # the page is empty, so the window count is unavailable
+                        total_results = self.count_query(db, Q)
+
+                    content = '{{"page":{},"total_pages":{},"{}":{}{}}}'.format(
+                        query.page,
+                        (total_results // query.limit) + 1,
+                        model.__tablename__,
+                        items,
+                        "".join(
+                            f",{json.dumps(k)}:{json.dumps(v)}"
+                            for k, v in page_fields.items()
+                        ),
+                    )
+
+                    return Response(
+                        content=content, media_type="application/json", headers=headers
+                    )
 
                 # pagination
                 # Count total results (without fetching)
-                total_results = (
-                    db.query(func.count()).select_from(Q.subquery()).scalar()
-                )
+                if total_results is None:
+                    total_results = self.count_query(db, Q)
 
                 # Get filtered set of results
-                filtered_results = (
-                    Q.offset(query.page * query.limit).limit(query.limit).all()
+                page_query = Q.options(*model.load_options(fields))
+
+                rank = self.rank(model, query)
+                if rank is not None:
+                    page_query = page_query.add_columns(rank[0].label("score"))
+
+                if cursor_keys:
+                    page_query = page_query.add_columns(*cursor_keys)
+
+                rows = (
+                    page_query.offset(offset)
+                    .limit(query.limit + (1 if cursor_keys else 0))
+                    .all()
                 )
 
+                if cursor_keys:
+                    page_fields["next_cursor"] = self.next_cursor(
+                        sort, [row[-len(cursor_keys) :] for row in rows], query.limit
+                    )
+                    rows = [
+                        row[0] if rank is None else tuple(row[:2])
+                        for row in rows[: query.limit]
+                    ]
+
+                if rank is not None:
+                    filtered_results = [obj for obj, _ in rows]
+                    scores = [{"score": score} for _, score in rows]
+                else:
+                    filtered_results = rows
+                    scores = [{} for _ in rows]
+
+                if fields is not None:
+                    return JSONResponse(
+                        {
+                            "page": query.page,
+                            "total_pages": (total_results // query.limit) + 1,
+                            model.__tablename__: [
+                                {**model.serialize_fields(obj, fields), **score}
+                                for obj, score in zip(filtered_results, scores)
+                            ],
+                            **page_fields,
+                        },
+                        headers=headers,
+                    )
+
+                if kwargs.get("response") is not None:
+                    kwargs["response"].headers.update(headers)
+
                 pydnatic_results = [
-                    model.basemodel.model_validate(obj, from_attributes=True)
-                    for obj in filtered_results
+                    self.item_model.model_validate(
+                        obj, from_attributes=True
+                    ).model_copy(update=score)
+                    for obj, score in zip(filtered_results, scores)
                 ]
 
                 return self.response_model(
@@ -523,6 +1383,7 @@ class SearchFactory(RESTFactory):
                         "page": query.page,
                         "total_pages": (total_results // query.limit) + 1,
                         model.__tablename__: pydnatic_results,
+                        **page_fields,
                     }
                 )
             except Exception as e:
@@ -538,3 +1399,355 @@ class SearchFactory(RESTFactory):
         f.__signature__ = sig
 
         return f
+
+    def count_controller_factory(self, model):
+
+        parameters = [
+            Parameter(
+                "query",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(self.filter_bridge()),
+                annotation=self.input_model,
+            ),
+            Parameter(
+                "db",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model.db_generator),
+                annotation=Session,
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        async def inner(*args, **kwargs) -> int:
+            db = kwargs["db"]
+            query = kwargs["query"]
+            user = kwargs["user"]
+
+            try:
+                Q = db.query(model)
+
+                if hasattr(model, "access_control"):
+                    Q = collection_access_control(model, Q, user)
+
+                Q = self.filter_query(model, Q, query, user)
+
+                return self.count_query(db, Q)
+            except Exception as e:
+                raise model._error_handler(e)
+
+        @wraps(inner)
+        async def f(*args, **kwargs):
+            return await inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig  # type: ignore
+
+        return f
+
+    def aggregate_fields(self, model) -> list[str]:
+        """
+        The fields that can be grouped by and aggregated in the aggregate route.
+        """
+        aggregate = model.search_cfg.aggregate
+        return [
+            c.name
+            for c in model.__table__.columns
+            if c.name not in model.resource_cfg.deferred_columns
+            and c.name != model.search_cfg.search_vector
+            and (aggregate is True or c.name in (aggregate or []))
+        ]
+
+    @staticmethod
+    def bucket_expression(column, bucket: str, dialect_name: str) -> Any:
+        """
+        Truncate a date or datetime column to the start of its `bucket`, i.e. its day, week (from Monday), month or year.
+        """
+        if dialect_name == "postgresql":
+            return cast(func.date_trunc(bucket, column), Date)
+        # sqlite stores dates as ISO strings
+        if bucket == "day":
+            return func.date(column)
+        if bucket == "week":
+            return func.date(column, "weekday 0", "-6 days")
+        if bucket == "month":
+            return func.strftime("%Y-%m-01", column)
+        return func.strftime("%Y-01-01", column)
+
+    def aggregate_query(
+        self,
+        model,
+        Q,
+        group_by: Optional[str],
+        metrics: Optional[str],
+        bucket: Optional[str],
+    ) -> Any:
+        """
+        The `GROUP BY` statement of the aggregate route over the filtered query `Q`.
+        """
+        fields = self.aggregate_fields(model)
+        columns = model.__table__.columns
+
+        def check_field(name: str, python_types: Optional[list] = None) -> None:
+            if name not in fields:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Can't aggregate {model.__tablename__} by {name}, fields: {', '.join(fields)}",
+                )
+            if python_types is not None and (
+                columns[name].type.python_type not in python_types
+            ):
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Can't aggregate {model.__tablename__}.{name} of type {columns[name].type.python_type.__name__}",
+                )
+
+        group_names = [n.strip() for n in (group_by or "").split(",") if n.strip()]
+        for name in group_names:
+            check_field(name)
+
+        metric_terms = []
+        for term in [t.strip() for t in (metrics or "count").split(",") if t.strip()]:
+            metric, _, name = term.partition(":")
+            if metric not in self.AGGREGATE_METRICS:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Unknown metric {metric}, metrics: {', '.join(self.AGGREGATE_METRICS)}",
+                )
+            if metric in ["sum", "avg"]:
+                check_field(name, [int, float])
+            elif metric in ["min", "max"]:
+                check_field(name, [int, float, date, datetime])
+            elif name:
+                check_field(name)
+            metric_terms.append((metric, name))
+
+        # the filtered results, with just the aggregated columns and without any relevance order
+        names = list(
+            dict.fromkeys(
+                [model.primary_key, *group_names, *[n for _, n in metric_terms if n]]
+            )
+        )
+        results = (
+            Q.with_entities(*[getattr(model, name).label(name) for name in names])
+            .order_by(None)
+            .subquery()
+        )
+        dialect_name = Q.session.get_bind().dialect.name
+
+        groups = []
+        for name in group_names:
+            expression = results.c[name]
+            if bucket is not None and columns[name].type.python_type in [
+                date,
+                datetime,
+            ]:
+                expression = self.bucket_expression(expression, bucket, dialect_name)
+            groups.append(expression.label(name))
+
+        aggregates = [
+            (
+                getattr(func, metric)(results.c[name]).label(f"{metric}_{name}")
+                if name
+                else func.count().label("count")
+            )
+            for metric, name in metric_terms
+        ]
+
+        return (
+            select(*groups, *aggregates)
+            .select_from(results)
+            .group_by(*groups)
+            .order_by(*groups)
+        )
+
+    def aggregate_controller_factory(self, model):
+
+        parameters = [
+            Parameter(
+                "query",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(self.filter_bridge()),
+                annotation=self.input_model,
+            ),
+            Parameter(
+                "group_by",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=None,
+                annotation=Optional[str],
+            ),
+            Parameter(
+                "metrics",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default="count",
+                annotation=str,
+            ),
+            Parameter(
+                "bucket",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=None,
+                annotation=Optional[Literal["day", "week", "month", "year"]],
+            ),
+            Parameter(
+                "db",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model.db_generator),
+                annotation=Session,
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        async def inner(*args, **kwargs) -> list[dict[str, Any]]:
+            db = kwargs["db"]
+            query = kwargs["query"]
+            user = kwargs["user"]
+
+            try:
+                Q = db.query(model)
+
+                if hasattr(model, "access_control"):
+                    Q = collection_access_control(model, Q, user)
+
+                Q = self.filter_query(model, Q, query, user)
+
+                stmt = self.aggregate_query(
+                    model, Q, kwargs["group_by"], kwargs["metrics"], kwargs["bucket"]
+                )
+                return [dict(row) for row in db.execute(stmt).mappings()]
+            except Exception as e:
+                raise model._error_handler(e)
+
+        @wraps(inner)
+        async def f(*args, **kwargs):
+            return await inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig  # type: ignore
+
+        return f
+
+    def export_controller_factory(self, model):
+
+        parameters = [
+            Parameter(
+                "query",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(self.filter_bridge()),
+                annotation=self.input_model,
+            ),
+            Parameter(
+                "format",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default="ndjson",
+                annotation=Literal["ndjson", "csv"],
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        columns = list(model.basemodel.model_fields)
+
+        def to_csv_row(obj) -> str:
+            row = model.basemodel.model_validate(obj, from_attributes=True).model_dump(
+                mode="json"
+            )
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(
+                [
+                    json.dumps(row[c]) if isinstance(row[c], (dict, list)) else row[c]
+                    for c in columns
+                ]
+            )
+            return buffer.getvalue()
+
+        def to_ndjson_row(obj) -> str:
+            return (
+                model.basemodel.model_validate(
+                    obj, from_attributes=True
+                ).model_dump_json()
+                + "\n"
+            )
+
+        async def inner(*args, **kwargs) -> StreamingResponse:
+            query = kwargs["query"]
+            user = kwargs["user"]
+            export_format = kwargs["format"]
+
+            to_row = to_csv_row if export_format == "csv" else to_ndjson_row
+
+            # use a dedicated session, as the request session may be closed before the response is streamed;
+            # the query is built and its first row fetched before the response starts,
+            # so that errors are still returned with their status code
+            db = model._sessionmaker()
+            try:
+                Q = db.query(model)
+                if hasattr(model, "access_control"):
+                    Q = collection_access_control(model, Q, user)
+                Q = self.filter_query(model, Q, query, user)
+                Q = Q.options(*model.load_options())
+
+                results = iter(Q.yield_per(model.search_cfg.export_batch_size))
+                first = next(results, None)
+                first_row = to_row(first) if first is not None else None
+            except Exception as e:
+                db.close()
+                raise model._error_handler(e)
+
+            def stream():
+                try:
+                    if export_format == "csv":
+                        buffer = io.StringIO()
+                        csv.writer(buffer).writerow(columns)
+                        yield buffer.getvalue()
+
+                    batch = [] if first_row is None else [first_row]
+                    for obj in results:
+                        batch.append(to_row(obj))
+                        if len(batch) >= model.search_cfg.export_batch_size:
+                            yield "".join(batch)
+                            batch = []
+                    if batch:
+                        yield "".join(batch)
+                finally:
+                    db.close()
+
+            if export_format == "csv":
+                media_type, extension = "text/csv", "csv"
+            else:
+                media_type, extension = "application/x-ndjson", "ndjson"
+
+            return StreamingResponse(
+                stream(),
+                media_type=media_type,
+                headers={
+                    "Content-Disposition": f'attachment; filename="{model.__tablename__}.{extension}"'
+                },
+            )
+
+        @wraps(inner)
+        async def f(*args, **kwargs):
+            return await inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig
+
+        return f
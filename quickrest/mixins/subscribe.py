@@ -0,0 +1,443 @@
+import asyncio
+import json
+import threading
+from abc import ABC
+from collections import defaultdict
+from functools import wraps
+from inspect import Parameter, signature
+from typing import Any, Callable, Optional
+
+from fastapi import Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import literal, select, union_all
+
+from quickrest.mixins.access_control import access_columns, can_access
+from quickrest.mixins.base import BaseMixin, RESTFactory
+from quickrest.mixins.utils import classproperty
+
+
+class SubscribeConfig(ABC):
+    """
+    The `SubscribeConfig` class can optionally be defined on the resource class.
+    This class should inherit from `SubscribeConfig` and must be called `subscribe_cfg`.
+    Like the upsert routes, the subscribe route is opt-in:
+    `subscribe_cfg` is `None` by default, and the route is only created if `subscribe_cfg` is defined.
+
+    ## Example:
+
+    ```python
+    from sqlalchemy.orm import Mapped, mapped_column
+
+    from quickrest import Base, Resource, SubscribeConfig
+
+
+    class Order(Base, Resource):
+        __tablename__ = "orders"
+
+        status: Mapped[str] = mapped_column()
+
+        class subscribe_cfg(SubscribeConfig):
+            heartbeat_seconds = 30
+            queue_size = 1000
+    ```
+
+    Attributes:
+        description (str, optional): Description of the endpoint. Optional, defaults to `None`.
+        summary (str, optional): Summary of the endpoint. Optional, defaults to `subscribe {resource_name}`.
+        operation_id (str, optional): Operation ID of the endpoint. Optional, defaults to `None`.
+        tags (list[str], optional): Tags for the endpoint. Optional, defaults to `None`.
+        dependencies (list[Callable]): Injectable callable dependencies for the endpoint. Optional, defaults to `[]`.
+        heartbeat_seconds (float): Send a heartbeat comment after this many seconds without events. Optional, defaults to `15`.
+        queue_size (int): The number of undelivered events buffered per subscriber. Optional, defaults to `100`.
+
+    """
+
+    # router method
+    description: Optional[str] = None
+    summary: Optional[str] = None
+    operation_id: Optional[str] = None
+    tags: Optional[list[str]] = None
+    dependencies: list[Callable] = []
+
+    # subscribe method
+    heartbeat_seconds: float = 15
+    queue_size: int = 100
+
+
+class SubscribeMixin(BaseMixin):
+    """
+    This mixin is automatically inherited by the `Resource` class and provides a live event stream of changes to the resource,
+    so that clients (e.g. dashboards) don't need to poll the search route.
+    The subscribe route is only created if the resource defines a `subscribe_cfg`, see `SubscribeConfig`.
+
+    ## Endpoint - Subscribe to Resource Changes
+
+        GET /{resource_name}/subscribe?{search_filters}
+
+    The response is a [Server-Sent Events](https://html.spec.whatwg.org/multipage/server-sent-events.html) stream.
+    An event is sent for each resource written by the create, patch, upsert and delete routes (including their bulk variants),
+    with the event name `create`, `patch`, `upsert` or `delete`.
+    The data of create, patch and upsert events is the resource [BaseModel](resource.md#quickrest.mixins.resource.ResourceMixin._build_basemodel),
+    and the data of delete events is the primary key of the resource, e.g. `{"id": 1}`.
+
+    Events are only sent if the resource matches the [search filters](search.md#quickrest.mixins.search.SearchMixin)
+    in the query string, and is visible to the subscribing user under the resource's access control.
+    Deleted resources are checked against each subscription in the deleting transaction, before they are deleted.
+    Events are published once the write is committed, so writes that are rolled back (e.g. in a failed `POST /batch`) aren't sent.
+
+    Each write is rendered once for all of its subscribers, with one query.
+    Private, publishable and user access control is checked in Python from the owner (and public) column of the resource,
+    and the search filters of all the subscriptions that set them (or custom access control) are checked with one more query.
+
+    A heartbeat comment (`: heartbeat`) is sent after `heartbeat_seconds` without events, so that idle connections aren't closed by proxies.
+    Each subscriber buffers up to `queue_size` undelivered events.
+    If a subscriber falls further behind, its stream ends with an `overflow` event, and the client should re-read the resources it needs and re-subscribe.
+
+    | Property | Description |
+    | :--- | :---- |
+    | Method | `GET` |
+    | Route | `/{resource_name}/subscribe` |
+    | Request  | Path: `<none>` </br> Query: search filters </br> Body: `<none>` |
+    | Success Response | 200 OK: `text/event-stream` |
+
+    !!! note
+        Events are published by an in-process broker, so subscribers only receive the writes made by the same worker process.
+        Deployments with several workers need sticky sessions, or a shared broker in front of `quickrest.mixins.subscribe.broker`.
+
+    """
+
+    _subscribe = None
+
+    subscribe_cfg: Optional[type[SubscribeConfig]] = None
+
+    @classproperty
+    def subscribe(cls):
+        if cls._subscribe is None:
+            cls._subscribe = SubscribeFactory(cls)
+        return cls._subscribe
+
+
+class Subscription:
+    """An event queue for one subscriber, owned by the subscriber's event loop."""
+
+    def __init__(self, resource: str, queue_size: int, query=None, user=None):
+        self.resource = resource
+        self.query = query
+        self.user = user
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, event: tuple[str, str]) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # the subscriber can't keep up, so its stream is ended
+            self.overflowed = True
+
+
+class Broker:
+    """
+    An in-process broker, which fans out write events to the subscribers of each resource.
+    Events can be published from any thread, e.g. by the sync delete controllers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: dict[str, set[Subscription]] = defaultdict(set)
+
+    def subscribe(
+        self, resource: str, queue_size: int, query=None, user=None
+    ) -> Subscription:
+        subscription = Subscription(resource, queue_size, query, user)
+        with self._lock:
+            self._subscriptions[resource].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions[subscription.resource].discard(subscription)
+
+    def subscribers(self, resource: str) -> int:
+        with self._lock:
+            return len(self._subscriptions[resource])
+
+    def subscriptions(self, resource: str) -> list[Subscription]:
+        with self._lock:
+            return list(self._subscriptions[resource])
+
+    def publish(
+        self,
+        resource: str,
+        op: str,
+        data: dict[Any, str],
+        audience: dict[Subscription, list],
+    ) -> None:
+        """
+        Publish a write to the subscribers of `resource`:
+        each subscriber receives the (JSON) `data` of its primary keys in the `audience`.
+        """
+        for subscription in self.subscriptions(resource):
+            # subscribers since the audience was found don't receive the write
+            keys = audience.get(subscription, [])
+            try:
+                for primary_key in keys:
+                    subscription.loop.call_soon_threadsafe(
+                        subscription.put, (op, data[primary_key])
+                    )
+            except RuntimeError:
+                # the subscriber's event loop is closed
+                self.unsubscribe(subscription)
+
+
+broker = Broker()
+
+
+def subscribed(model) -> bool:
+    return getattr(model, "subscribe_cfg", None) is not None
+
+
+def publish(
+    model,
+    op: str,
+    primary_keys: list,
+    audience: Optional[dict[Subscription, list]] = None,
+) -> None:
+    """
+    Publish the write of `primary_keys` to the resource's subscribers, after the write is committed.
+    The resources are rendered once, and sent to the subscribers in their `audience`
+    (found now, unless it was found before the write, i.e. for deletes).
+    """
+    if not subscribed(model) or not primary_keys:
+        return
+    if not broker.subscribers(model.__tablename__):
+        return
+
+    if op == "delete":
+        data = {
+            primary_key: json.dumps({model.primary_key: primary_key}, default=str)
+            for primary_key in primary_keys
+        }
+        if audience is None:
+            audience = {}
+    else:
+        primary_key_column = getattr(model, model.primary_key)
+        with model._sessionmaker() as db:
+            objects = {
+                getattr(obj, model.primary_key): obj
+                for obj in db.query(model)
+                .options(*model.load_options())
+                .filter(primary_key_column.in_(primary_keys))
+            }
+            data = {
+                primary_key: model.basemodel.model_validate(
+                    obj, from_attributes=True
+                ).model_dump_json()
+                for primary_key, obj in objects.items()
+            }
+            audience = find_audience(model, db, list(objects), objects)
+
+    broker.publish(model.__tablename__, op, data, audience)
+
+
+def find_audience(
+    model, db, primary_keys: list, objects: Optional[dict] = None
+) -> dict[Subscription, list]:
+    """
+    The primary keys that each subscriber can see.
+    Private, publishable and user access control is checked in Python, from the `objects` if they're loaded,
+    and otherwise from the access columns of the resources, read with a single query.
+    The search filters of the subscriptions that set them (and custom access control) are checked with one more query.
+    """
+    subscriptions = broker.subscriptions(model.__tablename__)
+    if not subscriptions or not primary_keys:
+        return {}
+
+    primary_key_column = getattr(model, model.primary_key)
+    controlled = hasattr(model, "access_control")
+    owner_column, public_column = access_columns(model)
+    in_python = controlled and owner_column is not None
+
+    # the owner and public values of each resource
+    access: dict[Any, tuple] = {}
+    if in_python:
+        names = [owner_column, public_column]
+        if objects is not None:
+            access = {
+                primary_key: tuple(getattr(obj, n) if n else None for n in names)
+                for primary_key, obj in objects.items()
+            }
+        else:
+            columns = [getattr(model, n) for n in names if n]
+            access = {
+                primary_key: (tuple(values) + (None,))[:2]
+                for primary_key, *values in db.execute(
+                    select(primary_key_column, *columns).where(
+                        primary_key_column.in_(primary_keys)
+                    )
+                )
+            }
+
+    queried = [
+        subscription
+        for subscription in subscriptions
+        if (controlled and not in_python)
+        or (
+            subscription.query is not None
+            and model.search.has_filters(subscription.query)
+        )
+    ]
+    matches = _match_subscriptions(model, db, queried, primary_keys, in_python)
+
+    audience = {}
+    for subscription in subscriptions:
+        keys = primary_keys
+        if subscription in matches:
+            keys = [k for k in primary_keys if k in matches[subscription]]
+        if in_python:
+            keys = [
+                k
+                for k in keys
+                if k in access and can_access(subscription.user, *access[k])
+            ]
+        audience[subscription] = keys
+    return audience
+
+
+# the number of subscriptions checked per `UNION ALL` query
+MATCH_BATCH_SIZE = 100
+
+
+def _match_subscriptions(
+    model, db, subscriptions: list[Subscription], primary_keys: list, in_python: bool
+) -> dict[Subscription, set]:
+    # the primary keys matching the search filters (and custom access control) of each subscription,
+    # found with a `UNION ALL` of the subscriptions' queries
+    primary_key_column = getattr(model, model.primary_key)
+    matches: dict[Subscription, set] = {s: set() for s in subscriptions}
+    for offset in range(0, len(subscriptions), MATCH_BATCH_SIZE):
+        batch = subscriptions[offset : offset + MATCH_BATCH_SIZE]
+        statements = []
+        for i, subscription in enumerate(batch):
+            Q = db.query(model)
+            if subscription.query is not None:
+                Q = model.search.filter_query(
+                    model, Q, subscription.query, subscription.user
+                )
+            if not in_python and hasattr(model, "access_control"):
+                Q = model.access_control(Q, subscription.user)
+            statements.append(
+                Q.order_by(None)
+                .filter(primary_key_column.in_(primary_keys))
+                .with_entities(literal(i), primary_key_column)
+                .statement
+            )
+        for i, primary_key in db.execute(union_all(*statements)):
+            matches[batch[i]].add(primary_key)
+    return matches
+
+
+def delete_audience(
+    model, db, primary_keys: list
+) -> Optional[dict[Subscription, list]]:
+    """
+    The primary keys that each subscriber can see, found in the deleting transaction before the resources are deleted.
+    """
+    if not subscribed(model):
+        return None
+    return find_audience(model, db, primary_keys)
+
+
+class SubscribeFactory(RESTFactory):
+
+    METHOD = "GET"
+    CFG_NAME = "subscribe_cfg"
+    ROUTE = "/subscribe"
+
+    def __init__(self, model):
+        self.controller = self.controller_factory(model)
+
+    def attach_route(self, model) -> None:
+
+        cfg = model.subscribe_cfg
+
+        model.router.add_api_route(
+            self.ROUTE,
+            self.controller,
+            description=cfg.description,
+            dependencies=[Depends(d) for d in cfg.dependencies],
+            summary=cfg.summary or "subscribe " + model.__name__.lower(),
+            tags=cfg.tags or [model.__name__],
+            operation_id=cfg.operation_id,
+            methods=[self.METHOD],
+            response_class=StreamingResponse,
+        )
+
+    def controller_factory(self, model, **kwargs) -> Callable:
+
+        parameters = [
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        if getattr(model, "search_cfg", None) is not None:
+            parameters.insert(
+                0,
+                Parameter(
+                    "query",
+                    Parameter.POSITIONAL_OR_KEYWORD,
+                    default=Depends(model.search.filter_bridge()),
+                    annotation=model.search.input_model,
+                ),
+            )
+
+        async def inner(*args, **kwargs) -> StreamingResponse:
+            user = kwargs["user"]
+            query = kwargs.get("query")
+            cfg = model.subscribe_cfg
+
+            # subscribe before the response starts, so no writes are missed
+            subscription = broker.subscribe(
+                model.__tablename__, cfg.queue_size, query, user
+            )
+
+            async def events():
+                try:
+                    while not subscription.overflowed:
+                        try:
+                            op, data = await asyncio.wait_for(
+                                subscription.queue.get(), cfg.heartbeat_seconds
+                            )
+                        except asyncio.TimeoutError:
+                            yield ": heartbeat\n\n"
+                            continue
+
+                        # events are rendered once by the writer, see `publish`
+                        yield f"event: {op}\ndata: {data}\n\n"
+
+                    yield "event: overflow\ndata: {}\n\n"
+                finally:
+                    broker.unsubscribe(subscription)
+
+            return StreamingResponse(
+                events(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        @wraps(inner)
+        async def f(*args, **kwargs):
+            return await inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig  # type: ignore
+
+        return f
@@ -0,0 +1,248 @@
+"""
+An in-process trigram index for similarity search, see `SearchConfig.search_similarity_index`.
+
+Each value of the indexed columns is split into trigrams, in the same way as postgresql's `pg_trgm`:
+the value is lower-cased and split into words, and each word is padded with two spaces before and one after.
+For each column, the index maps each trigram to the resources whose value contains it (an inverted index).
+
+The similarity of a search value and a resource value is the number of trigrams they share,
+divided by the number of distinct trigrams in either (i.e. the same measure as `pg_trgm`'s `similarity`),
+and ranges from `0` (nothing in common) to `1` (identical trigrams).
+Only the resources sharing at least one trigram with the search value are scored,
+by counting the shared trigrams with vectorised numpy operations over the inverted index.
+The primary keys of the most similar resources are then used to filter the search query,
+so neither the database nor a database extension compares the search value with every row.
+
+The index is built from the database on the first search, and is kept up to date by QuickRest's create, patch, upsert and delete routes.
+
+!!! note
+    The index is held in the memory of each worker process, so it only sees the writes made through the same worker.
+    Rows written by other processes are picked up when the index is rebuilt with `TrigramIndex.rebuild`.
+    The trigram index requires numpy, e.g. `pip install fastapi-quickrest[trigram]`.
+
+On postgresql, `SearchConfig.search_similarity_ranked` uses `pg_trgm`'s own index instead:
+a GiST trigram index is created on each `search_similarity` column (with the resource table, or when the resource is mounted),
+which serves both the `%` similarity filter and the `<->` distance ordering.
+"""
+
+import re
+import threading
+from typing import Any, Optional
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.engine import Connection
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def trigrams(value: Optional[str]) -> set[str]:
+    """The set of trigrams of a string, as in `pg_trgm`."""
+    if not value:
+        return set()
+    result: set[str] = set()
+    for word in WORD_RE.findall(value.lower()):
+        padded = f"  {word} "
+        result.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class TrigramIndex:
+    """
+    An in-process trigram index over string columns of a resource.
+
+    Args:
+        model (Resource): The resource class.
+        columns (list[str]): The string columns to index.
+        max_candidates (int): The maximum number of (most similar) resources scored by a ranked search,
+            the other matching resources are returned after them, unordered. Lookups (and so similarity filters) aren't capped.
+    """
+
+    # the number of lookups cached between writes
+    CACHE_SIZE = 128
+
+    def __init__(self, model, columns: list[str], max_candidates: int = 1000):
+        if np is None:
+            raise ImportError(
+                "The trigram similarity index requires numpy, e.g. `pip install fastapi-quickrest[trigram]`"
+            )
+        self.model = model
+        self.columns = columns
+        self.max_candidates = max_candidates
+        self._lock = threading.Lock()
+        self._built = False
+        self._cache: dict[tuple[str, str, float], dict[Any, float]] = {}
+
+    def _reset(self) -> None:
+        # slots are assigned to resources in order, and re-assigned on update
+        self._keys: list[Any] = []
+        self._slots: dict[Any, int] = {}
+        self._postings: dict[str, dict[str, Any]] = {c: {} for c in self.columns}
+        self._sizes: dict[str, Any] = {
+            c: np.zeros(0, dtype=np.int64) for c in self.columns
+        }
+        self._dead = 0
+        self._cache = {}
+
+    def _rows(self, primary_keys: Optional[list] = None) -> list:
+        model = self.model
+        primary_key_column = getattr(model, model.primary_key)
+        stmt = select(
+            primary_key_column, *[getattr(model, c) for c in self.columns]
+        ).order_by(primary_key_column)
+        if primary_keys is not None:
+            stmt = stmt.where(primary_key_column.in_(primary_keys))
+        with model._sessionmaker() as db:
+            return db.execute(stmt).all()
+
+    def _add(self, rows) -> None:
+        # collect the new slots of each trigram, then append them to the postings arrays at once
+        added: dict[str, dict[str, list[int]]] = {c: {} for c in self.columns}
+        sizes: dict[str, list[int]] = {c: [] for c in self.columns}
+        for primary_key, *values in rows:
+            slot = len(self._keys)
+            self._keys.append(primary_key)
+            self._slots[primary_key] = slot
+            for column, value in zip(self.columns, values):
+                grams = trigrams(value)
+                sizes[column].append(len(grams))
+                for gram in grams:
+                    added[column].setdefault(gram, []).append(slot)
+
+        for column, column_added in added.items():
+            self._sizes[column] = np.concatenate(
+                [self._sizes[column], np.asarray(sizes[column], dtype=np.int64)]
+            )
+            postings = self._postings[column]
+            for gram, slots in column_added.items():
+                new = np.asarray(slots, dtype=np.int64)
+                postings[gram] = (
+                    np.concatenate([postings[gram], new]) if gram in postings else new
+                )
+
+    def _remove(self, primary_key) -> None:
+        slot = self._slots.pop(primary_key, None)
+        if slot is not None:
+            # the slot's postings are skipped until the next rebuild
+            self._keys[slot] = None
+            self._dead += 1
+
+    def rebuild(self) -> None:
+        """(Re)build the index from the database."""
+        rows = self._rows()
+        with self._lock:
+            self._reset()
+            self._add(rows)
+            self._built = True
+
+    def update(self, op: str, primary_keys: list) -> None:
+        """Update the index with committed writes, see `ResourceMixin._on_write`."""
+        if not self._built or not primary_keys:
+            return
+
+        rows = [] if op == "delete" else self._rows(primary_keys)
+
+        with self._lock:
+            for primary_key in primary_keys:
+                self._remove(primary_key)
+            self._add(rows)
+            compact = self._dead > len(self._slots)
+            self._cache = {}
+
+        if compact:
+            self.rebuild()
+
+    def lookup(self, column: str, value: str, threshold: float) -> dict[Any, float]:
+        """
+        The primary keys of the resources whose `column` is at least `threshold` similar to `value`,
+        mapped to their similarity, most similar first.
+        """
+        if not self._built:
+            self.rebuild()
+
+        grams = trigrams(value)
+        if not grams:
+            return {}
+
+        key = (column, value, threshold)
+        with self._lock:
+            # a search filters and ranks with the same lookup
+            if key not in self._cache:
+                if len(self._cache) >= self.CACHE_SIZE:
+                    self._cache = {}
+                self._cache[key] = self._lookup(column, grams, threshold)
+            return self._cache[key]
+
+    def _lookup(
+        self, column: str, grams: set[str], threshold: float
+    ) -> dict[Any, float]:
+        postings = self._postings[column]
+        matched = [postings[g] for g in grams if g in postings]
+        if not matched:
+            return {}
+
+        # count the trigrams each resource shares with the value,
+        # only visiting the resources with at least one trigram in common
+        slots, shared = np.unique(np.concatenate(matched), return_counts=True)
+        sizes = self._sizes[column][slots]
+
+        similarity = shared / (sizes + len(grams) - shared)
+        keep = similarity >= threshold
+        slots, similarity = slots[keep], similarity[keep]
+
+        # most similar first
+        order = np.argsort(-similarity, kind="stable")
+        scores: dict[Any, float] = {}
+        for slot, score in zip(slots[order].tolist(), similarity[order].tolist()):
+            key = self._keys[slot]
+            if key is not None:
+                scores[key] = score
+        return scores
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def create_pg_trgm_index(
+    connection: Connection, table_name: str, columns: list[str]
+) -> None:
+    """
+    Create GiST trigram indexes on string columns of a postgresql table, if they don't already exist.
+    The `pg_trgm` extension must be enabled.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    for column in columns:
+        connection.execute(
+            text(
+                f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{column}_trgm" '
+                f"ON {_quote(table_name)} USING GIST ({_quote(column)} gist_trgm_ops)"
+            )
+        )
+
+
+def register_pg_trgm_index(model, columns: list[str]) -> None:
+    """
+    Create the trigram indexes of a resource with its table, and now, if the table already exists.
+    """
+
+    table = model.__table__
+
+    if not event.contains(table, "after_create", _after_create):
+        event.listen(table, "after_create", _after_create)
+    table.info["quickrest_pg_trgm"] = columns
+
+    engine = model._sessionmaker.kw.get("bind")
+    if engine is not None and engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            if inspect(connection).has_table(table.name):
+                create_pg_trgm_index(connection, table.name, columns)
+
+
+def _after_create(table, connection, **kwargs) -> None:
+    create_pg_trgm_index(connection, table.name, table.info["quickrest_pg_trgm"])
@@ -0,0 +1,389 @@
+from abc import ABC
+from functools import wraps
+from inspect import Parameter, signature
+from typing import Any, Callable, Optional
+
+from fastapi import Depends, HTTPException
+from pydantic import BaseModel, create_model
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import NoResultFound
+
+from quickrest.mixins.base import BaseMixin, RESTFactory
+from quickrest.mixins.utils import classproperty
+from quickrest.mixins.versioned import managed_columns, version_bump
+
+
+class UpsertConfig(ABC):
+    """
+    The `UpsertConfig` class can optionally be defined on the resource class.
+    This class should inherit from `UpsertConfig` and must be called `upsert_cfg`.
+    Unlike the other route configurations, the upsert routes are opt-in:
+    `upsert_cfg` is `None` by default, and the upsert routes are only created if `upsert_cfg` is defined.
+
+    ## Example:
+
+    ```python
+    from sqlalchemy.orm import Mapped, mapped_column
+
+    from quickrest import Base, Resource, UpsertConfig
+
+    from some_package.auth import authenticate_user
+
+
+    class Employee(Base, Resource):
+        __tablename__ = "employees"
+
+        name: Mapped[str] = mapped_column()
+        job_title: Mapped[str] = mapped_column()
+
+        class upsert_cfg(UpsertConfig):
+            description = "create or replace an employee"
+            summary = "upsert an employee"
+            operation_id = "upsert_employee"
+            tags = ["employees"]
+            dependencies = [authenticate_user]
+
+            bulk = True
+    ```
+
+    Attributes:
+        description (str, optional): Description of the endpoint. Optional, defaults to `None`.
+        summary (str, optional): Summary of the endpoint. Optional, defaults to `put {resource_name}`.
+        operation_id (str, optional): Operation ID of the endpoint. Optional, defaults to `None`.
+        tags (list[str], optional): Tags for the endpoint. Optional, defaults to `None`.
+        dependencies (list[Callable]): Injectable callable dependencies for the endpoint. Optional, defaults to `[]`.
+        bulk (bool): Add the bulk upsert route, `PUT /{resource_name}`. Optional, defaults to `True`.
+
+    """
+
+    # router method
+    description: Optional[str] = None
+    summary: Optional[str] = None
+    operation_id: Optional[str] = None
+    tags: Optional[list[str]] = None
+    dependencies: list[Callable] = []
+
+    # upsert method
+    bulk: bool = True
+
+
+class UpsertMixin(BaseMixin):
+    """
+    This mixin is automatically inherited by the `Resource` class and provides endpoints for creating-or-replacing resources.
+    The upsert routes are only created if the resource defines an `upsert_cfg`, see `UpsertConfig`.
+
+    An upsert is a single `INSERT ... ON CONFLICT (primary_key) DO UPDATE` statement,
+    so clients syncing records from another system don't need to read a resource before deciding whether to create or patch it.
+    The request body is the resource [CreateModel](create.md#quickrest.mixins.create.CreateMixin)
+    (with an optional primary key on the `PUT /{resource_name}/{primary_key}` route), and all the resource's columns (other than its id) are replaced by the request body when the resource already exists.
+    Relationship fields are only replaced if they're included in the request body.
+
+    Upserts are supported on sqlite and postgresql.
+    If the resource has fine-grained access control, the update branch only applies to rows the user can access;
+    upserting onto an existing resource the user can't access returns a `404`.
+
+    ## Endpoint - Upsert Resource
+
+        PUT /{resource_name}/{primary_key}
+
+    The primary key is the `id` of the resource, unless the resource has a `slug` primary key, in which case the primary key is the `slug`.
+    The primary key in the route takes precedence over any primary key in the request body.
+
+    | Property | Description |
+    | :--- | :---- |
+    | Method | `PUT` |
+    | Route | `/{resource_name}/{primary_key}` |
+    | Request  | Path: `{primary_key}` </br> Query: `<none>` </br> Body: Resource CreateModel |
+    | Success Response | 200 OK: Resource [BaseModel](resource.md#quickrest.mixins.resource.ResourceMixin._build_basemodel) |
+
+    ## Endpoint - Bulk Upsert Resources
+
+        PUT /{resource_name}
+
+    The body is a list of UpsertModels, i.e. CreateModels with a required primary key.
+    Bulk upserts are atomic: if any resource can't be written, none of them are.
+
+    | Property | Description |
+    | :--- | :---- |
+    | Method | `PUT` |
+    | Route | `/{resource_name}` |
+    | Request  | Path: `<none>` </br> Query: `<none>` </br> Body: list of Resource UpsertModels |
+    | Success Response | 200 OK: list of Resource [BaseModels](resource.md#quickrest.mixins.resource.ResourceMixin._build_basemodel) |
+
+    """
+
+    _upsert = None
+
+    upsert_cfg: Optional[type[UpsertConfig]] = None
+
+    @classproperty
+    def upsert(cls):
+        if cls._upsert is None:
+            cls._upsert = UpsertFactory(cls)
+        return cls._upsert
+
+
+class UpsertFactory(RESTFactory):
+
+    METHOD = "PUT"
+    CFG_NAME = "upsert_cfg"
+
+    def __init__(self, model):
+        self.input_model = self._generate_input_model(model)
+        self.bulk_input_model = self._generate_bulk_input_model(model)
+        self.controller = self.controller_factory(model)
+        self.bulk_controller = self.bulk_controller_factory(model)
+        self.ROUTE = f"/{{{model.primary_key}}}"
+
+    @staticmethod
+    def _primary_key_type(model) -> type:
+        return str if model.primary_key == "slug" else model._id_type
+
+    def _generate_input_model(self, model) -> BaseModel:
+        # the primary key is taken from the route
+        fields: Any = {
+            model.primary_key: (Optional[self._primary_key_type(model)], None)
+        }
+        return create_model(
+            "Put" + model.__name__, __base__=model.create.input_model, **fields
+        )
+
+    def _generate_bulk_input_model(self, model) -> BaseModel:
+        fields: Any = {model.primary_key: (self._primary_key_type(model), ...)}
+        return create_model(
+            "Upsert" + model.__name__, __base__=model.create.input_model, **fields
+        )
+
+    @staticmethod
+    def _upsert_statement(db, model, user):
+        """Build the `INSERT ... ON CONFLICT DO UPDATE` statement, with access control on the update branch."""
+
+        dialect_name = db.get_bind().dialect.name
+        if dialect_name == "postgresql":
+            stmt = postgresql.insert(model.__table__)
+        elif dialect_name == "sqlite":
+            stmt = sqlite.insert(model.__table__)
+        else:
+            raise ValueError(f"Upserts are not supported for {dialect_name}")
+
+        where = None
+        if hasattr(model, "access_control"):
+            where = model.access_control(db.query(model), user).whereclause
+
+        set_ = {
+            c.name: stmt.excluded[c.name]
+            for c in model.__table__.columns
+            if c.name not in ["id", model.primary_key, *managed_columns(model)]
+        }
+        set_.update(version_bump(model))
+
+        return stmt.on_conflict_do_update(
+            index_elements=[model.primary_key], set_=set_, where=where
+        ).returning(model.__table__.c[model.primary_key])
+
+    @staticmethod
+    def _values(model, body) -> dict:
+        return {
+            c.name: getattr(body, c.name)
+            for c in model.__table__.columns
+            if c.name in type(body).model_fields
+        }
+
+    @staticmethod
+    async def _set_relationships(db, model, obj, body, user) -> None:
+        for r in model.__mapper__.relationships:
+
+            related_ids = getattr(body, r.key)
+
+            if related_ids is not None:
+
+                if isinstance(related_ids, list):
+                    related_objs = [
+                        await r.mapper.class_.read.controller(
+                            **{
+                                "db": db,
+                                r.mapper.class_.primary_key: primary_key,
+                                "return_db_object": True,
+                                "user": user,
+                            }
+                        )
+                        for primary_key in related_ids
+                    ]
+                else:
+                    related_objs = await r.mapper.class_.read.controller(
+                        **{
+                            "db": db,
+                            r.mapper.class_.primary_key: related_ids,
+                            "return_db_object": True,
+                            "user": user,
+                        }
+                    )
+
+                setattr(obj, r.key, related_objs)
+
+    async def _upsert(self, db, model, bodies, user) -> list:
+        rows = [self._values(model, body) for body in bodies]
+
+        primary_keys = (
+            db.execute(self._upsert_statement(db, model, user), rows).scalars().all()
+        )
+
+        # rows blocked by access control on the update branch aren't returned
+        if len(primary_keys) < len(rows):
+            raise NoResultFound
+
+        objs = []
+        for body in bodies:
+            obj = (
+                db.query(model)
+                .filter(
+                    getattr(model, model.primary_key)
+                    == getattr(body, model.primary_key)
+                )
+                .one()
+            )
+            await self._set_relationships(db, model, obj, body, user)
+            objs.append(obj)
+
+        model._on_write("upsert", list(primary_keys), db)
+        db.commit()
+
+        return [
+            model.basemodel.model_validate(obj, from_attributes=True) for obj in objs
+        ]
+
+    def controller_factory(self, model, **kwargs) -> Callable:
+
+        parameters = [
+            Parameter(
+                model.primary_key,
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=...,
+                annotation=self._primary_key_type(model),
+            ),
+            Parameter(
+                self.input_model.__name__.lower(),
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=...,
+                annotation=self.input_model,
+            ),
+            Parameter(
+                "db",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model.db_generator),
+                annotation=Session,
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        async def inner(*args, **kwargs) -> model:
+
+            try:
+                db = kwargs["db"]
+                user = kwargs["user"]
+
+                # the primary key in the route takes precedence over the body
+                body = self.bulk_input_model.model_validate(
+                    {
+                        **kwargs[self.input_model.__name__.lower()].model_dump(),
+                        model.primary_key: kwargs[model.primary_key],
+                    }
+                )
+
+                objs = await self._upsert(db, model, [body], user)
+
+                return objs[0]
+            except Exception as e:
+                raise model._error_handler(e)
+
+        @wraps(inner)
+        async def f(*args, **kwargs):
+            return await inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig  # type: ignore
+
+        return f
+
+    def bulk_controller_factory(self, model) -> Callable:
+
+        parameters = [
+            Parameter(
+                "upserts",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=...,
+                annotation=list[self.bulk_input_model],  # type: ignore
+            ),
+            Parameter(
+                "db",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model.db_generator),
+                annotation=Session,
+            ),
+            Parameter(
+                "user",
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Depends(model._user_generator),
+                annotation=model._user_generator.__annotations__["return"],
+            ),
+        ]
+
+        async def inner(*args, **kwargs) -> list[model]:
+
+            try:
+                db = kwargs["db"]
+                user = kwargs["user"]
+                bodies = kwargs["upserts"]
+
+                if not bodies:
+                    return []
+
+                # a single statement can't update the same row twice
+                primary_keys = [getattr(body, model.primary_key) for body in bodies]
+                if len(set(primary_keys)) < len(primary_keys):
+                    raise HTTPException(
+                        status_code=422,
+                        detail="Duplicate primary keys in bulk upsert",
+                    )
+
+                return await self._upsert(db, model, bodies, user)
+            except Exception as e:
+                raise model._error_handler(e)
+
+        @wraps(inner)
+        async def f(*args, **kwargs):
+            return await inner(*args, **kwargs)
+
+        # Override signature
+        sig = signature(inner)
+        sig = sig.replace(parameters=parameters)
+        f.__signature__ = sig  # type: ignore
+
+        return f
+
+    def attach_route(self, model) -> None:
+
+        cfg = model.upsert_cfg
+
+        if cfg.bulk:
+            model.router.add_api_route(
+                "",
+                self.bulk_controller,
+                description=cfg.description,
+                dependencies=[Depends(d) for d in cfg.dependencies],
+                summary="bulk " + (cfg.summary or "put " + model.__name__.lower()),
+                tags=cfg.tags or [model.__name__],
+                operation_id=(f"bulk_{cfg.operation_id}" if cfg.operation_id else None),
+                methods=[self.METHOD],
+                response_model=list[model.basemodel],  # type: ignore
+            )
+
+        super().attach_route(model)
@@ -1,3 +1,11 @@
+import os
+import threading
+import time
+from uuid import UUID
+
+from sqlalchemy import Connection
+
+
 class ClassPropertyDescriptor:
 
     def __init__(self, fget, fset=None):
@@ -27,3 +35,63 @@ def classproperty(func):
         func = classmethod(func)
 
     return ClassPropertyDescriptor(func)
+
+
+def in_caller_transaction(db) -> bool:
+    """Whether the session `db` writes in a transaction that its caller commits, e.g. a batch."""
+    return db is not None and (isinstance(db.bind, Connection) or db.in_transaction())
+
+
+class UUID7:
+    """
+    A marker for time-ordered UUIDv7 primary keys, i.e. `build_resource(id_type=UUID7)`.
+    Resources built with `UUID7` have `uuid.UUID` ids, generated by `uuid7`.
+    """
+
+
+_uuid7_lock = threading.Lock()
+_uuid7_last = (0, 0)
+
+
+def uuid7() -> UUID:
+    """
+    Generate a time-ordered UUIDv7 (RFC 9562).
+
+    The first 48 bits are the unix timestamp in milliseconds, followed by a 12-bit counter and 62 random bits.
+    The counter is seeded randomly each millisecond and incremented for ids generated in the same millisecond,
+    so ids generated by a process are strictly increasing.
+
+    Returns:
+        UUID: A version 7 UUID.
+    """
+
+    global _uuid7_last
+
+    with _uuid7_lock:
+        timestamp_ms = time.time_ns() // 1_000_000
+        last_ms, last_counter = _uuid7_last
+
+        if timestamp_ms > last_ms:
+            # leave headroom in the counter for ids in the same millisecond
+            counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            timestamp_ms = last_ms
+            counter = last_counter + 1
+            if counter > 0xFFF:
+                # counter overflow, borrow the next millisecond
+                timestamp_ms += 1
+                counter = 0
+
+        _uuid7_last = (timestamp_ms, counter)
+
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+
+    value = (
+        (timestamp_ms & ((1 << 48) - 1)) << 80
+        | 0x7 << 76
+        | counter << 64
+        | 0b10 << 62
+        | rand_b
+    )
+
+    return UUID(int=value)
@@ -0,0 +1,388 @@
+"""
+An in-process vector index for "more like this" search, see `SearchConfig.search_vector`.
+
+The vectors of a `Vector` column (e.g. sentence embeddings) are normalised and loaded into a contiguous float32 matrix,
+so that the cosine similarity of a resource with every other resource is a single matrix-vector product.
+For large tables, the matrix can be memory-mapped from a sidecar `.npy` file (`search_vector_path`),
+so that it is held in the page cache rather than the heap of the worker.
+The primary key of each row of the matrix is logged to a second sidecar file (`search_vector_path` + `.keys`),
+so that a restarted worker loads the index from its sidecar files rather than rebuilding it from the database,
+as long as the primary keys of the resources with a vector are unchanged.
+
+Larger collections can also use an IVF (inverted file) coarse index (`search_vector_lists`):
+the vectors are clustered into lists with spherical k-means, and a query only scores the vectors in the
+`search_vector_probes` lists whose centroids are most similar to it.
+This is approximate: the most similar vectors may be in lists that aren't probed.
+
+The primary keys of the most similar resources are used to filter and order the search query,
+so vector search can be combined with the other search filters.
+
+The index is built from the database on the first search, and is kept up to date by QuickRest's create, patch, upsert and delete routes.
+
+!!! note
+    As with the [trigram index](#quickrest.mixins.trigram), the index is held by each worker process, and only sees the writes made through that worker.
+    Rows written by other processes are picked up when the index is rebuilt with `VectorIndex.rebuild`.
+    The sidecar files are written by the worker holding the index, so each worker needs its own `search_vector_path`.
+    The vector index requires numpy, e.g. `pip install fastapi-quickrest[vector]`.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Optional
+
+from sqlalchemy import JSON, Float, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore
+
+
+class Vector(TypeDecorator):
+    """
+    A column type for float vectors, e.g. `embedding: Mapped[Optional[list[float]]] = mapped_column(Vector)`.
+    Vectors are stored as a `REAL[]` array on postgresql, and as a JSON array on other databases.
+    """
+
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(ARRAY(Float))
+        # missing vectors are stored as SQL NULL, rather than a JSON null
+        return dialect.type_descriptor(JSON(none_as_null=True))
+
+    @property
+    def python_type(self):
+        return list[float]
+
+
+class VectorIndex:
+    """
+    An in-process cosine similarity index over a vector column of a resource.
+
+    Args:
+        model (Resource): The resource class.
+        column (str): The vector column to index.
+        path (str, optional): A sidecar `.npy` file to memory-map the matrix from (and load it from on start). Defaults to `None`, i.e. in memory.
+        lists (int, optional): The number of lists of the IVF coarse index. Defaults to `None`, i.e. exhaustive search.
+        probes (int): The number of lists searched by a query. Defaults to `8`.
+        max_candidates (int): The maximum number of (most similar) primary keys returned by a query.
+    """
+
+    # the number of queries cached between writes
+    CACHE_SIZE = 128
+
+    # k-means iterations, training rows per list, and rows assigned per batch
+    TRAIN_ITERATIONS = 10
+    TRAIN_ROWS_PER_LIST = 64
+    BATCH_ROWS = 65536
+
+    def __init__(
+        self,
+        model,
+        column: str,
+        path: Optional[str] = None,
+        lists: Optional[int] = None,
+        probes: int = 8,
+        max_candidates: int = 1000,
+    ):
+        if np is None:
+            raise ImportError(
+                "The vector similarity index requires numpy, e.g. `pip install fastapi-quickrest[vector]`"
+            )
+        if column not in model.__table__.columns:
+            raise ValueError(f"{model.__name__} has no vector column {column}")
+        self.model = model
+        self.column = column
+        self.path = path
+        self.lists = lists
+        self.probes = probes
+        self.max_candidates = max_candidates
+        self._lock = threading.Lock()
+        self._built = False
+
+    def _reset(self) -> None:
+        # slots are assigned to resources in order, and re-assigned on update
+        self._keys: list[Any] = []
+        self._slots: dict[Any, int] = {}
+        self._dead = 0
+        self._cache: dict[Any, dict[Any, float]] = {}
+        self.dim: Optional[int] = None
+        self._matrix: Any = None
+        self._centroids: Any = None
+        self._assignments: Any = None
+
+    def _allocate(self, capacity: int, dim: int) -> Any:
+        # a new matrix, with the rows of the current one
+        if self.path is None:
+            matrix = np.zeros((capacity, dim), dtype=np.float32)
+            if self._matrix is not None:
+                matrix[: len(self._matrix)] = self._matrix
+            return matrix
+
+        # write the new matrix beside the old one, as the old one may still be mapped
+        partial = self.path + ".partial.npy"
+        matrix = np.lib.format.open_memmap(
+            partial, mode="w+", dtype=np.float32, shape=(capacity, dim)
+        )
+        if self._matrix is not None:
+            matrix[: len(self._matrix)] = self._matrix
+            matrix.flush()
+        os.replace(partial, self.path)
+        return matrix
+
+    def _grow(self, size: int) -> None:
+        capacity = max(size, 2 * len(self._matrix))
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[: len(self._assignments)] = self._assignments
+        self._matrix = self._allocate(capacity, self._matrix.shape[1])
+        self._assignments = assignments
+
+    def _rows(self, primary_keys: Optional[list] = None) -> list:
+        model = self.model
+        primary_key_column = getattr(model, model.primary_key)
+        stmt = select(primary_key_column, getattr(model, self.column)).order_by(
+            primary_key_column
+        )
+        if primary_keys is not None:
+            stmt = stmt.where(primary_key_column.in_(primary_keys))
+        with model._sessionmaker() as db:
+            return db.execute(stmt).all()
+
+    def _keys_path(self) -> str:
+        return str(self.path) + ".keys"
+
+    def _log(self, slots: list[tuple[int, Any]], truncate: bool = False) -> None:
+        # each line of the keys sidecar assigns a slot to a primary key, or frees it (`null`)
+        if self.path is None or not (slots or truncate):
+            return
+        with open(self._keys_path(), "w" if truncate else "a") as f:
+            f.writelines(
+                json.dumps([slot, None if key is None else str(key)]) + "\n"
+                for slot, key in slots
+            )
+
+    def _primary_keys(self) -> list:
+        # the primary keys of the resources with a vector
+        model = self.model
+        stmt = select(getattr(model, model.primary_key)).where(
+            getattr(model, self.column).is_not(None)
+        )
+        with model._sessionmaker() as db:
+            return list(db.execute(stmt).scalars())
+
+    def _add(self, rows) -> None:
+        rows = [
+            (primary_key, vector) for primary_key, vector in rows if vector is not None
+        ]
+        if not rows:
+            return
+
+        size = len(self._keys) + len(rows)
+        if self._matrix is None:
+            self.dim = len(rows[0][1])
+            self._matrix = self._allocate(size, self.dim)
+            self._assignments = np.zeros(size, dtype=np.int32)
+        elif size > len(self._matrix):
+            self._grow(size)
+
+        for start in range(0, len(rows), self.BATCH_ROWS):
+            batch = rows[start : start + self.BATCH_ROWS]
+            vectors: Any
+            try:
+                vectors = np.asarray([v for _, v in batch], dtype=np.float32)
+            except ValueError:
+                vectors = None
+            if vectors is None or vectors.shape != (len(batch), self.dim):
+                raise ValueError(
+                    f"{self.model.__name__}.{self.column} vectors must have {self.dim} dimensions"
+                )
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms > 0, norms, 1)
+
+            slot = len(self._keys)
+            self._matrix[slot : slot + len(batch)] = vectors
+            if self._centroids is not None:
+                self._assignments[slot : slot + len(batch)] = np.argmax(
+                    vectors @ self._centroids.T, axis=1
+                )
+            for i, (primary_key, _) in enumerate(batch):
+                self._keys.append(primary_key)
+                self._slots[primary_key] = slot + i
+
+    def _remove(self, primary_key) -> Optional[int]:
+        slot = self._slots.pop(primary_key, None)
+        if slot is not None:
+            # the slot scores 0, and is skipped until the next rebuild
+            self._matrix[slot] = 0
+            self._keys[slot] = None
+            self._dead += 1
+        return slot
+
+    def _train(self) -> None:
+        """Cluster the vectors into `lists` lists with spherical k-means."""
+
+        n = len(self._keys)
+        if not self.lists or n < self.lists:
+            return
+
+        rng = np.random.default_rng(0)
+        sample_size = min(n, self.lists * self.TRAIN_ROWS_PER_LIST)
+        sample = self._matrix[np.sort(rng.choice(n, sample_size, replace=False))]
+        centroids = sample[rng.choice(sample_size, self.lists, replace=False)].copy()
+
+        for _ in range(self.TRAIN_ITERATIONS):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # empty lists keep their centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        for start in range(0, n, self.BATCH_ROWS):
+            batch = self._matrix[start : start + self.BATCH_ROWS]
+            self._assignments[start : start + len(batch)] = np.argmax(
+                batch @ centroids.T, axis=1
+            )
+        self._centroids = centroids
+
+    def rebuild(self) -> None:
+        """(Re)build the index from the database."""
+        rows = self._rows()
+        with self._lock:
+            if self.path is not None and os.path.exists(self._keys_path()):
+                # the old keys don't match the new matrix
+                os.remove(self._keys_path())
+            self._reset()
+            self._add(rows)
+            self._train()
+            self._log(list(enumerate(self._keys)), truncate=True)
+            self._built = True
+
+    def load(self) -> bool:
+        """
+        Load the index from its sidecar files, if they exist and the resources with a vector are unchanged.
+        Returns whether the index was loaded.
+        """
+        if self.path is None or not (
+            os.path.exists(self.path) and os.path.exists(self._keys_path())
+        ):
+            return False
+
+        logged: dict[int, Optional[str]] = {}
+        with open(self._keys_path()) as f:
+            for line in f:
+                try:
+                    slot, key = json.loads(line)
+                except ValueError:
+                    # e.g. a line cut short by a crash
+                    return False
+                logged[slot] = key
+        matrix = np.load(self.path, mmap_mode="r+")
+        if not logged or matrix.ndim != 2 or max(logged) >= len(matrix):
+            return False
+
+        live = {slot: key for slot, key in logged.items() if key is not None}
+        primary_keys = {str(key): key for key in self._primary_keys()}
+        if len(live) != len(primary_keys) or not set(live.values()) <= set(
+            primary_keys
+        ):
+            return False
+
+        with self._lock:
+            self._reset()
+            self.dim = matrix.shape[1]
+            self._matrix = matrix
+            self._assignments = np.zeros(len(matrix), dtype=np.int32)
+            self._keys = [None] * (max(logged) + 1)
+            for slot, key in live.items():
+                self._keys[slot] = primary_keys[key]  # type: ignore
+                self._slots[primary_keys[key]] = slot  # type: ignore
+            self._dead = len(self._keys) - len(live)
+            self._train()
+            self._built = True
+        return True
+
+    def update(self, op: str, primary_keys: list) -> None:
+        """Update the index with committed writes, see `ResourceMixin._on_write`."""
+        if not primary_keys:
+            return
+        if not self._built:
+            # the sidecar files no longer match the database, e.g. if a vector was patched
+            if self.path is not None and os.path.exists(self._keys_path()):
+                os.remove(self._keys_path())
+            return
+
+        rows = [] if op == "delete" else self._rows(primary_keys)
+
+        with self._lock:
+            removed = [self._remove(primary_key) for primary_key in primary_keys]
+            self._add(rows)
+            self._log(
+                [(slot, None) for slot in removed if slot is not None]
+                + [
+                    (self._slots[primary_key], primary_key)
+                    for primary_key in primary_keys
+                    if primary_key in self._slots
+                ]
+            )
+            compact = self._dead > len(self._slots)
+            self._cache = {}
+
+        if compact:
+            self.rebuild()
+
+    def similar(self, primary_key) -> dict[Any, float]:
+        """
+        The primary keys of the resources most similar to the resource `primary_key` (excluding itself),
+        mapped to their cosine similarity, most similar first.
+        The result is empty if the resource has no vector.
+        """
+        if not self._built and not self.load():
+            self.rebuild()
+
+        with self._lock:
+            # a search filters and ranks with the same query
+            if primary_key not in self._cache:
+                if len(self._cache) >= self.CACHE_SIZE:
+                    self._cache = {}
+                self._cache[primary_key] = self._similar(primary_key)
+            return self._cache[primary_key]
+
+    def _similar(self, primary_key) -> dict[Any, float]:
+        slot = self._slots.get(primary_key)
+        if slot is None:
+            return {}
+        vector = np.array(self._matrix[slot])
+
+        n = len(self._keys)
+        if self._centroids is not None:
+            # only score the vectors in the lists nearest to the query
+            probed = np.argsort(-(self._centroids @ vector))[: self.probes]
+            candidates = np.flatnonzero(np.isin(self._assignments[:n], probed))
+            similarity = self._matrix[candidates] @ vector
+        else:
+            candidates = None
+            similarity = self._matrix[:n] @ vector
+
+        # the top k, allowing for the query itself and removed slots
+        k = min(self.max_candidates + 1 + self._dead, len(similarity))
+        if k == 0:
+            return {}
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top], kind="stable")]
+        slots = candidates[top] if candidates is not None else top
+
+        scores: dict[Any, float] = {}
+        for s, score in zip(slots.tolist(), similarity[top].tolist()):
+            key = self._keys[s]
+            if key is not None and s != slot:
+                scores[key] = score
+                if len(scores) == self.max_candidates:
+                    break
+        return scores
@@ -0,0 +1,112 @@
+"""
+QuickRest supports conditional requests on resources with the `Versioned` mixin.
+
+The `Versioned` mixin adds a `version` column and an `updated_at` column to the resource.
+The version is incremented by every update (i.e. the patch, bulk patch and upsert routes), and is used as the
+SQLAlchemy `version_id_col`, so concurrent updates of the same row can't silently overwrite each other.
+Neither column can be set by clients: both are excluded from the create and patch models.
+
+## Conditional Requests
+
+Read and patch responses carry an `ETag` header computed from the version (and update time) of the resource.
+If a client sends the ETag back in an `If-None-Match` header, and the resource hasn't changed,
+the response is a `304 Not Modified` with an empty body.
+Only the version columns are queried from the database in this case: the resource is not loaded or serialized.
+
+Search responses carry an `ETag` computed from the primary keys and versions of all the resources in the page
+(and the total number of results), and also support `If-None-Match`.
+
+Patch requests can send an `If-Match` header for optimistic concurrency:
+if the resource has changed since the ETag was read, the patch is rejected with a `412 Precondition Failed`.
+
+## Example:
+
+```python
+from sqlalchemy.orm import Mapped, mapped_column
+
+from quickrest import Base, Resource, Versioned
+
+
+class Document(Base, Resource, Versioned):
+    __tablename__ = "documents"
+
+    title: Mapped[str] = mapped_column()
+```
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Mapped, declared_attr, mapped_column
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Versioned:
+    """
+    The Versioned mixin adds `version` and `updated_at` columns to a resource, and enables conditional requests.
+
+    Attributes:
+        version (int): The version of the resource, starting at 1 and incremented by every update.
+        updated_at (datetime): The (UTC) time the resource was created or last updated, indexed for the [changes](changes.md) route.
+    """
+
+    # columns maintained by quickrest, which aren't set by clients
+    _managed_columns = ["version", "updated_at"]
+
+    version: Mapped[int] = mapped_column(default=1)
+    updated_at: Mapped[datetime] = mapped_column(
+        default=_utcnow, onupdate=_utcnow, index=True
+    )
+
+    @declared_attr.directive
+    def __mapper_args__(cls) -> dict[str, Any]:
+        return {"version_id_col": cls.__table__.c.version}  # type: ignore
+
+
+def is_versioned(model) -> bool:
+    return "version" in getattr(model, "_managed_columns", [])
+
+
+def managed_columns(model) -> list[str]:
+    return getattr(model, "_managed_columns", [])
+
+
+def version_bump(model) -> dict:
+    """Column values that bump the version of rows in a set-based update."""
+    if not is_versioned(model):
+        return {}
+    return {"version": model.__table__.c.version + 1, "updated_at": _utcnow()}
+
+
+def etag(version: int, updated_at: datetime) -> str:
+    # updated_at distinguishes a re-created resource from its deleted namesake
+    return f'"{version}.{updated_at:%Y%m%d%H%M%S%f}"'
+
+
+def page_etag(total: int, rows: list[tuple]) -> str:
+    """An ETag for a page of (primary_key, version, updated_at) rows."""
+    digest = hashlib.sha1(repr((total, [tuple(r) for r in rows])).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(header: Optional[str], tag: str) -> bool:
+    """Check an `If-None-Match` or `If-Match` header against an ETag, using weak comparison."""
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [c.strip().removeprefix("W/") for c in header.split(",")]
+    return tag in candidates
+
+
+def check_if_match(header: Optional[str], tag: str) -> None:
+    """Raise a `412 Precondition Failed` if an `If-Match` header is given and doesn't match."""
+    if header is not None and not etag_matches(header, tag):
+        raise HTTPException(
+            status_code=412, detail="Resource has been modified (ETag mismatch)"
+        )
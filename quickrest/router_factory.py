@@ -1,10 +1,23 @@
-from typing import Any
+from typing import TYPE_CHECKING, Any
+
+from quickrest.batch import BatchResult, batch_controller_factory
+
+if TYPE_CHECKING:
+    from quickrest.indexes import IndexSuggestion
 
 
 class RouterFactory:
 
     @classmethod
-    def mount(cls, app, all_models: list[Any]):
+    def mount(cls, app, all_models: list[Any], batch: bool = False):
+        """
+        Build the pydantic models and routers of all the resources, and include the routers in the app.
+
+        Args:
+            app (FastAPI): The FastAPI app.
+            all_models (list[Resource]): The resource classes to mount.
+            batch (bool): Also mount the transactional batch endpoint, `POST /batch`. Defaults to `False`.
+        """
         for model in all_models:
             model.build_models()
 
@@ -40,3 +53,33 @@ class RouterFactory:
 
         for model in all_models:
             app.include_router(model.router)
+
+        if batch:
+            app.add_api_route(
+                "/batch",
+                batch_controller_factory(all_models),
+                summary="run a batch of operations in one transaction",
+                tags=["batch"],
+                operation_id="batch",
+                methods=["POST"],
+                response_model=list[BatchResult],
+            )
+
+    @classmethod
+    def suggest_indexes(
+        cls, all_models: list[Any], engine=None
+    ) -> list["IndexSuggestion"]:
+        """
+        Inspect the database for indexes missing from the filter paths of the resources, see [indexes](indexes.md).
+
+        Args:
+            all_models (list[Resource]): The mounted resource classes.
+            engine (Engine, optional): The database to inspect. Defaults to the engine of the first resource's `sessionmaker`.
+
+        Returns:
+            list[IndexSuggestion]: The missing indexes, with their `CREATE INDEX` statements.
+        """
+        # imported here, so that `python -m quickrest.indexes` runs a fresh module
+        from quickrest.indexes import suggest_indexes
+
+        return suggest_indexes(all_models, engine=engine)
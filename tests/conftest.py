@@ -1,6 +1,8 @@
 import logging
 import sys
+from datetime import date
 from os.path import abspath, dirname
+from typing import Optional
 from uuid import UUID
 
 import pytest
@@ -9,7 +11,7 @@ from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
-from sqlalchemy import ForeignKey, create_engine
+from sqlalchemy import JSON, ForeignKey, LargeBinary, Text, create_engine
 from sqlalchemy.ext.associationproxy import AssociationProxy, association_proxy
 from sqlalchemy.orm import Mapped, mapped_column, relationship, sessionmaker
 
@@ -95,7 +97,22 @@ def app(db):
 
 @pytest.fixture(autouse=True, scope="session")
 def app_types():
-    from quickrest import Base, ResourceConfig, RouterFactory, build_resource
+    from quickrest import (
+        UUID7,
+        Base,
+        ChangesConfig,
+        CreateConfig,
+        DeleteConfig,
+        PatchConfig,
+        ReadConfig,
+        ResourceConfig,
+        RouterFactory,
+        SearchConfig,
+        SubscribeConfig,
+        Vector,
+        Versioned,
+        build_resource,
+    )
 
     engine = create_engine("sqlite:///database-types.db", echo=False)
 
@@ -112,6 +129,17 @@ def app_types():
         sessionmaker=SessionMaker,
     )
 
+    ResourceIntHiLo = build_resource(
+        id_type=int,
+        id_block_size=3,
+        sessionmaker=SessionMaker,
+    )
+
+    ResourceUUID7 = build_resource(
+        id_type=UUID7,
+        sessionmaker=SessionMaker,
+    )
+
     ResourceUUIDSlug = build_resource(
         id_type=UUID,
         slug=True,
@@ -152,11 +180,125 @@ def app_types():
         name: Mapped[str] = mapped_column()
         origin: Mapped[str] = mapped_column()
 
+        class search_cfg(SearchConfig):
+            search_similarity = ["name"]
+            search_similarity_index = True
+            search_similarity_ranked = True
+
+        class create_cfg(CreateConfig):
+            ingest = True
+
+        class delete_cfg(DeleteConfig):
+            bulk = True
+
+    class Quest(Base, ResourceInt, Versioned):
+        __tablename__ = "quests"
+        name: Mapped[str] = mapped_column()
+
+        class patch_cfg(PatchConfig):
+            bulk = True
+
+        class search_cfg(SearchConfig):
+            sortable = ["name"]
+
+        class changes_cfg(ChangesConfig):
+            limit = 2
+
+        class subscribe_cfg(SubscribeConfig):
+            heartbeat_seconds = 0.1
+            queue_size = 2
+
+    class Sword(Base, ResourceIntHiLo):
+        __tablename__ = "swords"
+        name: Mapped[str] = mapped_column()
+
+    class Letter(Base, ResourceUUID7):
+        __tablename__ = "letters"
+        text: Mapped[str] = mapped_column()
+
+        class search_cfg(SearchConfig):
+            search_fulltext = True
+
     class Knight(Base, ResourceUUIDSlug):
         __tablename__ = "knights"
         name: Mapped[str] = mapped_column()
         is_round_table: Mapped[bool] = mapped_column()
 
+        class create_cfg(CreateConfig):
+            ingest = True
+            ingest_chunk_size = 2
+            ingest_max_line_bytes = 200
+            group_commit = True
+            group_commit_max_rows = 3
+
+    class Vineyard(Base, ResourceInt):
+        __tablename__ = "vineyards"
+        name: Mapped[str] = mapped_column()
+        organic: Mapped[bool] = mapped_column()
+
+    class Grape(Base, ResourceInt):
+        __tablename__ = "grapes"
+        name: Mapped[str] = mapped_column()
+
+    class Wine(Base, ResourceUUID):
+        __tablename__ = "wines"
+        name: Mapped[str] = mapped_column()
+        vintage: Mapped[date] = mapped_column()
+        sparkling: Mapped[bool] = mapped_column()
+
+        vineyard_id: Mapped[int] = mapped_column(ForeignKey("vineyards.id"))
+        vineyard: Mapped["Vineyard"] = relationship()
+        grapes: Mapped[list["Grape"]] = relationship(secondary="wine_grapes")
+
+        class resource_cfg(ResourceConfig):
+            serialize = ["vineyard", "grapes"]
+
+        class read_cfg(ReadConfig):
+            render_in_db = True
+
+        class search_cfg(SearchConfig):
+            render_in_db = True
+            sortable = ["name"]
+
+    class WineGrape(Base):
+        __tablename__ = "wine_grapes"
+        wine_id: Mapped[UUID] = mapped_column(ForeignKey("wines.id"), primary_key=True)
+        grape_id: Mapped[int] = mapped_column(ForeignKey("grapes.id"), primary_key=True)
+
+    class Manuscript(Base, ResourceInt):
+        __tablename__ = "manuscripts"
+        title: Mapped[str] = mapped_column()
+        body: Mapped[str] = mapped_column(Text)
+        scan: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+
+        class resource_cfg(ResourceConfig):
+            deferred_columns = ["body", "scan"]
+            deferred_chunk_size = 1000
+
+        class search_cfg(SearchConfig):
+            search_fulltext = True
+            sortable = ["title"]
+
+        class delete_cfg(DeleteConfig):
+            bulk = True
+
+    class Poem(Base, ResourceInt):
+        __tablename__ = "poems"
+        title: Mapped[str] = mapped_column()
+        embedding: Mapped[Optional[list[float]]] = mapped_column(Vector, nullable=True)
+
+        class search_cfg(SearchConfig):
+            search_vector = "embedding"
+
+    class Chronicle(Base, ResourceInt):
+        __tablename__ = "chronicles"
+        title: Mapped[str] = mapped_column()
+        sources: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+        embedding: Mapped[Optional[list[float]]] = mapped_column(Vector, nullable=True)
+
+        class create_cfg(CreateConfig):
+            ingest = True
+
     Base.metadata.create_all(engine)
 
     app = FastAPI(
@@ -174,7 +316,24 @@ def app_types():
             content=content, status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
         )
 
-    RouterFactory.mount(app, [Author, Book, Cheese, Knight])
+    RouterFactory.mount(
+        app,
+        [
+            Author,
+            Book,
+            Cheese,
+            Quest,
+            Sword,
+            Letter,
+            Knight,
+            Vineyard,
+            Grape,
+            Wine,
+            Manuscript,
+            Poem,
+            Chronicle,
+        ],
+    )
 
     yield TestClient(app)
 
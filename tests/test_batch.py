@@ -0,0 +1,99 @@
+from conftest import user_headers
+
+
+def test_batch(setup_and_fill_db, app, USERS):
+
+    user = USERS["pawdrick_pupper"]
+
+    operations = [
+        dict(
+            op="create",
+            resource="pets",
+            ref="pet",
+            body=dict(
+                id="toast",
+                name="Toast",
+                owner_id="pawdrick_pupper",
+                species_id="dog",
+                public=False,
+            ),
+        ),
+        dict(
+            op="create",
+            resource="notes",
+            ref="note",
+            body=dict(
+                id="toast_note",
+                text="Good boy",
+                owner_id="pawdrick_pupper",
+                pet_id="$ref:pet",
+            ),
+        ),
+        dict(op="patch", resource="pets", id="$ref:pet", body=dict(public=True)),
+        dict(op="read", resource="notes", id="$ref:note"),
+        dict(op="delete", resource="pets", id="waffles"),
+    ]
+
+    r = app.post("/batch", json=operations, headers=user_headers(user))
+    assert r.status_code == 200
+    results = r.json()
+    assert [result["op"] for result in results] == [
+        "create",
+        "create",
+        "patch",
+        "read",
+        "delete",
+    ]
+    assert results[2]["result"]["public"] is True
+    assert results[3]["result"]["pet_id"] == "toast"
+    assert results[4]["result"] == 1
+
+    r = app.get("/pets/toast", headers=user_headers(user))
+    assert r.status_code == 200
+    r = app.get("/pets/waffles", headers=user_headers(user))
+    assert r.status_code == 404
+
+
+def test_batch_rollback(setup_and_fill_db, app, USERS):
+
+    user = USERS["pawdrick_pupper"]
+
+    operations = [
+        dict(
+            op="create",
+            resource="pets",
+            body=dict(
+                id="scone",
+                name="Scone",
+                owner_id="pawdrick_pupper",
+                species_id="dog",
+                public=False,
+            ),
+        ),
+        # cheddar is another user's private pet
+        dict(op="patch", resource="pets", id="cheddar", body=dict(name="Brie")),
+    ]
+
+    r = app.post("/batch", json=operations, headers=user_headers(user))
+    assert r.status_code == 404
+    assert r.json()["detail"]["operation"] == 1
+
+    # the whole batch is rolled back
+    r = app.get("/pets/scone", headers=user_headers(user))
+    assert r.status_code == 404
+
+    # route-level dependencies apply to batch operations
+    operations = [
+        dict(
+            op="create",
+            resource="certifications",
+            body=dict(id="agility", name="Agility", description="Agility training"),
+        )
+    ]
+    r = app.post("/batch", json=operations, headers=user_headers(user))
+    assert r.status_code == 401
+
+    # references must be defined by earlier operations
+    operations = [dict(op="read", resource="pets", id="$ref:missing")]
+    r = app.post("/batch", json=operations, headers=user_headers(user))
+    assert r.status_code == 400
@@ -0,0 +1,111 @@
+from conftest import user_headers
+
+
+def sync(client, cursor=None):
+    """Fetch all the changes after a cursor."""
+
+    changes = []
+    while True:
+        params = {"since": cursor} if cursor else {}
+        r = client.get("/quests/changes", params=params)
+        assert r.status_code == 200
+        page = r.json()
+        assert len(page["changes"]) <= 2
+        changes += page["changes"]
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            return changes, cursor
+
+
+def test_changes(app_types):
+
+    _, cursor = sync(app_types)
+
+    # nothing has changed
+    changes, cursor = sync(app_types, cursor)
+    assert changes == []
+
+    ids = []
+    for name in ["Holy Grail", "Shrubbery", "Castle Anthrax"]:
+        r = app_types.post("/quests", json=dict(name=name))
+        assert r.status_code == 201
+        ids.append(r.json()["id"])
+
+    r = app_types.patch(f"/quests/{ids[0]}", json=dict(name="Holier Grail"))
+    assert r.status_code == 200
+    r = app_types.delete(f"/quests/{ids[1]}")
+    assert r.status_code == 200
+
+    # changes are paged, in order, with tombstones for deletions
+    changes, cursor = sync(app_types, cursor)
+    assert [(c["op"], c["id"]) for c in changes] == [
+        ("upsert", ids[2]),
+        ("upsert", ids[0]),
+        ("delete", ids[1]),
+    ]
+    assert changes[1]["resource"]["name"] == "Holier Grail"
+    assert changes[1]["resource"]["version"] == 2
+    assert changes[2]["resource"] is None
+
+    changes, cursor = sync(app_types, cursor)
+    assert changes == []
+
+    r = app_types.get("/quests/changes", params={"since": "not-a-cursor"})
+    assert r.status_code == 400
+
+
+def test_changes_tombstone_table(app_types):
+    from sqlalchemy import create_engine, inspect
+    from sqlalchemy.orm import Session
+
+    from quickrest import Base
+
+    Quest = next(
+        m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Quest"
+    )
+    changes = Quest.changes
+
+    # an existing tombstone table is only checked for once
+    changes._tombstone_table_ready = False
+    assert app_types.get("/quests/changes").status_code == 200
+    assert changes._tombstone_table_ready
+
+    # on sqlite, the table is created in the session's transaction, and is ready once it's committed
+    changes._tombstone_table_ready = False
+    with Session(create_engine("sqlite://")) as db:
+        changes.ensure_tombstone_table(db)
+        changes.ensure_tombstone_table(db)
+        assert not changes._tombstone_table_ready
+        assert inspect(db.connection()).has_table("quickrest_tombstones")
+        db.commit()
+    assert changes._tombstone_table_ready
+
+
+def test_changes_access_control(setup_and_fill_db, app, USERS):
+
+    ids = {}
+    for user_id, pet_id in [
+        ("pawdrick_pupper", "bacon"),
+        ("bonita_leashley", "cheddar"),
+    ]:
+        r = app.post(
+            "/notes",
+            json=dict(
+                id=f"{pet_id}_note", text="Walkies", owner_id=user_id, pet_id=pet_id
+            ),
+            headers=user_headers(USERS[user_id]),
+        )
+        assert r.status_code == 201
+        ids[user_id] = r.json()["id"]
+
+    for user_id, note_id in ids.items():
+        r = app.delete(f"/notes/{note_id}", headers=user_headers(USERS[user_id]))
+        assert r.status_code == 200
+
+    # each user only receives the deletions of their own notes
+    for user_id, note_id in ids.items():
+        r = app.get("/notes/changes", headers=user_headers(USERS[user_id]))
+        assert r.status_code == 200
+        assert [(c["op"], c["id"]) for c in r.json()["changes"]] == [
+            ("delete", note_id)
+        ]
@@ -1,3 +1,5 @@
+import asyncio
+import json
 import logging
 
 from conftest import user_headers
@@ -62,3 +64,161 @@ def test_create_fail_on_dependencies(
             "/owners", json=resource, headers=user_headers(USERS[admin_user_id])
         )
         assert r.status_code == 401
+
+
+def test_create_ingest(app_types):
+    lines = [
+        '{"slug": "galahad", "name": "Galahad", "is_round_table": true}',
+        '{"slug": "percival", "name": "Percival", "is_round_table": true}',
+        "",
+        '{"slug": "mordred", "name": "Mordred"}',
+        '{"slug": "galahad", "name": "Galahad Again", "is_round_table": true}',
+        "not json",
+        '{"slug": "gawain", "name": "Gawain", "is_round_table": true}',
+    ]
+
+    r = app_types.post(
+        "/knights/ingest",
+        content="\n".join(lines),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert r.status_code == 200
+    report = r.json()
+    assert report["inserted"] == 3
+    assert report["failed"] == 3
+    assert [e["line"] for e in report["errors"]] == [4, 5, 6]
+
+    for slug in ["galahad", "percival", "gawain"]:
+        r = app_types.get(f"/knights/{slug}")
+        assert r.status_code == 200
+
+    r = app_types.get("/knights/mordred")
+    assert r.status_code == 404
+
+
+def test_create_ingest_long_lines(app_types):
+    long_name = "Sir " + "Lancelot " * 50
+
+    def body():
+        yield b'{"slug": "lamorak", "name": "Lamorak", "is_round_table": true}\n'
+        # a line longer than ingest_max_line_bytes, streamed in pieces
+        yield b'{"slug": "lancelot", "name": "'
+        for _ in range(10):
+            yield long_name.encode()
+        yield b'", "is_round_table": true}\n'
+        yield ('{"slug": "dagonet", "name": "%s"}\n' % long_name).encode()
+        yield b'{"slug": "pelleas", "name": "Pelleas", "is_round_table": true}'
+
+    r = app_types.post(
+        "/knights/ingest",
+        content=body(),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert r.status_code == 200
+    report = r.json()
+    assert report["inserted"] == 2
+    assert [e["line"] for e in report["errors"]] == [2, 3]
+
+    for slug, status_code in [("lamorak", 200), ("pelleas", 200), ("lancelot", 404)]:
+        assert app_types.get(f"/knights/{slug}").status_code == status_code
+
+
+def test_create_ingest_json(app_types):
+    from sqlalchemy.dialects import postgresql
+
+    from quickrest import Base
+    from quickrest.mixins.create import _copy_text, copy_rows, copy_values
+
+    Chronicle = next(
+        m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Chronicle"
+    )
+
+    chronicles = [
+        dict(title="Historia", sources={"author": "Geoffrey", "pages": [1, 2]}),
+        dict(title="Brut", sources=None, embedding=[0.5, 1.0]),
+        dict(title="Le Morte", sources={"note": "tab\there"}, embedding=[1.0, 0.0]),
+    ]
+    r = app_types.post(
+        "/chronicles/ingest",
+        content="\n".join(json.dumps(c) for c in chronicles),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert r.status_code == 200
+    assert r.json()["inserted"] == 3
+
+    r = app_types.get("/chronicles")
+    assert r.status_code == 200
+    assert [
+        {k: c.get(k) for k in ["title", "sources", "embedding"]}
+        for c in r.json()["chronicles"]
+    ] == [{"embedding": None, **c} for c in chronicles[:1]] + chronicles[1:]
+
+    # with COPY, JSON is written as JSON text, and vectors as array literals for psycopg2
+    with Chronicle._sessionmaker() as session:
+        columns, values = copy_values(session, Chronicle, chronicles[2:])
+    (row,) = copy_rows(columns, values, postgresql.psycopg2.dialect())
+    fields = dict(zip([c.name for c in columns], map(_copy_text, row)))
+    assert fields["sources"] == '{"note": "tab\\\\there"}'
+    assert fields["embedding"] == "{1.0,0.0}"
+
+
+def test_create_group_commit(app_types):
+    from sqlalchemy.orm import Session
+
+    from quickrest import Base
+
+    (Knight,) = [
+        m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Knight"
+    ]
+    CreateKnight = Knight.create.input_model
+
+    async def create_many(slugs):
+        return await asyncio.gather(
+            *[
+                Knight.create.controller(
+                    createknight=CreateKnight(
+                        slug=slug, name=slug, is_round_table=True
+                    ),
+                    db=None,
+                    user=None,
+                )
+                for slug in slugs
+            ],
+            return_exceptions=True,
+        )
+
+    # concurrent creates are coalesced, and each gets its own result or error
+    slugs = ["bors", "kay", "bedivere", "bedivere", "tristan"]
+    results = asyncio.run(create_many(slugs))
+
+    assert [r.slug for r in results if not isinstance(r, Exception)] == [
+        "bors",
+        "kay",
+        "bedivere",
+        "tristan",
+    ]
+    assert isinstance(results[3], Exception)
+
+    for slug in ["bors", "kay", "bedivere", "tristan"]:
+        r = app_types.get(f"/knights/{slug}")
+        assert r.status_code == 200
+
+    # creates in a caller's transaction aren't queued, and roll back with it
+    engine = Knight._sessionmaker().get_bind()
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        db = Session(bind=conn, join_transaction_mode="rollback_only")
+        result = asyncio.run(
+            Knight.create.controller(
+                createknight=CreateKnight(
+                    slug="lancelot", name="lancelot", is_round_table=True
+                ),
+                db=db,
+                user=None,
+            )
+        )
+        assert result.slug == "lancelot"
+        transaction.rollback()
+        db.close()
+
+    assert app_types.get("/knights/lancelot").status_code == 404
@@ -20,3 +20,55 @@ def test_delete(setup_and_fill_db, USERS, app):
     # verify pet deleted
     r = app.get(f"/pets/{pet}", headers=user_headers(authorized_user))
     assert r.status_code == 404
+
+
+def test_bulk_delete(setup_and_fill_db, USERS, app, monkeypatch):
+    from example.app import Pet
+
+    authorized_user = USERS["pawdrick_pupper"]
+    unauthorized_user = USERS["bonita_leashley"]
+
+    # users can't bulk delete each others private pets
+    r = app.post(
+        "/pets/bulk-delete",
+        json={"ids": ["waffles"]},
+        headers=user_headers(unauthorized_user),
+    )
+    assert r.status_code == 200
+    assert r.json() == 0
+
+    # a search filter is required
+    r = app.delete("/pets", headers=user_headers(authorized_user))
+    assert r.status_code == 400
+
+    # the bulk limit is enforced before anything is deleted
+    monkeypatch.setattr(Pet.delete_cfg, "bulk_limit", 1)
+    r = app.delete(
+        "/pets",
+        params={"vaccination_date_gte": "2020-01-01"},
+        headers=user_headers(authorized_user),
+    )
+    assert r.status_code == 400
+    r = app.get("/pets/bacon", headers=user_headers(authorized_user))
+    assert r.status_code == 200
+    monkeypatch.undo()
+
+    # own and public pets are deleted, bonita's private cheddar isn't
+    r = app.delete(
+        "/pets",
+        params={"vaccination_date_gte": "2020-01-01"},
+        headers=user_headers(authorized_user),
+    )
+    assert r.status_code == 200
+    assert r.json() == 2
+
+    r = app.post(
+        "/pets/bulk-delete",
+        json={"ids": ["waffles", "bacon"]},
+        headers=user_headers(authorized_user),
+    )
+    assert r.status_code == 200
+    assert r.json() == 1
+
+    r = app.get("/pets/cheddar", headers=user_headers(unauthorized_user))
+    assert r.status_code == 200
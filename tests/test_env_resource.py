@@ -2,6 +2,7 @@ import importlib
 from uuid import UUID
 
 from quickrest.mixins import base
+from quickrest.mixins.utils import UUID7
 
 
 def test_sqlite_case(monkeypatch):
@@ -72,6 +73,13 @@ def test_id_types(monkeypatch):
 
         assert base.env_settings.QUICKREST_ID_TYPE == UUID
 
+    with monkeypatch.context() as monkeycontext:
+        monkeycontext.setenv("QUICKREST_ID_TYPE", "uuid7")
+
+        importlib.reload(base)
+
+        assert base.env_settings.QUICKREST_ID_TYPE == UUID7
+
 
 def test_slug_bool(monkeypatch):
     with monkeypatch.context() as monkeycontext:
@@ -0,0 +1,65 @@
+from sqlalchemy import text
+
+
+def test_suggest_indexes(app, capsys):
+    from example.app import Certification, Note, Owner, Pet, Specie, engine
+    from quickrest import RouterFactory
+    from quickrest.indexes import main
+
+    models = [Owner, Pet, Specie, Note, Certification]
+
+    suggestions = {
+        (s.table, tuple(s.columns), s.where is not None): s
+        for s in RouterFactory.suggest_indexes(models)
+    }
+
+    # composite indexes for private and publishable resources
+    assert ("notes", ("owner_id", "text"), False) in suggestions
+    # the sortable fields are indexed with the primary key, which also serves the filters
+    assert ("pets", ("owner_id", "vaccination_date", "id"), False) in suggestions
+    assert ("pets", ("owner_id", "name", "id"), False) in suggestions
+    # partial indexes for public resources, including the primary key
+    assert suggestions[("pets", ("vaccination_date", "id"), True)].ddl == (
+        "CREATE INDEX IF NOT EXISTS ix_pets_vaccination_date_id_public "
+        "ON pets (vaccination_date, id) WHERE public = 1"
+    )
+    assert ("pets", ("id",), True) in suggestions
+    # the routed relationship (pets.owner_id) is served by the composite index
+    assert ("pets", ("owner_id",), False) not in suggestions
+    # relationship filters are suggested on the related table
+    assert ("species", ("common_name",), False) in suggestions
+    # similarity filters aren't suggested
+    assert not any(
+        s.columns[-1] == "name" for s in suggestions.values() if s.table == "pets"
+    )
+    # the primary keys and slugs are already indexed
+    assert all(s.columns != ["slug"] for s in suggestions.values())
+
+    with engine.begin() as connection:
+        for suggestion in suggestions.values():
+            connection.execute(text(suggestion.ddl))
+
+    assert RouterFactory.suggest_indexes(models) == []
+
+    # an unconditional index on a filter also serves the public resources
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_pets_vaccination_date_id_public"))
+        connection.execute(text("CREATE INDEX ix_vd ON pets (vaccination_date, id)"))
+    assert RouterFactory.suggest_indexes(models) == []
+
+    # but a partial index on another condition doesn't
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_notes_owner_id_text"))
+        connection.execute(
+            text("CREATE INDEX ix_nt ON notes (owner_id, text) WHERE text != ''")
+        )
+    assert [s.ddl for s in RouterFactory.suggest_indexes(models)] == [
+        "CREATE INDEX IF NOT EXISTS ix_notes_owner_id_text ON notes (owner_id, text)"
+    ]
+
+    # the command line prints the statements
+    main(["example.app"])
+    assert capsys.readouterr().out == (
+        "CREATE INDEX IF NOT EXISTS ix_notes_owner_id_text ON notes (owner_id, text);"
+        "  -- search filter `text`\n"
+    )
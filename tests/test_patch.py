@@ -39,3 +39,72 @@ def test_patch(setup_and_fill_db, app, USERS):
     assert r.status_code == 200
     for cert in r.json().get("certifications"):
         assert cert.get("id") in data_certs["certifications"]
+
+
+def test_bulk_patch(setup_and_fill_db, app, USERS, monkeypatch):
+    from sqlalchemy import event
+
+    from example.app import Pet
+
+    authorized_user = USERS["pawdrick_pupper"]
+
+    data = dict(ids=["waffles", "bacon", "cheddar"], patch=dict(name="Biscuit"))
+
+    # only pets the user can access are patched
+    r = app.patch("/pets/bulk", json=data, headers=user_headers(authorized_user))
+    assert r.status_code == 200
+    assert r.json() == 2
+
+    for pet in ["waffles", "bacon"]:
+        r = app.get(f"/pets/{pet}", headers=user_headers(authorized_user))
+        assert r.json()["name"] == "Biscuit"
+
+    # ids and search filters are combined
+    r = app.patch(
+        "/pets/bulk",
+        params={"vaccination_date_lt": "2021-01-01"},
+        json=data,
+        headers=user_headers(authorized_user),
+    )
+    assert r.status_code == 200
+    assert r.json() == 1
+
+    # the bulk limit is enforced before anything is patched, without counting the matches
+    statements = []
+
+    def count(connection, cursor, statement, *args):
+        statements.append(statement.lower())
+
+    engine = Pet._sessionmaker().get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    monkeypatch.setattr(Pet.patch_cfg, "bulk_limit", 1)
+    try:
+        r = app.patch(
+            "/pets/bulk",
+            json=dict(ids=["waffles", "bacon"], patch=dict(name="Crumble")),
+            headers=user_headers(authorized_user),
+        )
+        assert r.status_code == 400
+        r = app.patch(
+            "/pets/bulk",
+            json=dict(ids=["waffles"], patch=dict(name="Crumble")),
+            headers=user_headers(authorized_user),
+        )
+        assert r.status_code == 200
+        assert r.json() == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+        monkeypatch.undo()
+    assert not any("count(" in statement for statement in statements)
+    r = app.get("/pets/bacon", headers=user_headers(authorized_user))
+    assert r.json()["name"] == "Biscuit"
+    r = app.get("/pets/waffles", headers=user_headers(authorized_user))
+    assert r.json()["name"] == "Crumble"
+
+    # ids or search filters are required
+    r = app.patch(
+        "/pets/bulk",
+        json=dict(patch=dict(name="Biscuit")),
+        headers=user_headers(authorized_user),
+    )
+    assert r.status_code == 400
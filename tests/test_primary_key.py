@@ -1,3 +1,6 @@
+from uuid import UUID
+
+
 def test_pop_serialize(app_types):
 
     authors = [
@@ -99,3 +102,127 @@ def test_uuid_slug_read_write(app_types):
         r = app_types.get(f"/knights/{knight['slug']}")
         assert r.status_code == 200
         assert r.json().get("name") == knight["name"]
+
+
+def test_uuid7_read_write(app_types):
+    from quickrest.mixins.utils import uuid7
+
+    # generated ids are time-ordered, version 7 uuids
+    ids = [uuid7() for _ in range(1000)]
+    assert ids == sorted(ids)
+    assert all(i.version == 7 for i in ids)
+
+    letters = [dict(text=f"letter {i}") for i in range(5)]
+
+    letter_ids = []
+    for letter in letters:
+        r = app_types.post("/letters", json=letter)
+        assert r.status_code == 201
+        letter_ids.append(UUID(r.json()["id"]))
+
+    assert letter_ids == sorted(letter_ids)
+    assert all(i.version == 7 for i in letter_ids)
+
+    for letter_id, letter in zip(letter_ids, letters):
+        r = app_types.get(f"/letters/{letter_id}")
+        assert r.status_code == 200
+        assert r.json()["text"] == letter["text"]
+
+
+def test_hilo_read_write(app_types):
+    from sqlalchemy import create_engine, text
+
+    swords = [dict(name=name) for name in ["Excalibur", "Clarent", "Arondight"]]
+    swords += [dict(name=name) for name in ["Galatine", "Secace"]]
+
+    # ids are assigned in memory, from blocks of 3
+    for i, sword in enumerate(swords):
+        r = app_types.post("/swords", json=sword)
+        assert r.status_code == 201
+        assert r.json()["id"] == i + 1
+
+    for i, sword in enumerate(swords):
+        r = app_types.get(f"/swords/{i + 1}")
+        assert r.status_code == 200
+        assert r.json()["name"] == sword["name"]
+
+    # two blocks have been reserved
+    engine = create_engine("sqlite:///database-types.db")
+    with engine.connect() as conn:
+        next_id = conn.execute(
+            text("SELECT next_id FROM quickrest_hilo WHERE name = 'swords'")
+        ).scalar_one()
+    assert next_id == 7
+
+
+def test_hilo_block_in_transaction(app_types):
+    from quickrest import Base
+
+    (Sword,) = [m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Sword"]
+
+    # a new block is reserved in the transaction that holds sqlite's write lock
+    with Sword._sessionmaker() as session:
+        session.add(Sword(name="Durendal"))
+        session.flush()
+        swords = [Sword(name=name) for name in ["Joyeuse", "Hauteclere", "Curtana"]]
+        session.add_all(swords)
+        session.flush()
+        ids = [sword.id for sword in swords]
+        session.commit()
+
+    assert ids == list(range(ids[0], ids[0] + 3))
+    for sword_id in ids:
+        assert app_types.get(f"/swords/{sword_id}").status_code == 200
+
+
+def test_hilo_block_rolled_back(app_types):
+    from types import SimpleNamespace
+
+    from quickrest import Base
+    from quickrest.mixins.hilo import HiLoAllocator
+
+    (Sword,) = [m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Sword"]
+    engine = Sword._sessionmaker().get_bind()
+
+    # two workers, reserving on sqlite in the transaction of the triggering insert
+    worker, other = HiLoAllocator(3, Sword._sessionmaker), HiLoAllocator(3, None)
+
+    def next_ids(allocator, n, rollback=False):
+        with engine.connect() as connection:
+            context = SimpleNamespace(connection=connection)
+            ids = [allocator.next_id("swords", context) for _ in range(n)]
+            connection.rollback() if rollback else connection.commit()
+        return ids
+
+    # the rest of a block that was rolled back isn't used, as another worker may reserve it
+    rolled_back = next_ids(worker, 1, rollback=True)
+    taken = next_ids(other, 3)
+    assert rolled_back[0] in taken
+    ids = next_ids(worker, 3)
+    assert not set(ids) & set(taken)
+
+    # nor re-issued, even if the worker reserves the next block first
+    rolled_back = next_ids(worker, 1, rollback=True)
+    ids = next_ids(worker, 3)
+    assert not set(ids) & set(rolled_back)
+    assert not set(ids) & set(next_ids(other, 6))
+
+
+def test_hilo_copy_values(app_types):
+    from quickrest import Base
+    from quickrest.mixins.create import copy_values
+
+    (Sword,) = [m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Sword"]
+
+    def copy_rows(session, rows):
+        columns, values = copy_values(session, Sword, rows)
+        return [dict(zip([c.name for c in columns], row)) for row in values]
+
+    with Sword._sessionmaker() as session:
+        (first,) = copy_rows(session, [dict(name="Arondight")])
+        # ids are only assigned to rows without one, and explicit nulls are kept
+        assert copy_rows(session, [dict(id=9001, name=None)]) == [
+            dict(id=9001, name=None)
+        ]
+        (second,) = copy_rows(session, [dict(name="Clarent")])
+        assert second["id"] == first["id"] + 1
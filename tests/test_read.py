@@ -1,3 +1,4 @@
+import pytest
 from conftest import user_headers
 
 
@@ -50,6 +51,25 @@ def test_read_failcases(setup_and_fill_db, resources, app, USERS, PETS):
     r = app.get("/pets/{}".format(public_pet["id"]), headers=user_headers(first_user))
 
 
+def test_read_exists(setup_and_fill_db, app, USERS):
+    authorized_user = USERS["pawdrick_pupper"]
+    unauthorized_user = USERS["bonita_leashley"]
+
+    r = app.head("/pets/waffles", headers=user_headers(authorized_user))
+    assert r.status_code == 200
+    assert r.content == b""
+
+    # private resources don't exist for other users
+    r = app.head("/pets/waffles", headers=user_headers(unauthorized_user))
+    assert r.status_code == 404
+
+    r = app.head("/pets/bacon", headers=user_headers(unauthorized_user))
+    assert r.status_code == 200
+
+    r = app.head("/pets/nonexistent", headers=user_headers(authorized_user))
+    assert r.status_code == 404
+
+
 def test_read_serialized_attribute(setup_and_fill_db, app, USERS):
 
     user_id = "bonita_leashley"
@@ -79,3 +99,209 @@ def test_read_routed_relationship(setup_and_fill_db, USERS, PETS, app):
         assert pet["owner_id"] == user_id
         assert pet["id"] in user_pets
         assert pet["name"] == user_pets[pet["id"]]["name"]
+
+
+def test_read_sparse_fieldset(setup_and_fill_db, app, USERS, PETS):
+
+    user_id = "pawdrick_pupper"
+    pet = PETS["waffles"]
+
+    r = app.get(
+        f"/pets/{pet['id']}",
+        params=dict(fields="name,specie"),
+        headers=user_headers(USERS[user_id]),
+    )
+    assert r.status_code == 200
+    assert set(r.json().keys()) == {"id", "name", "specie"}
+    assert r.json()["name"] == pet["name"]
+    assert r.json()["specie"]["id"] == pet["species_id"]
+
+    # fields are validated against the resource
+    r = app.get(
+        f"/pets/{pet['id']}",
+        params=dict(fields="name,dark_secret"),
+        headers=user_headers(USERS[user_id]),
+    )
+    assert r.status_code == 422
+
+    # sparse fieldsets on relationship routes
+    r = app.get(
+        f"/owners/{user_id}/pets",
+        params=dict(fields="name"),
+        headers=user_headers(USERS[user_id]),
+    )
+    assert r.status_code == 200
+    for pet in r.json():
+        assert set(pet.keys()) == {"id", "name"}
+
+    # sparse fieldsets on search routes
+    r = app.get(
+        "/pets",
+        params=dict(owner_id=user_id, fields="vaccination_date"),
+        headers=user_headers(USERS[user_id]),
+    )
+    assert r.status_code == 200
+    for pet in r.json()["pets"]:
+        assert set(pet.keys()) == {"id", "vaccination_date"}
+
+
+def test_read_deferred_columns(app_types):
+
+    body = "Call me Ishmael. " + "Ça va, baleine? " * 5000
+    encoded = body.encode("utf-8")
+
+    r = app_types.post("/manuscripts", json=dict(title="Moby Dick", body=body))
+    assert r.status_code == 201
+    assert "body" not in r.json()
+    manuscript_id = r.json()["id"]
+
+    # deferred columns are left out of reads and searches
+    r = app_types.get(f"/manuscripts/{manuscript_id}")
+    assert r.status_code == 200
+    assert set(r.json().keys()) == {"id", "title"}
+
+    r = app_types.get("/manuscripts")
+    assert r.status_code == 200
+    assert "body" not in r.json()["manuscripts"][0]
+
+    # ... and streamed from their own route
+    r = app_types.get(f"/manuscripts/{manuscript_id}/body")
+    assert r.status_code == 200
+    assert r.headers["accept-ranges"] == "bytes"
+    assert r.content == encoded
+
+    # range requests
+    r = app_types.get(
+        f"/manuscripts/{manuscript_id}/body", headers={"Range": "bytes=0-15"}
+    )
+    assert r.status_code == 206
+    assert r.content == encoded[:16]
+    assert r.headers["content-range"] == f"bytes 0-15/{len(encoded)}"
+
+    r = app_types.get(
+        f"/manuscripts/{manuscript_id}/body", headers={"Range": "bytes=2990-"}
+    )
+    assert r.status_code == 206
+    assert r.content == encoded[2990:]
+
+    r = app_types.get(
+        f"/manuscripts/{manuscript_id}/body", headers={"Range": "bytes=-10"}
+    )
+    assert r.status_code == 206
+    assert r.content == encoded[-10:]
+
+    r = app_types.get(
+        f"/manuscripts/{manuscript_id}/body",
+        headers={"Range": f"bytes={len(encoded)}-"},
+    )
+    assert r.status_code == 416
+
+    # empty deferred columns are not found
+    r = app_types.get(f"/manuscripts/{manuscript_id}/scan")
+    assert r.status_code == 404
+
+
+def test_read_deferred_columns_writes(app_types, monkeypatch):
+    import asyncio
+
+    from quickrest import Base
+    from quickrest.mixins.read import ReadFactory
+
+    # read the value in several queries (or blob reads), of one chunk each
+    monkeypatch.setattr(ReadFactory, "SQLITE_READ_SIZE", 0)
+
+    Manuscript = next(
+        m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Manuscript"
+    )
+    (endpoint,) = [
+        route.endpoint
+        for route in Manuscript.router.routes
+        if route.path.endswith("/{id}/scan")
+    ]
+
+    r = app_types.post("/manuscripts", json=dict(title="Beowulf", body="Hwæt!"))
+    assert r.status_code == 201
+    manuscript_id = r.json()["id"]
+
+    def write_scan(scan):
+        with Manuscript._sessionmaker() as db:
+            db.get(Manuscript, manuscript_id).scan = scan
+            db.commit()
+
+    write_scan(bytes(range(256)) * 40)
+
+    async def stream(write=None):
+        response = await endpoint(id=manuscript_id, range=None, user=None)
+        chunks = []
+        async for chunk in response.body_iterator:
+            chunks.append(chunk)
+            # writers aren't blocked while the value is streamed
+            if write is not None and len(chunks) == 2:
+                write_scan(write)
+        return b"".join(chunks)
+
+    assert asyncio.run(stream()) == bytes(range(256)) * 40
+
+    # a write while the value is streamed ends the stream, rather than mixing versions
+    with pytest.raises(RuntimeError):
+        asyncio.run(stream(write=bytes(range(128)) * 20))
+
+
+def test_read_conditional(app_types):
+
+    r = app_types.post("/quests", json=dict(name="Holy Grail"))
+    assert r.status_code == 201
+    quest = r.json()
+    assert quest["version"] == 1
+
+    # reads are tagged, and unchanged resources aren't re-sent
+    r = app_types.get(f"/quests/{quest['id']}")
+    assert r.status_code == 200
+    tag = r.headers["ETag"]
+
+    r = app_types.get(f"/quests/{quest['id']}", headers={"If-None-Match": tag})
+    assert r.status_code == 304
+    assert r.content == b""
+
+    r = app_types.head(f"/quests/{quest['id']}")
+    assert r.status_code == 200
+    assert r.headers["ETag"] == tag
+
+    # searches are tagged too
+    r = app_types.get("/quests")
+    assert r.status_code == 200
+    search_tag = r.headers["ETag"]
+    r = app_types.get("/quests", headers={"If-None-Match": search_tag})
+    assert r.status_code == 304
+
+    # patches are guarded by If-Match
+    r = app_types.patch(
+        f"/quests/{quest['id']}",
+        json=dict(name="Green Knight"),
+        headers={"If-Match": '"0.0"'},
+    )
+    assert r.status_code == 412
+
+    r = app_types.patch(
+        f"/quests/{quest['id']}",
+        json=dict(name="Green Knight"),
+        headers={"If-Match": tag},
+    )
+    assert r.status_code == 200
+    assert r.json()["version"] == 2
+    assert r.headers["ETag"] != tag
+
+    r = app_types.get(f"/quests/{quest['id']}", headers={"If-None-Match": tag})
+    assert r.status_code == 200
+    assert r.json()["name"] == "Green Knight"
+
+    r = app_types.get("/quests", headers={"If-None-Match": search_tag})
+    assert r.status_code == 200
+
+    # set-based updates bump the version
+    r = app_types.patch(
+        "/quests/bulk", json=dict(ids=[quest["id"]], patch=dict(name="Questing Beast"))
+    )
+    assert r.status_code == 200
+    r = app_types.get(f"/quests/{quest['id']}")
+    assert r.json()["version"] == 3
@@ -1,3 +1,8 @@
+import csv
+import io
+import json
+from uuid import UUID
+
 from conftest import user_headers
 
 
@@ -31,3 +36,696 @@ def test_search(setup_and_fill_db, app, USERS):
     pet_ids = ["mittens"]
     params = dict(vaccination_date_gte="2022-01-01")
     check_search(params, pet_ids, authorized_user)
+
+
+def test_search_count(setup_and_fill_db, app, USERS):
+
+    for user in USERS.values():
+        for params in [dict(), dict(public=True), dict(name="Bacin")]:
+            r = app.get("/pets/count", params=params, headers=user_headers(user))
+            assert r.status_code == 200
+
+            # the count agrees with the search route
+            search = app.get(
+                "/pets", params={**params, "limit": 100}, headers=user_headers(user)
+            )
+            assert r.json() == len(search.json()["pets"])
+
+    r = app.get(
+        "/pets/count",
+        params=dict(public=True),
+        headers=user_headers(USERS["bonita_leashley"]),
+    )
+    assert r.json() >= 2
+
+
+def test_search_publishable_union(setup_and_fill_db, app, USERS, PETS):
+    # the example pets are made with make_publishable(..., union=True)
+    for user in USERS.values():
+        visible = {
+            pet["id"]
+            for pet in PETS.values()
+            if pet["owner_id"] == user["id"] or pet["public"]
+        }
+
+        r = app.get("/pets", params=dict(limit=100), headers=user_headers(user))
+        assert r.status_code == 200
+        assert sorted(p["id"] for p in r.json()["pets"]) == sorted(visible)
+
+        # pages cover the union without duplicates
+        paged = []
+        for page in range(len(visible) + 1):
+            r = app.get(
+                "/pets", params=dict(limit=1, page=page), headers=user_headers(user)
+            )
+            paged += [p["id"] for p in r.json()["pets"]]
+        assert sorted(paged) == sorted(visible)
+
+        # filters apply to both branches of the union
+        r = app.get("/pets", params=dict(public=False), headers=user_headers(user))
+        assert {p["id"] for p in r.json()["pets"]} == {
+            pet_id for pet_id in visible if not PETS[pet_id]["public"]
+        }
+
+        r = app.get("/pets/count", headers=user_headers(user))
+        assert r.json() == len(visible)
+
+
+def test_search_related(setup_and_fill_db, app, USERS):
+    def search(params, user):
+        r = app.get("/pets", params=params, headers=user_headers(user))
+        assert r.status_code == 200
+        return sorted(p["id"] for p in r.json()["pets"])
+
+    pawdrick = USERS["pawdrick_pupper"]
+    bonita = USERS["bonita_leashley"]
+
+    assert search({"specie.common_name": "cat"}, bonita) == ["mittens"]
+    assert search({"specie.common_name": "dog", "public": True}, bonita) == ["bacon"]
+    assert search({"owner.last_name": "Pupper"}, pawdrick) == ["bacon", "waffles"]
+    # related resources are filtered by their own access control
+    assert search({"owner.last_name": "Pupper"}, bonita) == []
+    # paths can follow several relationships
+    assert search({"owner.certifications.id": "dog_training_kc1"}, pawdrick) == [
+        "bacon",
+        "waffles",
+    ]
+    assert search({"owner.certifications.id": "cat_master_l1"}, pawdrick) == []
+
+    r = app.get(
+        "/pets/count",
+        params={"specie.common_name": "dog"},
+        headers=user_headers(bonita),
+    )
+    assert r.json() == 2
+
+    schema = app.get("/openapi.json").json()
+    parameters = [p["name"] for p in schema["paths"]["/pets"]["get"]["parameters"]]
+    assert "owner.certifications.id" in parameters
+
+
+def test_search_in(setup_and_fill_db, app, USERS, PETS):
+    from example.app import Pet
+
+    pawdrick = USERS["pawdrick_pupper"]
+
+    def search(params):
+        r = app.get("/pets", params=params, headers=user_headers(pawdrick))
+        assert r.status_code == 200
+        return sorted(p["id"] for p in r.json()["pets"])
+
+    owners = ["pawdrick_pupper", "purrcilla_meowington"]
+    # private pets of other owners aren't found
+    expected = ["bacon", "mittens", "waffles"]
+
+    # repeated or comma-separated
+    assert search({"owner_id_in": owners}) == expected
+    assert search({"owner_id_in": ",".join(owners)}) == expected
+    assert search({"owner_id_in": owners, "public": True}) == ["bacon", "mittens"]
+
+    # long lists are bound as a single parameter
+    ids = list(PETS) + [f"missing_{i}" for i in range(Pet.search.IN_LIST_THRESHOLD)]
+    assert search({"id_in": ids, "limit": 100}) == expected
+    assert search({"id_in": ids, "owner_id_in": owners[1]}) == ["mittens"]
+
+
+def test_search_sort(setup_and_fill_db, app, USERS):
+    headers = user_headers(USERS["pawdrick_pupper"])
+
+    def search(params):
+        r = app.get("/pets", params=params, headers=headers)
+        assert r.status_code == 200
+        return r.json()
+
+    def ids(params):
+        return [p["id"] for p in search(params)["pets"]]
+
+    assert ids(dict(sort="name")) == ["bacon", "mittens", "waffles"]
+    assert ids(dict(sort="-name")) == ["waffles", "mittens", "bacon"]
+    # null values sort last in either direction
+    assert ids(dict(sort="vaccination_date")) == ["bacon", "mittens", "waffles"]
+    assert ids(dict(sort="-vaccination_date")) == ["mittens", "bacon", "waffles"]
+    # sorts replace the similarity ranking
+    assert ids(dict(name="Bacin", sort="-name")) == ["bacon"]
+
+    # keyset pagination with the cursors
+    for sort in ["-vaccination_date", "name", "-name,vaccination_date"]:
+        paged = []
+        params = dict(sort=sort, limit=1)
+        while True:
+            result = search(params)
+            paged += [p["id"] for p in result["pets"]]
+            if result["next_cursor"] is None:
+                break
+            params = dict(cursor=result["next_cursor"], limit=1)
+        assert paged == ids(dict(sort=sort))
+
+    # the last page has no cursor
+    assert search(dict(sort="name", limit=3))["next_cursor"] is None
+
+    r = app.get("/pets", params=dict(sort="species_id"), headers=headers)
+    assert r.status_code == 422
+    r = app.get("/pets", params=dict(cursor="nonsense"), headers=headers)
+    assert r.status_code == 400
+    cursor = search(dict(sort="name", limit=1))["next_cursor"]
+    r = app.get("/pets", params=dict(sort="-name", cursor=cursor), headers=headers)
+    assert r.status_code == 400
+
+
+def test_search_aggregate(setup_and_fill_db, app, USERS):
+    headers = user_headers(USERS["pawdrick_pupper"])
+
+    def aggregate(params):
+        r = app.get("/pets/aggregate", params=params, headers=headers)
+        assert r.status_code == 200
+        return r.json()
+
+    # pawdrick's pets, and the public pets
+    assert aggregate(dict()) == [{"count": 3}]
+    assert aggregate(dict(group_by="species_id")) == [
+        {"species_id": "cat", "count": 1},
+        {"species_id": "dog", "count": 2},
+    ]
+    assert aggregate(
+        dict(
+            group_by="species_id",
+            metrics="count:vaccination_date,min:vaccination_date",
+            public=True,
+        )
+    ) == [
+        {
+            "species_id": "cat",
+            "count_vaccination_date": 1,
+            "min_vaccination_date": "2023-05-05",
+        },
+        {
+            "species_id": "dog",
+            "count_vaccination_date": 1,
+            "min_vaccination_date": "2020-01-01",
+        },
+    ]
+
+    # date buckets
+    assert aggregate(dict(group_by="vaccination_date", bucket="year")) == [
+        {"vaccination_date": None, "count": 1},
+        {"vaccination_date": "2020-01-01", "count": 1},
+        {"vaccination_date": "2023-01-01", "count": 1},
+    ]
+    assert [
+        group["vaccination_date"]
+        for group in aggregate(dict(group_by="vaccination_date", bucket="week"))
+    ] == [None, "2019-12-30", "2023-05-01"]
+
+    for params in [
+        dict(group_by="name"),
+        dict(metrics="sum:vaccination_date"),
+        dict(metrics="median:vaccination_date"),
+        dict(bucket="decade"),
+    ]:
+        r = app.get("/pets/aggregate", params=params, headers=headers)
+        assert r.status_code == 422
+
+
+def test_search_render_in_db(app_types):
+
+    r = app_types.post("/vineyards", json=dict(name="Clos Pepe", organic=False))
+    assert r.status_code == 201
+    vineyard_id = r.json()["id"]
+
+    grape_ids = []
+    for grape in ["Pinot Noir", "Chardonnay"]:
+        r = app_types.post("/grapes", json=dict(name=grape))
+        assert r.status_code == 201
+        grape_ids.append(r.json()["id"])
+
+    wines = [
+        dict(name="Brut", vintage="2019-09-01", sparkling=True),
+        dict(name="Estate", vintage="2021-10-01", sparkling=False),
+        dict(name="Blanc de Noirs", vintage="2020-09-15", sparkling=True),
+    ]
+
+    created = {}
+    for wine in wines:
+        r = app_types.post(
+            "/wines",
+            json=dict(
+                **wine,
+                vineyard_id=vineyard_id,
+                grapes=[str(_id) for _id in grape_ids],
+            ),
+        )
+        assert r.status_code == 201
+        created[r.json()["id"]] = r.json()
+
+    # read rendered by the database matches the pydantic-rendered create response
+    for wine_id, wine in created.items():
+        r = app_types.get(f"/wines/{wine_id}")
+        assert r.status_code == 200
+        assert r.json() == wine
+
+    r = app_types.get(f"/wines/{UUID(int=0)}")
+    assert r.status_code == 404
+
+    # search rendered by the database
+    r = app_types.get("/wines", params=dict(sparkling=True, limit=1))
+    assert r.status_code == 200
+    assert r.json()["page"] == 0
+    assert r.json()["total_pages"] == 3
+    assert len(r.json()["wines"]) == 1
+    assert r.json()["wines"][0] == created[r.json()["wines"][0]["id"]]
+    assert r.json()["wines"][0]["vineyard"]["organic"] is False
+    assert {g["name"] for g in r.json()["wines"][0]["grapes"]} == {
+        "Pinot Noir",
+        "Chardonnay",
+    }
+
+    # sparse fieldsets are rendered by the database too
+    r = app_types.get("/wines", params=dict(fields="name,vineyard"))
+    assert r.status_code == 200
+    for wine in r.json()["wines"]:
+        assert set(wine.keys()) == {"id", "name", "vineyard"}
+
+    # an empty page still reports the total
+    r = app_types.get("/wines", params=dict(sparkling=True, limit=1, page=5))
+    assert r.status_code == 200
+    assert r.json()["wines"] == []
+    assert r.json()["total_pages"] == 3
+
+
+def test_search_sort_cursors(app_types, monkeypatch):
+    from sqlalchemy import event
+
+    from quickrest import Base
+
+    models = {m.class_.__tablename__: m.class_ for m in Base.registry.mappers}
+
+    r = app_types.post("/vineyards", json=dict(name="Ridge", organic=True))
+    assert r.status_code == 201
+    vineyard_id = r.json()["id"]
+    for name in ["Monte Bello", "Lytton Springs", "Geyserville"]:
+        wine = dict(name=name, vintage="2018-09-01", sparkling=False, grapes=[])
+        r = app_types.post("/wines", json=dict(**wine, vineyard_id=vineyard_id))
+        assert r.status_code == 201
+        r = app_types.post("/quests", json=dict(name=name))
+        assert r.status_code == 201
+        r = app_types.post("/manuscripts", json=dict(title=name, body=name))
+        assert r.status_code == 201
+
+    statements = []
+
+    def count(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    def search(path, params):
+        statements.clear()
+        r = app_types.get(path, params=params)
+        assert r.status_code == 200
+        return r.json(), len(statements)
+
+    # pages rendered by the ORM, by the database, and checked against their versions
+    for path, sort in [
+        ("/manuscripts", "-title"),
+        ("/wines", "-name"),
+        ("/quests", "-name"),
+    ]:
+        model = models[path[1:]]
+        engine = model._sessionmaker().get_bind()
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            everything, _ = search(path, dict(sort=sort, limit=100))
+            expected = [item["id"] for item in everything[path[1:]]]
+            assert len(expected) >= 3
+
+            paged = []
+            params = dict(sort=sort, limit=2)
+            while True:
+                result, queries = search(path, params)
+                paged += [item["id"] for item in result[path[1:]]]
+                if result["next_cursor"] is None:
+                    break
+                params = dict(cursor=result["next_cursor"], limit=2)
+            assert paged == expected
+
+            # the cursor comes with the page, without another query
+            with monkeypatch.context() as m:
+                m.setattr(model.search_cfg, "sortable", [])
+                result, unsorted = search(path, dict(limit=2))
+                assert "next_cursor" not in result or result["next_cursor"] is None
+            assert queries == unsorted
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+
+def test_search_fulltext(app_types):
+
+    manuscripts = {
+        "whale": dict(title="The Whale", body="The whale, the whale, the white whale."),
+        "ahab": dict(title="Captain Ahab", body="Ahab hunted the whale."),
+        "pride": dict(
+            title="Pride and Prejudice", body="A truth universally acknowledged."
+        ),
+    }
+    ids = {}
+    for key, manuscript in manuscripts.items():
+        r = app_types.post("/manuscripts", json=manuscript)
+        assert r.status_code == 201
+        ids[key] = r.json()["id"]
+
+    def search(q, **params):
+        r = app_types.get("/manuscripts", params=dict(q=q, limit=100, **params))
+        assert r.status_code == 200
+        return [m["id"] for m in r.json()["manuscripts"]]
+
+    # title and body are searched together, ranked by relevance
+    assert search("whale")[:2] == [ids["whale"], ids["ahab"]]
+    assert ids["pride"] not in search("whale")
+    assert search("captain whale") == [ids["ahab"]]
+
+    # stemmed, and combined with the other filters
+    assert ids["pride"] in search("acknowledge")
+    assert search("whale", title="Captain Ahab") == [ids["ahab"]]
+
+    # query syntax is treated as text
+    assert search('whale" OR *') == []
+
+    # the index follows updates and deletes
+    r = app_types.patch(
+        f"/manuscripts/{ids['pride']}", json=dict(body="No whales here.")
+    )
+    assert r.status_code == 200
+    assert ids["pride"] in search("whales")
+    assert ids["pride"] not in search("acknowledged")
+
+    r = app_types.delete(f"/manuscripts/{ids['pride']}")
+    assert r.status_code == 200
+    assert ids["pride"] not in search("whales")
+
+    # sortable resources keep the relevance order, unless sorted
+    r = app_types.post(
+        "/manuscripts", json=dict(title="Whale Whale", body="Whale whale whale.")
+    )
+    assert r.status_code == 201
+    ids["moby"] = r.json()["id"]
+    assert search("whale") == [ids["moby"], ids["whale"], ids["ahab"]]
+    assert search("whale", sort="title") == [ids["ahab"], ids["whale"], ids["moby"]]
+
+    # full-text searches can bulk delete
+    r = app_types.delete("/manuscripts", params=dict(q="captain"))
+    assert r.status_code == 200
+    assert r.json() == 1
+    assert search("whale") == [ids["moby"], ids["whale"]]
+
+
+def test_search_fulltext_keys(app_types):
+    from quickrest import Base
+
+    Letter = next(
+        m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Letter"
+    )
+
+    ids = {}
+    for key, body in [
+        ("first", "Dear Guinevere, the quest goes well."),
+        ("second", "Dear Arthur, come home."),
+        ("third", "Dear Guinevere, the quest goes badly."),
+    ]:
+        r = app_types.post("/letters", json=dict(text=body))
+        assert r.status_code == 201
+        ids[key] = r.json()["id"]
+
+    def search(q):
+        r = app_types.get("/letters", params=dict(q=q, limit=100))
+        assert r.status_code == 200
+        return {letter["id"] for letter in r.json()["letters"]}
+
+    # tables without an integer primary key are indexed by their own keys, which VACUUM doesn't renumber
+    r = app_types.delete(f"/letters/{ids['first']}")
+    assert r.status_code == 200
+    with Letter._sessionmaker.kw["bind"].connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql(
+            "VACUUM"
+        )
+    assert search("guinevere") == {ids["third"]}
+    assert search("arthur") == {ids["second"]}
+
+    r = app_types.patch(f"/letters/{ids['second']}", json=dict(text="Dear Lancelot"))
+    assert r.status_code == 200
+    assert search("arthur") == set()
+    assert search("lancelot") == {ids["second"]}
+
+
+def test_search_fulltext_union(setup_and_fill_db, app, USERS, PETS):
+
+    # full-text search is combined with union access control
+    user = USERS["pawdrick_pupper"]
+    for pet_id, pet in PETS.items():
+        r = app.get(
+            "/pets", params=dict(q=pet["name"], limit=100), headers=user_headers(user)
+        )
+        assert r.status_code == 200
+        visible = pet.get("public", False) or pet["owner_id"] == user["id"]
+        assert (pet_id in {p["id"] for p in r.json()["pets"]}) == visible
+
+
+def test_search_trigram_index(app_types):
+    from quickrest.mixins.trigram import trigrams
+
+    assert trigrams("Cat") == {"  c", " ca", "cat", "at "}
+
+    ids = {}
+    for name, origin in [
+        ("Wensleydale", "Yorkshire"),
+        ("Red Leicester", "Leicestershire"),
+        ("Double Gloucester", "Gloucestershire"),
+    ]:
+        r = app_types.post("/cheeses", json=dict(name=name, origin=origin))
+        assert r.status_code == 201
+        ids[name] = r.json()["id"]
+
+    def search(**params):
+        r = app_types.get("/cheeses", params=dict(limit=100, **params))
+        assert r.status_code == 200
+        return {c["id"] for c in r.json()["cheeses"]}
+
+    # misspellings are matched, without the spellfix extension
+    assert search(name="Wenslydale") == {ids["Wensleydale"]}
+    assert search(name="Gloster", threshold=0.5) == set()
+    assert search(name="Gloster", threshold=0.2) >= {ids["Double Gloucester"]}
+
+    # fields outside search_similarity are matched exactly
+    assert search(name="Wenslydale", origin="Yorkshire") == {ids["Wensleydale"]}
+    assert search(name="Wenslydale", origin="Yorks") == set()
+
+    # the index follows creates, patches and deletes
+    r = app_types.patch(
+        f"/cheeses/{ids['Red Leicester']}", json=dict(name="Red Windsor")
+    )
+    assert r.status_code == 200
+    assert search(name="Red Windsr") == {ids["Red Leicester"]}
+    assert search(name="Red Leicestr") == set()
+
+    r = app_types.delete(f"/cheeses/{ids['Wensleydale']}")
+    assert r.status_code == 200
+    assert search(name="Wenslydale") == set()
+
+    r = app_types.post("/cheeses", json=dict(name="Wensleydale", origin="Yorkshire"))
+    assert search(name="Wenslydale") == {r.json()["id"]}
+
+    # and ingests
+    r = app_types.post(
+        "/cheeses/ingest",
+        content='{"name": "Stinking Bishop", "origin": "Gloucestershire"}',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert r.status_code == 200
+    assert r.json()["inserted"] == 1
+    assert len(search(name="Stinkin Bishop")) == 1
+
+
+def test_search_similarity_ranked(app_types):
+    from quickrest import Base
+
+    for name in ["Brie de Meaux", "Brie", "Bries", "Camembert"]:
+        r = app_types.post("/cheeses", json=dict(name=name, origin="France"))
+        assert r.status_code == 201
+
+    # most similar first, with their scores
+    r = app_types.get("/cheeses", params=dict(name="Brie", limit=10))
+    assert r.status_code == 200
+    cheeses = r.json()["cheeses"]
+    assert [c["name"] for c in cheeses] == ["Brie", "Bries", "Brie de Meaux"]
+    assert cheeses[0]["score"] == 1.0
+    scores = [c["score"] for c in cheeses]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0.3 <= score <= 1.0 for score in scores)
+
+    # paging keeps the ranking
+    r = app_types.get("/cheeses", params=dict(name="Brie", limit=1, page=1))
+    assert [c["name"] for c in r.json()["cheeses"]] == ["Bries"]
+
+    # sparse fieldsets include the score
+    r = app_types.get("/cheeses", params=dict(name="Brie", fields="name"))
+    cheese = r.json()["cheeses"][0]
+    assert set(cheese) == {"id", "name", "score"}
+    assert (cheese["name"], cheese["score"]) == ("Brie", 1.0)
+
+    # max_candidates only caps the ranking, every match is still returned
+    (Cheese,) = [
+        m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Cheese"
+    ]
+    Cheese.search.trigram_index.max_candidates = 1
+    try:
+        r = app_types.get("/cheeses", params=dict(name="Brie", limit=10))
+        cheeses = r.json()["cheeses"]
+        assert cheeses[0]["name"] == "Brie"
+        assert {c["name"] for c in cheeses} == {"Brie", "Bries", "Brie de Meaux"}
+    finally:
+        Cheese.search.trigram_index.max_candidates = 1000
+
+    # without a similarity filter, there is no score
+    r = app_types.get("/cheeses", params=dict(origin="France"))
+    assert r.status_code == 200
+    assert all(c["score"] is None for c in r.json()["cheeses"])
+
+    # ranked searches can bulk delete
+    r = app_types.delete("/cheeses", params=dict(name="Bries", threshold=0.9))
+    assert r.status_code == 200
+    assert r.json() == 1
+    r = app_types.get("/cheeses", params=dict(name="Brie", limit=10))
+    assert [c["name"] for c in r.json()["cheeses"]] == ["Brie", "Brie de Meaux"]
+
+
+def test_search_vector(app_types, tmp_path):
+    import numpy as np
+
+    from quickrest import Base
+    from quickrest.mixins.vector import VectorIndex
+
+    Poem = next(m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Poem")
+
+    ids = {}
+    for title, embedding in [
+        ("ode", [1.0, 0.0, 0.0]),
+        ("sonnet", [0.9, 0.1, 0.0]),
+        ("ballad", [0.5, 0.5, 0.0]),
+        ("haiku", [0.0, 0.0, 1.0]),
+        ("limerick", None),
+    ]:
+        r = app_types.post("/poems", json=dict(title=title, embedding=embedding))
+        assert r.status_code == 201
+        ids[title] = r.json()["id"]
+
+    def similar(**params):
+        r = app_types.get("/poems", params=params)
+        assert r.status_code == 200
+        return [(p["title"], round(p["score"], 3)) for p in r.json()["poems"]]
+
+    # ranked by cosine similarity, excluding the poem itself
+    assert similar(similar_to=ids["ode"]) == [
+        ("sonnet", 0.994),
+        ("ballad", 0.707),
+        ("haiku", 0.0),
+    ]
+    # combined with the other search filters, and paged
+    assert similar(similar_to=ids["ode"], title="ballad") == [("ballad", 0.707)]
+    assert similar(similar_to=ids["ode"], limit=1, page=1) == [("ballad", 0.707)]
+    # without a vector, there are no similar poems
+    assert similar(similar_to=ids["limerick"]) == []
+
+    # the index follows patches, creates and deletes
+    r = app_types.patch(f"/poems/{ids['haiku']}", json=dict(embedding=[1.0, 0.0, 0.1]))
+    assert r.status_code == 200
+    assert similar(similar_to=ids["ode"])[0] == ("haiku", 0.995)
+
+    r = app_types.delete(f"/poems/{ids['sonnet']}")
+    assert r.status_code == 200
+    assert [t for t, _ in similar(similar_to=ids["ode"])] == ["haiku", "ballad"]
+
+    # the matrix can be memory-mapped from a sidecar file, and grows with the table
+    index = Poem.search.vector_index
+    index.path = str(tmp_path / "poems.npy")
+    index.rebuild()
+    assert index._matrix.shape == (3, 3)
+    for i in range(20):
+        r = app_types.post(
+            "/poems", json=dict(title=f"draft {i}", embedding=[0.0, 1.0, i / 20])
+        )
+        assert r.status_code == 201
+    assert isinstance(index._matrix, np.memmap)
+    assert np.load(index.path, mmap_mode="r").shape[0] >= 23
+    assert [t for t, _ in similar(similar_to=ids["ode"])[:2]] == ["haiku", "ballad"]
+
+    # a restarted index is loaded from its sidecar files, unless the table has changed
+    restarted = VectorIndex(Poem, "embedding", path=index.path)
+    assert restarted.load()
+    assert restarted.similar(ids["ballad"]) == index.similar(ids["ballad"])
+    with Poem._sessionmaker() as db:
+        db.add(Poem(title="elsewhere", embedding=[1.0, 1.0, 1.0]))
+        db.commit()
+    assert not VectorIndex(Poem, "embedding", path=index.path).load()
+
+    # writes before the index is loaded invalidate the sidecar files
+    index.rebuild()
+    unloaded = VectorIndex(Poem, "embedding", path=index.path)
+    unloaded.update("patch", [ids["haiku"]])
+    assert not unloaded.load()
+    index.rebuild()
+
+    # the IVF coarse index matches exhaustive search when every list is probed
+    exhaustive = index.similar(ids["ballad"])
+    index.lists, index.probes = 4, 4
+    index.rebuild()
+    assert index._centroids.shape == (4, 3)
+    assert list(index.similar(ids["ballad"])) == list(exhaustive)
+
+
+def test_search_export(setup_and_fill_db, app, USERS, PETS):
+
+    user = USERS["pawdrick_pupper"]
+    visible = {
+        pet_id
+        for pet_id, pet in PETS.items()
+        if pet["public"] or pet["owner_id"] == user["id"]
+    }
+
+    # ndjson export applies access control
+    r = app.get("/pets/export", headers=user_headers(user))
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert {row["id"] for row in rows} == visible
+
+    # ... and search filters
+    r = app.get(
+        "/pets/export", params=dict(owner_id=user["id"]), headers=user_headers(user)
+    )
+    assert r.status_code == 200
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert {row["id"] for row in rows} == {
+        pet_id for pet_id, pet in PETS.items() if pet["owner_id"] == user["id"]
+    }
+
+    # csv export
+    r = app.get("/pets/export", params=dict(format="csv"), headers=user_headers(user))
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert {row["id"] for row in rows} == visible
+    assert json.loads(rows[0]["specie"])["id"] == PETS[rows[0]["id"]]["species_id"]
+
+
+def test_search_export_errors(setup_and_fill_db, app, USERS, monkeypatch):
+    from fastapi import HTTPException
+
+    from quickrest import Base
+
+    Pet = next(m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Pet")
+
+    def filter_query(*args, **kwargs):
+        raise HTTPException(status_code=403, detail="Not allowed")
+
+    # errors raised while the query is built are returned with their status code
+    monkeypatch.setattr(Pet.search, "filter_query", filter_query)
+    r = app.get("/pets/export", headers=user_headers(USERS["pawdrick_pupper"]))
+    assert r.status_code == 403
+    assert r.json()["detail"] == "Not allowed"
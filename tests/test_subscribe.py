@@ -0,0 +1,194 @@
+import asyncio
+import json
+
+from conftest import user_headers
+
+
+def parse(chunk):
+    """Parse a server-sent event into its name and data."""
+    lines = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+    return lines.get("event"), json.loads(lines.get("data", "null"))
+
+
+def test_subscribe(app_types):
+    from quickrest import Base
+    from quickrest.mixins.subscribe import broker
+
+    (Quest,) = [m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Quest"]
+
+    async def subscribe(**filters):
+        response = await Quest.subscribe.controller(
+            query=Quest.search.input_model(**filters), user=None
+        )
+        assert response.media_type == "text/event-stream"
+        return response.body_iterator
+
+    async def write(method, url, **kwargs):
+        # the app runs on the test client's own event loop
+        r = await asyncio.to_thread(getattr(app_types, method), url, **kwargs)
+        assert r.status_code in (200, 201)
+        return r.json()
+
+    async def next_event(events):
+        return await asyncio.wait_for(events.__anext__(), timeout=5)
+
+    async def main():
+        everything = await subscribe()
+        filtered = await subscribe(name="Spamalot")
+        assert broker.subscribers("quests") == 2
+
+        quest = await write("post", "/quests", json=dict(name="Rescue Galahad"))
+        assert parse(await next_event(everything)) == ("create", quest)
+
+        # the filtered subscriber doesn't see the create
+        assert await next_event(filtered) == ": heartbeat\n\n"
+
+        patched = await write(
+            "patch", f"/quests/{quest['id']}", json=dict(name="Spamalot")
+        )
+        assert parse(await next_event(everything)) == ("patch", patched)
+        assert parse(await next_event(filtered)) == ("patch", patched)
+
+        await write("delete", f"/quests/{quest['id']}")
+        assert parse(await next_event(everything)) == ("delete", {"id": quest["id"]})
+        assert parse(await next_event(filtered)) == ("delete", {"id": quest["id"]})
+
+        # deletes are only sent to the subscribers that could see the resource
+        quest = await write("post", "/quests", json=dict(name="Holy Grail"))
+        assert parse(await next_event(everything)) == ("create", quest)
+        await write("delete", f"/quests/{quest['id']}")
+        assert parse(await next_event(everything)) == ("delete", {"id": quest["id"]})
+        assert await next_event(filtered) == ": heartbeat\n\n"
+
+        # a subscriber that falls behind is disconnected
+        for name in ["Bridge of Death", "Castle Aaargh", "Black Beast"]:
+            await write("post", "/quests", json=dict(name=name))
+        assert parse(await next_event(everything)) == ("overflow", {})
+        assert [chunk async for chunk in everything] == []
+        assert broker.subscribers("quests") == 1
+
+        await filtered.aclose()
+        assert broker.subscribers("quests") == 0
+
+    asyncio.run(main())
+
+
+def test_subscribe_transaction(app_types):
+    from sqlalchemy.orm import Session
+
+    from quickrest import Base
+    from quickrest.mixins.resource import publish_writes
+
+    (Quest,) = [m.class_ for m in Base.registry.mappers if m.class_.__name__ == "Quest"]
+    CreateQuest = Quest.create.input_model
+
+    async def main():
+        response = await Quest.subscribe.controller(
+            query=Quest.search.input_model(), user=None
+        )
+        events = response.body_iterator
+        engine = Quest._sessionmaker().get_bind()
+
+        # writes in a caller's transaction are published when it commits, and not if it rolls back
+        for name, commit in [("Ni", False), ("Shrubbery", True)]:
+            with engine.connect() as conn:
+                transaction = conn.begin()
+                db = Session(bind=conn, join_transaction_mode="rollback_only")
+                quest = await Quest.create.controller(
+                    createquest=CreateQuest(name=name), db=db, user=None
+                )
+                if commit:
+                    transaction.commit()
+                    publish_writes(db)
+                else:
+                    transaction.rollback()
+                db.close()
+
+            event = await asyncio.wait_for(events.__anext__(), timeout=5)
+            if commit:
+                assert parse(event) == ("create", quest.model_dump(mode="json"))
+            else:
+                assert event == ": heartbeat\n\n"
+
+        await events.aclose()
+
+    asyncio.run(main())
+
+
+def test_subscribe_access_control(setup_and_fill_db, app, USERS, PETS, monkeypatch):
+    from sqlalchemy import event
+
+    from example.app import Pet, UserToken
+    from quickrest.mixins.subscribe import broker
+
+    monkeypatch.setattr(Pet.subscribe_cfg, "heartbeat_seconds", 0.1)
+
+    # the queries of writes and of their events
+    statements = []
+    engine = Pet._sessionmaker().get_bind()
+
+    def count(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    def token(user_id):
+        user = USERS[user_id]
+        return UserToken(id=user["id"], permissions=user["permissions"])
+
+    async def subscribe(user_id, **filters):
+        response = await Pet.subscribe.controller(
+            query=Pet.search.input_model(**filters), user=token(user_id)
+        )
+        return response.body_iterator
+
+    async def patch(pet_id, **values):
+        # the app runs on the test client's own event loop
+        r = await asyncio.to_thread(
+            app.patch,
+            f"/pets/{pet_id}",
+            json=values,
+            headers=user_headers(USERS[PETS[pet_id]["owner_id"]]),
+        )
+        assert r.status_code == 200
+        return r.json()
+
+    async def next_event(events):
+        return await asyncio.wait_for(events.__anext__(), timeout=5)
+
+    async def main():
+        owner = await subscribe("pawdrick_pupper")
+        other = await subscribe("bonita_leashley")
+        filtered = await subscribe("bonita_leashley", vaccination_date_lt="2000-01-01")
+
+        # the private pet is only sent to its owner
+        statements.clear()
+        waffles = await patch("waffles", name="Waffles II")
+        assert parse(await next_event(owner)) == ("patch", waffles)
+        assert await next_event(other) == ": heartbeat\n\n"
+        assert await next_event(filtered) == ": heartbeat\n\n"
+        queries = len(statements)
+
+        # public pets are sent to every subscriber whose filters they match
+        bacon = await patch("bacon", name="Bacon II")
+        assert parse(await next_event(owner)) == ("patch", bacon)
+        assert parse(await next_event(other)) == ("patch", bacon)
+        assert await next_event(filtered) == ": heartbeat\n\n"
+
+        # each write is rendered once, whatever the number of subscribers
+        more = [await subscribe("bonita_leashley") for _ in range(5)]
+        more += [await subscribe("bonita_leashley", name="Waffles") for _ in range(5)]
+        statements.clear()
+        waffles = await patch("waffles", name="Waffles")
+        assert parse(await next_event(owner)) == ("patch", waffles)
+        for events in [other, filtered, *more]:
+            assert await next_event(events) == ": heartbeat\n\n"
+        assert len(statements) == queries
+
+        for events in [owner, other, filtered, *more]:
+            await events.aclose()
+        assert broker.subscribers("pets") == 0
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        asyncio.run(main())
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
@@ -0,0 +1,74 @@
+from conftest import user_headers
+
+
+def test_upsert(setup_and_fill_db, app, USERS):
+
+    authorized_user = USERS["pawdrick_pupper"]
+    unauthorized_user = USERS["bonita_leashley"]
+
+    data = dict(
+        name="Waffles II",
+        owner_id="pawdrick_pupper",
+        species_id="dog",
+        public=False,
+    )
+
+    # users can't upsert over each others pets
+    r = app.put("/pets/waffles", json=data, headers=user_headers(unauthorized_user))
+    assert r.status_code == 404
+
+    # users can upsert over their own pets
+    r = app.put("/pets/waffles", json=data, headers=user_headers(authorized_user))
+    assert r.status_code == 200
+    assert r.json()["name"] == "Waffles II"
+
+    r = app.get("/pets/waffles", headers=user_headers(authorized_user))
+    assert r.json()["name"] == "Waffles II"
+
+    # upserting a new primary key creates the resource
+    r = app.put("/pets/pancake", json=data, headers=user_headers(authorized_user))
+    assert r.status_code == 200
+    assert r.json()["id"] == "pancake"
+
+    r = app.get("/pets/pancake", headers=user_headers(authorized_user))
+    assert r.status_code == 200
+
+
+def test_upsert_bulk(setup_and_fill_db, app, USERS):
+
+    authorized_user = USERS["pawdrick_pupper"]
+    unauthorized_user = USERS["bonita_leashley"]
+
+    data = [
+        dict(
+            id="waffles",
+            name="Waffles II",
+            owner_id="pawdrick_pupper",
+            species_id="dog",
+            public=False,
+        ),
+        dict(
+            id="crumpet",
+            name="Crumpet",
+            owner_id="pawdrick_pupper",
+            species_id="dog",
+            public=False,
+        ),
+    ]
+
+    # bulk upserts are atomic
+    r = app.put("/pets", json=data, headers=user_headers(unauthorized_user))
+    assert r.status_code == 404
+    r = app.get("/pets/crumpet", headers=user_headers(authorized_user))
+    assert r.status_code == 404
+
+    r = app.put("/pets", json=data, headers=user_headers(authorized_user))
+    assert r.status_code == 200
+    assert [pet["name"] for pet in r.json()] == ["Waffles II", "Crumpet"]
+
+    r = app.get("/pets/crumpet", headers=user_headers(authorized_user))
+    assert r.status_code == 200
+
+    # primary keys must be unique
+    r = app.put("/pets", json=data + data, headers=user_headers(authorized_user))
+    assert r.status_code == 422